@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark the per-line classification loop against the batched classifyCorpus().
+
+Comment lines are derived from the issue bodies in search_sample.json (code blocks
+tokenized and split into lines the same way gitHubCommentAPI does) and repeated to
+reach the requested number of lines.
+
+Usage: python -m benchmarks.classify_benchmark [-n LINES] [--chunk-size CHUNK_SIZE]
+'''
+import argparse
+import json
+import re
+import time
+
+from joblib import load
+
+from utils.classifier import classifyCorpus, DEFAULT_CHUNK_SIZE
+
+def loadSampleLines(path="search_sample.json"):
+    with open(path) as f:
+        items = json.load(f)['items']
+
+    lines = []
+    for item in items:
+        body = re.sub('```([^`]*)```|`([^`]*)`', 'CODE', item['body'] or "")
+        for line in body.splitlines():
+            line = line.strip()
+            if line:
+                lines.append(line.lower())
+
+    return lines
+
+def buildCorpus(lines, n):
+    return [{"commentLine": lines[i % len(lines)]} for i in range(n)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--lines', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    model = load("models/GitHub_comments_logisticRegression.model")
+    vectorizer = load("models/GitHub_comments_logisticRegression.countVector")
+    lines = loadSampleLines()
+
+    corpus = buildCorpus(lines, args.lines)
+    start = time.perf_counter()
+    for c in corpus:
+        c['category'] = model.predict(vectorizer.transform([c['commentLine']]))[0]
+    loop_time = time.perf_counter() - start
+    expected = [c['category'] for c in corpus]
+
+    corpus = buildCorpus(lines, args.lines)
+    start = time.perf_counter()
+    classifyCorpus(corpus, model, vectorizer, chunk_size=args.chunk_size)
+    batch_time = time.perf_counter() - start
+
+    assert [c['category'] for c in corpus] == expected, "batched categories differ from per-line loop"
+
+    print(f'{args.lines} lines ({len(lines)} unique sample lines)')
+    print(f'per-line loop: {args.lines / loop_time:12.0f} lines/sec')
+    print(f'classifyCorpus: {args.lines / batch_time:11.0f} lines/sec')
+    print(f'speedup: {loop_time / batch_time:.1f}x')
+
+if __name__ == '__main__':
+    main()
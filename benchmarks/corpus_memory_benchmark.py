@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark the memory held per comment line by a list of line dicts against a CommentCorpus.
+
+Comments pages are generated as JSON, decoded and split into lines by processCommentPage
+the same way gitHubCommentAPI does, with the sample lines of classify_benchmark.py as
+comment bodies. The lines are either kept as line dicts (the previous gitHubCommentAPI
+results list) or added to a CommentCorpus, then tagged with a category and score.
+The memory still allocated afterwards is measured with tracemalloc.
+
+Usage: python -m benchmarks.corpus_memory_benchmark [-n LINES]
+'''
+import argparse
+import gc
+import json
+import tracemalloc
+
+from benchmarks.classify_benchmark import loadSampleLines
+from benchmarks.format_benchmark import CATEGORIES, LINES_PER_COMMENT, COMMENTS_PER_ISSUE
+from utils.corpus import CommentCorpus, setColumn
+from utils.githubAPI import processCommentPage
+
+def commentPages(lines, n):
+    for number in range(-(-n // (LINES_PER_COMMENT * COMMENTS_PER_ISSUE))):
+        issue = {"issueID": 700000000 + number, "issueURL_HTML": f"https://github.com/tensorflow/tensorflow/issues/{number}"}
+        comments = []
+        for c in range(COMMENTS_PER_ISSUE):
+            first = ((number * COMMENTS_PER_ISSUE) + c) * LINES_PER_COMMENT
+            comments.append({
+                "body": "\n".join(lines[(first + i) % len(lines)] for i in range(LINES_PER_COMMENT)),
+                "html_url": f"https://github.com/tensorflow/tensorflow/issues/{number}#issuecomment-{800000000 + first}",
+                "issue_url": f"https://api.github.com/repos/tensorflow/tensorflow/issues/{number}",
+                "user": {"login": "y3pio", "type": "User"}
+            })
+        # Decoded from JSON like the API responses, so no string is shared with the sample lines.
+        yield issue, json.loads(json.dumps(comments))
+
+def measure(build, lines, n):
+    gc.collect()
+    tracemalloc.start()
+    corpus = build(commentPages(lines, n))
+    setColumn(corpus, 'category', [CATEGORIES[i % len(CATEGORIES)] for i in range(len(corpus))])
+    setColumn(corpus, 'categoryScore', [0.5] * len(corpus))
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(corpus), size
+
+def lineDicts(pages):
+    results = []
+    for issue, comments in pages:
+        results += processCommentPage(issue, comments)
+    return results
+
+def commentCorpus(pages):
+    results = CommentCorpus()
+    for issue, comments in pages:
+        results.extend(processCommentPage(issue, comments))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--lines', type=int, default=100000)
+    args = parser.parse_args()
+
+    lines = loadSampleLines()
+    dict_lines, dict_size = measure(lineDicts, lines, args.lines)
+    corpus_lines, corpus_size = measure(commentCorpus, lines, args.lines)
+    assert dict_lines == corpus_lines
+
+    print(f'{dict_lines} lines')
+    print(f'line dicts:    {dict_size / dict_lines:8.0f} bytes/line')
+    print(f'CommentCorpus: {corpus_size / corpus_lines:8.0f} bytes/line')
+    print(f'reduction: {dict_size / corpus_size:.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+'''
+Offline end-to-end benchmark of the mining pipeline, at several scales.
+
+A local fake GitHub API serves the search and comments endpoints for a synthetic set of
+issues built from search_sample.json: the sample issues' titles and bodies are cycled
+(3 issues out of 4 mention the benchmark query, the others are omitted by the pipeline),
+issues are spread over creation dates so that searches of more than 1000 issues are
+sharded, and each issue gets a comment thread of the sample's lines (0 to 130 comments,
+paginated by 100, with bot comments). Responses carry X-RateLimit-* headers of the fake
+server's own budgets, and exhausting a budget gets a 403 until it resets, so the request
+scheduler throttles as it does against GitHub. No network access or token is needed.
+
+Each scale runs the whole pipeline (a Miner, see utils/miner.py) in its own process,
+so peak memory is measured per scale, and records the run report of utils/metrics.py
+(time and throughput per stage, request latency histograms, bytes downloaded, peak memory)
+into a JSON results file. With --baseline, the throughput of each scale and stage is
+compared to a previous results file and regressions past --tolerance fail the benchmark.
+
+Usage: python -m benchmarks.e2e_benchmark [--scales N [N ...]] [--latency SECONDS] [-w WORKERS]
+       [-c CONCURRENCY] [--core-rate-limit N] [--search-rate-limit N] [--rate-limit-window SECONDS]
+       [-o OUTPUT] [--baseline RESULTS_FILE] [--tolerance FRACTION]
+'''
+import argparse
+import datetime
+import json
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks.matcher_benchmark import loadSampleIssues
+from benchmarks.classify_benchmark import loadSampleLines
+from test.fakeGitHubServer import FakeGitHubServer
+
+QUERY = 'tf.function'
+DEFAULT_SCALES = [100, 1000, 10000]
+# Comments of consecutive issues, cycled. Every BIG_THREAD_EVERY-th issue has a
+# thread of BIG_THREAD_COMMENTS comments, two pages.
+COMMENT_COUNTS = [0, 2, 5, 8, 12, 20, 3, 1, 35, 6]
+BIG_THREAD_EVERY = 97
+BIG_THREAD_COMMENTS = 130
+BOT_COMMENT_EVERY = 10
+FIRST_CREATED = datetime.datetime(2016, 1, 1, tzinfo=datetime.timezone.utc)
+CREATED_INTERVAL = datetime.timedelta(hours=3)
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+# Stages that took less time than this in the baseline are too noisy to compare.
+MIN_COMPARED_SECONDS = 0.5
+
+# Rate limit budget of one resource of the fake server, reset every `window` seconds.
+class FakeRateLimit:
+    def __init__(self, resource, limit, window):
+        self.resource = resource
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset = time.time() + window
+        self.remaining = limit
+
+    # Spend one request, returning the rate limit headers and whether the budget allowed it.
+    def spend(self):
+        with self.lock:
+            now = time.time()
+            if now >= self.reset:
+                self.reset = now + self.window
+                self.remaining = self.limit
+            allowed = self.remaining > 0
+            self.remaining = max(self.remaining - 1, 0)
+            headers = {
+                'X-RateLimit-Limit': str(self.limit),
+                'X-RateLimit-Remaining': str(self.remaining),
+                'X-RateLimit-Reset': str(int(self.reset) + 1),
+                'X-RateLimit-Resource': self.resource
+            }
+        return headers, allowed
+
+# Fake GitHub search and comments API over `num_issues` synthetic issues.
+class FakeGitHubAPI:
+    def __init__(self, num_issues, latency=0.0, core_rate_limit=1000000, search_rate_limit=1000000,
+                 rate_limit_window=60):
+        self.server = FakeGitHubServer(latency=latency, record_requests=False)
+        self.num_issues = num_issues
+        self.samples = loadSampleIssues()
+        self.lines = loadSampleLines()
+        self.rate_limits = {
+            'core': FakeRateLimit('core', core_rate_limit, rate_limit_window),
+            'search': FakeRateLimit('search', search_rate_limit, rate_limit_window)
+        }
+
+    def url(self, path=''):
+        return self.server.url(path)
+
+    def created(self, number):
+        return FIRST_CREATED + (number - 1) * CREATED_INTERVAL
+
+    def comments(self, number):
+        if number % BIG_THREAD_EVERY == 0:
+            return BIG_THREAD_COMMENTS
+        return COMMENT_COUNTS[number % len(COMMENT_COUNTS)]
+
+    def issue(self, number):
+        sample = self.samples[number % len(self.samples)]
+        return {
+            "id": 1000000000 + number,
+            "node_id": f"I_{number}",
+            "number": number,
+            "title": f"{sample['title']} with {QUERY}" if number % 4 else sample['title'],
+            "body": sample['body'],
+            "comments": self.comments(number),
+            "created_at": self.created(number).strftime(DATE_FORMAT),
+            "updated_at": self.created(number).strftime(DATE_FORMAT),
+            "url": self.url(f"/repos/bench/repo/issues/{number}"),
+            "comments_url": self.url(f"/repos/bench/repo/issues/{number}/comments"),
+            "html_url": f"https://github.com/bench/repo/issues/{number}"
+        }
+
+    def comment(self, number, n):
+        first = (number * 7 + n * 3) % len(self.lines)
+        bot = n % BOT_COMMENT_EVERY == BOT_COMMENT_EVERY - 1
+        return {
+            "body": "\n".join(self.lines[(first + i) % len(self.lines)] for i in range(1 + n % 4)),
+            "html_url": f"https://github.com/bench/repo/issues/{number}#issuecomment-{number * 1000 + n}",
+            "issue_url": self.url(f"/repos/bench/repo/issues/{number}"),
+            "user": {"login": "github-actions[bot]" if bot else f"user{n % 13}", "type": "Bot" if bot else "User"}
+        }
+
+    # Issue numbers matching a search query, latest created first (the search's `created:` range only).
+    def searchResults(self, q):
+        numbers = range(self.num_issues, 0, -1)
+        for qualifier in q.split():
+            if qualifier.startswith('created:'):
+                start, end = (datetime.datetime.strptime(date, DATE_FORMAT).replace(tzinfo=datetime.timezone.utc)
+                              for date in qualifier[len('created:'):].split('..'))
+                numbers = [n for n in numbers if start <= self.created(n) <= end]
+        return numbers
+
+    def search(self, path, query, headers):
+        rate_limit_headers, allowed = self.rate_limits['search'].spend()
+        if not allowed:
+            return 403, rate_limit_headers, {'message': 'API rate limit exceeded'}
+
+        numbers = self.searchResults(query['q'])
+        page, per_page = int(query.get('page', 1)), int(query.get('per_page', 30))
+        items = [self.issue(n) for n in numbers[(page - 1) * per_page:page * per_page]]
+        return 200, rate_limit_headers, {"total_count": len(numbers), "incomplete_results": False, "items": items}
+
+    def issueComments(self, path, query, headers):
+        rate_limit_headers, allowed = self.rate_limits['core'].spend()
+        if not allowed:
+            return 403, rate_limit_headers, {'message': 'API rate limit exceeded'}
+
+        number = int(path.split('/')[-2])
+        page, per_page = int(query.get('page', 1)), int(query.get('per_page', 30))
+        total = self.comments(number)
+        comments = [self.comment(number, n) for n in range((page - 1) * per_page, min(page * per_page, total))]
+        if page * per_page < total:
+            next_url = self.url(path) + '?' + urlencode({'per_page': per_page, 'page': page + 1})
+            rate_limit_headers['Link'] = f'<{next_url}>; rel="next"'
+        return 200, rate_limit_headers, comments
+
+    def start(self):
+        self.server.start()
+        self.server.route('/search/issues', self.search)
+        for number in range(1, self.num_issues + 1):
+            self.server.route(f"/repos/bench/repo/issues/{number}/comments", self.issueComments)
+        return self
+
+    def stop(self):
+        self.server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# Mine the benchmark query from a fake API, returning the run report of the scale.
+# Runs in its own process, see main().
+def runScale(num_issues, search_url, workers=1, concurrency=8):
+    from utils.metrics import resetMetrics
+    from utils.miner import Miner, Classifier
+
+    start = time.perf_counter()
+    classifier = Classifier()
+    load_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as results_dir:
+        with Miner(classifier, concurrency=concurrency, workers=workers, cache=False, report_rate_limit=False,
+                   results_dir=results_dir + '/', search_url=search_url) as miner:
+            metrics = resetMetrics()
+            start = time.perf_counter()
+            summary = miner.mine(QUERY, max_results=num_issues, out_file_prefix='benchmark')
+            wall_time = time.perf_counter() - start
+
+    report = metrics.report(summary)
+    report['issues'] = num_issues
+    report['wall_seconds'] = wall_time
+    report['model_load_seconds'] = load_time
+    report['issues_per_second'] = num_issues / wall_time
+    report['lines_per_second'] = summary['lines'] / wall_time
+    return report
+
+# Throughputs of a scale's report compared across runs.
+def throughputs(report):
+    values = {'lines_per_second': report['lines_per_second']}
+    for name, stage in report['stages'].items():
+        if stage['seconds'] >= MIN_COMPARED_SECONDS:
+            values[f'{name}_items_per_second'] = stage['items_per_second']
+    return values
+
+# (scale, metric, baseline, current) of the throughputs more than `tolerance` below the baseline's.
+def regressions(results, baseline, tolerance):
+    found = []
+    baseline_scales = {str(scale['issues']): scale for scale in baseline['scales']}
+    for scale in results['scales']:
+        previous = baseline_scales.get(str(scale['issues']))
+        if previous is None:
+            continue
+        current = throughputs(scale)
+        for metric, value in throughputs(previous).items():
+            if metric in current and current[metric] < value * (1 - tolerance):
+                found.append((scale['issues'], metric, value, current[metric]))
+    return found
+
+def printReport(report):
+    stages = report['stages']
+    core = report['requests'].get('core', {}).get('latency_seconds', {})
+    memory = report['peak_memory_bytes']
+    print(f"{report['issues']:7} {report['wall_seconds']:9.2f} {report['issues_per_second']:9.1f} "
+          f"{report['lines_per_second']:9.0f} "
+          + ' '.join(f"{stages.get(name, {}).get('seconds', 0):10.2f}"
+                     for name in ['search', 'fetch', 'preprocess', 'predict', 'write'])
+          + f" {(core.get('p50') or 0) * 1000:8.0f} {(core.get('p99') or 0) * 1000:8.0f}"
+          + (f" {memory['process'] / 2 ** 20:8.0f}" if memory is not None else f" {'-':>8}"))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added to each fake API response')
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('--core-rate-limit', type=int, default=1000000)
+    parser.add_argument('--search-rate-limit', type=int, default=1000000)
+    parser.add_argument('--rate-limit-window', type=float, default=60)
+    parser.add_argument('-o', '--output', help='results file (default: ./results/e2e_benchmark_<timestamp>.json)')
+    parser.add_argument('--baseline', help='previous results file to compare the throughputs to')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fraction of a baseline throughput a run can lose before it is a regression')
+    args = parser.parse_args()
+
+    results = {'config': vars(args), 'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scales': []}
+    for num_issues in args.scales:
+        with FakeGitHubAPI(num_issues, args.latency, args.core_rate_limit, args.search_rate_limit,
+                           args.rate_limit_window) as api:
+            # A fresh (spawned, not forked from the server's threads) process per scale.
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                report = executor.submit(runScale, num_issues, api.url('/search/issues'), args.workers,
+                                         args.concurrency).result()
+        results['scales'].append(report)
+
+    print(f'\n{"issues":>7} {"wall (s)":>9} {"issues/s":>9} {"lines/s":>9} {"search (s)":>10} {"fetch (s)":>10} '
+          f'{"prep (s)":>10} {"predict (s)":>10} {"write (s)":>10} {"p50 (ms)":>8} {"p99 (ms)":>8} {"mem (MB)":>8}')
+    for report in results['scales']:
+        printReport(report)
+
+    output = args.output or f"./results/e2e_benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results: {output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for num_issues, metric, previous, current in found:
+            print(f'REGRESSION {num_issues} issues {metric}: {current:.1f} vs {previous:.1f} in {args.baseline}')
+        if found:
+            sys.exit(1)
+        print(f'No regression past {args.tolerance:.0%} of {args.baseline}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark featurizing comment lines with the shipped CountVectorizer, the compact export's
+vectorizer (sorted vocabulary search, see utils/compactModel.py) and the HashingFeaturizer
+(vocabulary hash table, see utils/hashingFeaturizer.py).
+
+The distinct sample lines of classify_benchmark.py are repeated (with a suffix, so they
+stay distinct like the lines classifyCorpus featurizes) to reach the requested number of
+lines, and featurized in chunks of --chunk-size lines. The feature matrices are checked
+to be identical.
+
+Usage: python -m benchmarks.featurizer_benchmark [-n LINES] [--chunk-size CHUNK_SIZE]
+'''
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from joblib import load
+
+from benchmarks.classify_benchmark import loadSampleLines
+from utils.classifier import vectorizeLines, DEFAULT_CHUNK_SIZE, DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE
+from utils.compactModel import compactModel
+from utils.hashingFeaturizer import hashingFeaturizer
+
+def timed(featurize):
+    start = time.perf_counter()
+    result = featurize()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--lines', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    sample = list(dict.fromkeys(loadSampleLines()))
+    lines = [f'{sample[i % len(sample)]} {i // len(sample)}' for i in range(args.lines)]
+
+    vectorizer = load(DEFAULT_VECTORIZER_FILE)
+    with tempfile.TemporaryDirectory() as compact_dir:
+        compact_vectorizer = compactModel(DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE, compact_dir)[1]
+        featurizer, build_seconds = timed(lambda: hashingFeaturizer(compact_vectorizer))
+
+        expected, expected_seconds = timed(lambda: vectorizeLines(lines, vectorizer, args.chunk_size))
+        print(f'{len(lines)} lines, {expected.nnz} features')
+        print(f'CountVectorizer:   {expected_seconds * 1000:7.1f} ms')
+        for name, featurize in (('compact', compact_vectorizer), ('hashing', featurizer)):
+            counts, seconds = timed(lambda: vectorizeLines(lines, featurize, args.chunk_size))
+            assert (np.array_equal(counts.indptr, expected.indptr) and np.array_equal(counts.indices, expected.indices)
+                    and np.array_equal(counts.counts, expected.data))
+            print(f'{name + ":":18} {seconds * 1000:7.1f} ms ({expected_seconds / seconds:.2f}x)')
+
+    print(f'hash table built in {build_seconds * 1000:.1f} ms, identical feature matrices')
+
+if __name__ == '__main__':
+    main()
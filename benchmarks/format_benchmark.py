@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark the size and write time of the results file formats.
+
+A corpus of classified comment lines is built from the sample lines of
+classify_benchmark.py, spread over issues and comments the way the pipeline writes
+them (every line of a comment repeats its issue/comment URLs), and written with
+each of the result writers of utils/io.py. Formats whose dependency isn't installed
+(parquet needs pyarrow) are skipped.
+
+Usage: python -m benchmarks.format_benchmark [-n LINES] [--chunk-size CHUNK_SIZE]
+'''
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+
+from benchmarks.classify_benchmark import loadSampleLines
+from utils.io import RESULT_FORMATS, DEFAULT_WRITE_CHUNK_SIZE, newResultWriter
+
+CATEGORIES = ['Bug Reproduction', 'Expected Behaviour', 'Investigation and Exploration', 'Social Conversation',
+              'Solution Discussion', 'Task Progress', 'Usage', 'Workarounds']
+LINES_PER_COMMENT = 4
+COMMENTS_PER_ISSUE = 6
+
+def buildCorpus(lines, n):
+    corpus = []
+    for i in range(n):
+        comment = i // LINES_PER_COMMENT
+        issue = comment // COMMENTS_PER_ISSUE
+        corpus.append({
+            "issueID": 700000000 + issue,
+            "issueURL_API": f"https://api.github.com/repos/tensorflow/tensorflow/issues/{30000 + issue}",
+            "issueURL_HTML": f"https://github.com/tensorflow/tensorflow/issues/{30000 + issue}",
+            "commentLine": lines[i % len(lines)],
+            "commentURL": f"https://github.com/tensorflow/tensorflow/issues/{30000 + issue}#issuecomment-{800000000 + comment}",
+            "category": CATEGORIES[len(lines[i % len(lines)]) % len(CATEGORIES)]
+        })
+    return corpus
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--lines', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_WRITE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    corpus = buildCorpus(loadSampleLines(), args.lines)
+    print(f'{args.lines} lines, chunks of {args.chunk_size} rows')
+    print(f'{"format":8} {"size (KB)":>10} {"vs csv":>7} {"write (s)":>10} {"lines/sec":>10}')
+
+    csv_size = None
+    with tempfile.TemporaryDirectory() as directory:
+        for result_format in RESULT_FORMATS:
+            if result_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+                print(f'{result_format:8} skipped, pyarrow is not installed')
+                continue
+
+            start = time.perf_counter()
+            with newResultWriter('benchmark', directory + '/', result_format, args.chunk_size) as writer:
+                for i in range(0, len(corpus), args.chunk_size):
+                    writer.writeRows(corpus[i:i + args.chunk_size])
+            write_time = time.perf_counter() - start
+
+            size = os.path.getsize(writer.outfile)
+            csv_size = csv_size or size
+            print(f'{result_format:8} {size / 1024:10.0f} {size / csv_size:7.2f} {write_time:10.2f} '
+                  f'{args.lines / write_time:10.0f}')
+
+if __name__ == '__main__':
+    main()
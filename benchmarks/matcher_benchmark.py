@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark matching the search results of search_sample.json against many queries.
+
+Queries are words of the sample issue bodies (the most common ones matching many issues,
+the rarest ones few) and words found in none. Each of the sample issues is matched
+against every query:
+    - per query: issueMatchesQuery once per (issue, query), rescanning the title/body
+      once per query like the pipeline does for a single query
+    - direct: a QueryMatcher scanning the title/body once per term with str.find
+    - automaton: a QueryMatcher scanning the title/body once with its Aho-Corasick automaton
+
+Usage: python -m benchmarks.matcher_benchmark [-q QUERIES [QUERIES ...]] [--ignore-case] [--word-boundaries]
+'''
+import argparse
+import json
+import re
+import time
+from collections import Counter
+
+from utils import matcher
+from utils.filterResults import issueMatchesQuery
+from utils.matcher import QueryMatcher
+
+def loadSampleIssues(path='search_sample.json'):
+    with open(path) as f:
+        return json.load(f)['items']
+
+def sampleQueries(issues, n):
+    words = Counter(w for r in issues for w in re.findall(r'[A-Za-z_][A-Za-z0-9_.]{4,}', r['body'] or ''))
+    common = [w for w, count in words.most_common()]
+    found = common[:n // 2] + common[::-1][:n - n // 2 - n // 10]
+    return found + [f'missing_query_{i}' for i in range(n - len(found))]
+
+def timed(match, issues, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        matched = [match(r) for r in issues]
+    return (time.perf_counter() - start) / repeat, matched
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-q', '--queries', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--ignore-case', action='store_true')
+    parser.add_argument('--word-boundaries', action='store_true')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    issues = loadSampleIssues()
+    size = sum(len(r['title'] or '') + len(r['body'] or '') for r in issues)
+    print(f'{len(issues)} issues, {size / 1024:.0f} KB of title/body')
+    print(f'{"queries":>8} {"per query (ms)":>15} {"direct (ms)":>12} {"automaton (ms)":>15}')
+
+    default_max_terms = matcher.DIRECT_SCAN_MAX_TERMS
+    for n in args.queries:
+        queries = sampleQueries(issues, n)
+        times = []
+        if not args.ignore_case and not args.word_boundaries:
+            per_query, expected = timed(lambda r: [q for q in queries if issueMatchesQuery(r, q)], issues, args.repeat)
+            times.append(per_query)
+        else:
+            times.append(None)
+            expected = None
+
+        for max_terms in [len(queries), 0]:
+            matcher.DIRECT_SCAN_MAX_TERMS = max_terms
+            query_matcher = QueryMatcher(queries, args.ignore_case, args.word_boundaries)
+            seconds, matched = timed(query_matcher.matchingQueries, issues, args.repeat)
+            assert(expected is None or matched == expected)
+            expected = matched
+            times.append(seconds)
+        matcher.DIRECT_SCAN_MAX_TERMS = default_max_terms
+
+        print(f'{n:8} ' + ' '.join(f'{t * 1000:{w}.1f}' if t is not None else f'{"-":>{w}}'
+                                   for t, w in zip(times, [15, 12, 15])))
+
+if __name__ == '__main__':
+    main()
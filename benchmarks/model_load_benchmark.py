@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark cold model loading from the joblib files against their compact, memory-mapped
+export (see utils/compactModel.py).
+
+Each load runs in a fresh Python process, which loads the model and count vectorizer
+with a Classifier and classifies the sample lines of classify_benchmark.py, and reports
+the load time and its peak resident memory. The compact export is made (and verified)
+once beforehand, in a temporary directory, so compact loads measure cache hits.
+
+Usage: python -m benchmarks.model_load_benchmark [--runs RUNS]
+'''
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+
+LOAD_SCRIPT = '''
+import json, resource, sys, time
+from benchmarks.classify_benchmark import loadSampleLines
+from utils.miner import Classifier
+
+compact_dir = sys.argv[1]
+lines = loadSampleLines()
+start = time.perf_counter()
+classifier = Classifier(compact=bool(compact_dir), compact_dir=compact_dir)
+load_seconds = time.perf_counter() - start
+corpus = [{'commentLine': line} for line in lines]
+categories = [c['category'] for c in classifier.classifyCorpus(corpus, with_scores=True)]
+print(json.dumps({
+    'load_seconds': load_seconds,
+    'peak_memory_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024),
+    'categories': categories
+}))
+'''
+
+EXPORT_SCRIPT = '''
+import sys
+from utils.classifier import DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE
+from utils.compactModel import compactModel
+
+compactModel(DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE, sys.argv[1])
+'''
+
+# Load time and peak memory of a cold load, in a new process.
+def coldLoad(compact_dir=''):
+    result = subprocess.run([sys.executable, '-c', LOAD_SCRIPT, compact_dir], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as compact_dir:
+        # Exported in its own process: a child's peak memory starts from the parent's on Linux.
+        subprocess.run([sys.executable, '-c', EXPORT_SCRIPT, compact_dir], check=True)
+        joblib_runs = [coldLoad() for _ in range(args.runs)]
+        compact_runs = [coldLoad(compact_dir) for _ in range(args.runs)]
+
+    assert all(run['categories'] == joblib_runs[0]['categories'] for run in joblib_runs + compact_runs)
+
+    results = {}
+    for name, runs in (('joblib', joblib_runs), ('compact', compact_runs)):
+        results[name] = (statistics.median(run['load_seconds'] for run in runs),
+                         statistics.median(run['peak_memory_bytes'] for run in runs))
+        print(f'{name:8} load: {results[name][0] * 1000:7.1f} ms   peak memory: {results[name][1] / 2 ** 20:6.1f} MB')
+
+    print(f'load speedup: {results["joblib"][0] / results["compact"][0]:.1f}x, '
+          f'memory: -{(results["joblib"][1] - results["compact"][1]) / 2 ** 20:.1f} MB, '
+          f'identical predictions on {len(joblib_runs[0]["categories"])} lines')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Imported first so the --profile-startup report measures startup from here.
+from utils.lazy import timedLoad, printStartupProfile, START_TIME
+
+import argparse
+import time
+
+from utils.classifier import DEFAULT_PREDICTION_CACHE
+from utils.commentProcessor import processComment
+from utils.miner import Classifier
+from utils.server import MicroBatcher, newClassificationServer, DEFAULT_PORT, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT
+
+#
+# Serve the comment line classifier over HTTP, keeping the model, count vectorizer
+# and tokenizer loaded between requests. See utils/server.py for the endpoints.
+#
+parser = argparse.ArgumentParser()
+parser.add_argument('--host',
+					default='127.0.0.1',
+					help='(string) address to listen on')
+parser.add_argument('-p', '--port',
+					type=int,
+					default=DEFAULT_PORT,
+					help='(int) port to listen on')
+parser.add_argument('--socket',
+					metavar='PATH',
+					help='(string) listen on a Unix socket at this path instead of a TCP port')
+parser.add_argument('--max-batch-size',
+					type=int,
+					default=DEFAULT_MAX_BATCH_SIZE,
+					help='(int) max number of lines classified per micro-batch')
+parser.add_argument('--max-wait',
+					type=float,
+					default=DEFAULT_MAX_WAIT * 1000,
+					help='(float) milliseconds a micro-batch waits for more concurrent requests')
+parser.add_argument('--prediction-cache',
+					nargs='?',
+					const=DEFAULT_PREDICTION_CACHE,
+					metavar='PATH',
+					help='(string) reuse predictions persisted in a SQLite database '
+						 f'(default path: {DEFAULT_PREDICTION_CACHE})')
+parser.add_argument('--no-compact-model',
+					action='store_true',
+					help='load the joblib model files instead of their memory-mapped export (see utils/compactModel.py)')
+parser.add_argument('--hashing-featurizer',
+					action='store_true',
+					help='featurize lines by looking their tokens up in a hash table of the vocabulary, with numpy '
+						 '(see utils/hashingFeaturizer.py, ignored with --no-compact-model)')
+parser.add_argument('-v', '--verbose',
+					action='store_true',
+					help='log every request')
+parser.add_argument('--profile-startup',
+					action='store_true',
+					help='print how long startup and each lazily loaded dependency took')
+
+args = parser.parse_args()
+STARTUP_TIME = time.perf_counter() - START_TIME
+
+CLASSIFIER = Classifier(prediction_cache=args.prediction_cache, compact=not args.no_compact_model,
+						hashing=args.hashing_featurizer)
+
+# Load the tokenizer, stopwords and lemmatizer now rather than on the first request.
+timedLoad('warm up', lambda: processComment("Warming up the tokenizer and lemmatizer."))
+if args.profile_startup:
+	printStartupProfile(STARTUP_TIME)
+
+BATCHER = MicroBatcher(CLASSIFIER.model, CLASSIFIER.vectorizer,
+					   max_batch_size=args.max_batch_size,
+					   max_wait=args.max_wait / 1000,
+					   prediction_cache=CLASSIFIER.predictions)
+SERVER = newClassificationServer(BATCHER, args.host, args.port, args.socket, args.verbose)
+
+print(f"Classifying comments on {args.socket or f'http://{args.host}:{args.port}'} (Ctrl+C to stop)")
+try:
+	SERVER.serve_forever()
+except KeyboardInterrupt:
+	pass
+finally:
+	SERVER.server_close()
+	BATCHER.close()
+	CLASSIFIER.close()
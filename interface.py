@@ -17,12 +17,13 @@ class NonEmptyStringValidator(Validator):
                 message='Please enter a non-empty string',
                 cursor_position=0)
 
+# Above 1000 results the query is sharded by creation date (see utils/sharding.py)
 class MaxResultValidator(Validator):
     def validate(self, document):
-        ok = regex.match('^([1-9]|[1-9][0-9]|[1-9][0-9][0-9]|1000)$', document.text)
+        ok = regex.match('^[1-9][0-9]*$', document.text)
         if not ok:
             raise ValidationError(
-                message='Please enter max results range (1-1000)',
+                message='Please enter a positive max results number (above 1000 splits the query by creation date)',
                 cursor_position=len(document.text))  # Move cursor to end
 
 SORT_OPTIONS_MAP = {
@@ -47,7 +48,7 @@ INTERFACE = [
     {
         'type': 'input',
         'name': 'max_results',
-        'message': "Max number of results (1-1000):",
+        'message': "Max number of results (1000+ splits the query by creation date):",
         'validate': MaxResultValidator
     },
     {
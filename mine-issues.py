@@ -1,16 +1,25 @@
-import argparse
-import re
-
-from math import ceil
-from urllib.parse import urlencode
-from joblib import load
-
-from utils.commentProcessor import processComment
-from utils.filterResults import filterIssueWithQueryString
-from utils.io import printJSON, writeResultToCSV
-from utils.githubAPI import gitHubSearchQueryAPI, gitHubCommentAPI, loadAccessToken
+# Imported first so the --profile-startup report measures startup from here.
+from utils.lazy import printStartupProfile, START_TIME
 
-from interface import InitializeSearchInterface
+import argparse
+import importlib.util
+import logging
+import os
+import time
+
+from utils.classifier import DEFAULT_CHUNK_SIZE, DEFAULT_PREDICTION_CACHE
+from utils.commentProcessor import DEFAULT_BATCH_SIZE
+from utils.githubAPI import loadAccessToken, DEFAULT_CONCURRENCY, COMMENT_APIS
+from utils.batch import readQueries
+from utils.miner import Miner, Classifier
+from utils.scheduler import DEFAULT_MAX_RETRIES
+from utils.cache import DEFAULT_CACHE_DIR, DEFAULT_TTL, DEFAULT_MAX_SIZE
+from utils.checkpoint import RunJournal, journalPath, newRunId
+from utils.state import QueryState
+from utils.store import ResultStore, DEFAULT_DB_PATH
+from utils.io import RESULT_FORMATS, MERGEABLE_FORMATS
+from utils.matcher import parseQuery
+from utils.metrics import resetMetrics
 
 #
 # 0)
@@ -31,14 +40,24 @@ parser = argparse.ArgumentParser()
 parser.add_argument('-i', '--interactive', action='store_true',
 					help="**toggle the interactive CLI**")
 
-parser.add_argument('query')
+parser.add_argument('query', nargs='?')
+parser.add_argument('--queries',
+					metavar='FILE',
+					help='(string) mine every query of a file (one per line) in one batch, '
+						 'fetching and classifying the issues they have in common once')
+parser.add_argument('--ignore-case',
+					action='store_true',
+					help='match the query with the title/body of search results case insensitively')
+parser.add_argument('--word-boundaries',
+					action='store_true',
+					help='only match the query terms with whole words of the title/body of search results')
 
 parser.add_argument('-v', '--verbose', action='store_true',
 					help="print additional logs")
 parser.add_argument('-m', '--max-results',
 					type=int,
 					default=1000,
-					help="(int) max results to query")
+					help="(int) max results to query, above 1000 the query is sharded by creation date")
 parser.add_argument('-s', '--sort-by',
 					type=sort_by_arg_checker,
 					default='comments',
@@ -52,192 +71,266 @@ parser.add_argument('-f', '--filter',
 					nargs='*',
 					help='(string) category to filter from results')
 
-args = parser.parse_args()
-
-#
-# 1)
-# Initialize CLI/Get params
-#
-
-params = {}
-FILTERED_CATEGORIES = []
-
-# If user entered the '-i' or '--interface' option, trigger the pyinquirer interactive interface.
-if args.interactive:
-	params = InitializeSearchInterface(args.query)
-	FILTERED_CATEGORIES = params['filter']
-else:
-	params['q'] = args.query
-	params['max_results'] = args.max_results
-	params['sort_by'] = args.sort_by
-	params['print_logs'] = args.verbose
-	params['out_file_prefix'] = args.prefix_filename
-
-	if args.filter:
-		for f in args.filter:
-			FILTERED_CATEGORIES.append(" ".join(f))
-
-PAGE = 1
-
-SEARCH_QUERY = params['q']
-
-max_results_param = int(params['max_results'])
-pages_per_100 =  ceil(max_results_param/100)
-MAX_PAGES_TO_QUERY = pages_per_100 if pages_per_100 > 1 else 1
-
-RESULTS_PER_PAGE = 100 if max_results_param > 100 else max_results_param
-SORT_BY = params['sort_by']
-PRINT_LOGS = params['print_logs']
-OUTPUT_FILE_PREFIX = params['out_file_prefix']
-
-# Load GitHub personal access token into memory.
-loadAccessToken()
+parser.add_argument('-c', '--concurrency',
+					type=int,
+					default=DEFAULT_CONCURRENCY,
+					help='(int) number of issues to fetch comments for concurrently')
+parser.add_argument('--api',
+					choices=COMMENT_APIS,
+					default='rest',
+					help='fetch comments with one REST request per page of comments of each issue, or in bulk with the GraphQL API')
+parser.add_argument('--shard',
+					action='store_true',
+					help='split the query by creation date to go past the 1000 results per search limit')
+parser.add_argument('--incremental',
+					action='store_true',
+					help='only mine issues/comments updated since the last run of the query and merge them into its results')
+parser.add_argument('--max-retries',
+					type=int,
+					default=DEFAULT_MAX_RETRIES,
+					help='(int) retries per request on rate limit and server errors')
+parser.add_argument('--no-cache',
+					action='store_true',
+					help='disable the on-disk HTTP response cache')
+parser.add_argument('--cache-dir',
+					default=DEFAULT_CACHE_DIR,
+					help='(string) directory of the on-disk HTTP response cache')
+parser.add_argument('--cache-ttl',
+					type=int,
+					default=DEFAULT_TTL,
+					help='(int) seconds a cached response is served without revalidating it')
+parser.add_argument('--cache-max-size',
+					type=int,
+					default=DEFAULT_MAX_SIZE // (1024 * 1024),
+					help='(int) max size of the response cache in MB')
+parser.add_argument('--offline',
+					action='store_true',
+					help='serve responses only from the cache, without any network request')
+parser.add_argument('--resume',
+					metavar='RUN_ID',
+					help='(string) resume an interrupted run, skipping its completed search pages and issues')
+parser.add_argument('-w', '--workers',
+					type=int,
+					default=1,
+					help='(int) number of processes to preprocess comment lines with')
+parser.add_argument('--batch-size',
+					type=int,
+					default=DEFAULT_BATCH_SIZE,
+					help='(int) number of comment lines tokenized per batch when preprocessing')
+parser.add_argument('--chunk-size',
+					type=int,
+					default=DEFAULT_CHUNK_SIZE,
+					help='(int) number of comment lines vectorized per chunk when classifying')
+parser.add_argument('--scores',
+					action='store_true',
+					help='add the predicted category probability as a categoryScore column')
+parser.add_argument('--prediction-cache',
+					nargs='?',
+					const=DEFAULT_PREDICTION_CACHE,
+					metavar='PATH',
+					help='(string) reuse the predictions of processed lines across runs, persisted in a SQLite database '
+						 f'(default path: {DEFAULT_PREDICTION_CACHE})')
+parser.add_argument('--no-compact-model',
+					action='store_true',
+					help='load the joblib model files instead of their memory-mapped export (see utils/compactModel.py)')
+parser.add_argument('--hashing-featurizer',
+					action='store_true',
+					help='featurize lines by looking their tokens up in a hash table of the vocabulary, with numpy '
+						 '(see utils/hashingFeaturizer.py, ignored with --no-compact-model)')
+
+parser.add_argument('--backend',
+					choices=['csv', 'sqlite'],
+					default='csv',
+					help='write results to timestamped CSV files or into the SQLite results database')
+parser.add_argument('--db',
+					default=DEFAULT_DB_PATH,
+					help='(string) path of the SQLite results database used by --backend sqlite')
+parser.add_argument('--format',
+					choices=RESULT_FORMATS,
+					default='csv',
+					help='format of the results files written by --backend csv')
+
+parser.add_argument('--log-level',
+					choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+					help='level of the logs, DEBUG logs every API request (default: INFO, DEBUG with -v)')
+parser.add_argument('--report',
+					nargs='?',
+					const=True,
+					metavar='PATH',
+					help='(string) write a JSON run report of stage timings, request latencies, bytes downloaded, '
+						 'throughput and peak memory (default path: ./results/<RUN_ID>.report.json)')
+parser.add_argument('--prometheus',
+					metavar='PATH',
+					help='(string) also write the run report in Prometheus text format (requires prometheus_client)')
+
+parser.add_argument('--profile-startup',
+					action='store_true',
+					help='print how long startup and each lazily loaded dependency took')
 
 #
-# 2)
-# Search for issues using GitHub's search query API
+# The mining pipeline itself is the utils/miner.py library API, this script parses the
+# command line (or runs the interactive interface) and mines its query with a Miner.
 #
-searchResults = []
-GITHUB_API_SEARCH_ISSUES_URL = "https://api.github.com/search/issues"
-PAGES_LEFT_TO_QUERY = True
-
-while PAGES_LEFT_TO_QUERY:
-	encodedQueryString = urlencode({
-		'q': SEARCH_QUERY,
-		'per_page': RESULTS_PER_PAGE,
-		'sort': SORT_BY,
-		'order': 'desc',
-		'page': PAGE
-	})
-
-	searchUrl = GITHUB_API_SEARCH_ISSUES_URL + "?" + encodedQueryString
-
-
-	print("[SEARCH QUERY GET]: " + searchUrl)
-
-	pageResults = gitHubSearchQueryAPI(searchUrl)
-
-	# If no more results, stop querying additional pages.
-	if len(pageResults['items']) == 0:
-		PAGES_LEFT_TO_QUERY = False
+def main():
+	args = parser.parse_args()
+	# A resumed run may omit its query, it is read from the run's journal.
+	if (args.query is None) == (args.queries is None) and (args.resume is None or args.query is not None):
+		parser.error("give either a query or a --queries file")
+	if args.queries and (args.incremental or args.interactive):
+		parser.error("--queries can't be combined with --incremental or --interactive")
+	if args.incremental and args.backend == 'csv' and args.format not in MERGEABLE_FORMATS:
+		parser.error(f"--incremental merges results files of format: {', '.join(MERGEABLE_FORMATS)}")
+	if args.prometheus and importlib.util.find_spec('prometheus_client') is None:
+		parser.error("--prometheus requires prometheus_client (pip install prometheus-client)")
+	if args.query is not None:
+		try:
+			parseQuery(args.query)
+		except ValueError as e:
+			parser.error(str(e))
+	# Only the miner's own logs (utils.*) are leveled, third party logs are kept to warnings.
+	logging.basicConfig(level=logging.WARNING, format='%(message)s')
+	logging.getLogger('utils').setLevel(args.log_level or ('DEBUG' if args.verbose else 'INFO'))
+	metrics = resetMetrics()
+	startup_time = time.perf_counter() - START_TIME
+
+	#
+	# 1)
+	# Initialize CLI/Get params
+	#
+
+	params = {}
+	filtered_categories = []
+
+	# Every run records its completed work to a checkpoint journal so it can be resumed.
+	run_id = args.resume or newRunId()
+	if args.resume is not None and not os.path.exists(journalPath(run_id)):
+		parser.error(f"no run {run_id} to resume ({journalPath(run_id)} not found)")
+	journal = RunJournal(run_id)
+
+	# A resumed run reuses the params it was started with.
+	if args.resume is not None:
+		if journal.params is None:
+			parser.error(f"run {run_id} can't be resumed, its journal has no params ({journal.path})")
+		if args.query is not None and args.query != journal.params['q']:
+			parser.error(f"run {run_id} was started with the query {journal.params['q']!r}, not {args.query!r}")
+		if args.queries is not None and readQueries(args.queries) != journal.params.get('queries'):
+			parser.error(f"run {run_id} was started with other queries than {args.queries}")
+	if journal.params is not None:
+		params = journal.params
+		filtered_categories = params['filter']
+		print(f"Resuming run {run_id}: {len(journal.search_pages)} search pages and "
+			  f"{len(journal.issues)} issues already completed.")
+	# If user entered the '-i' or '--interface' option, trigger the pyinquirer interactive interface.
+	elif args.interactive:
+		# The interactive UI libraries are only loaded when the interface is used.
+		from interface import InitializeSearchInterface
+		params = InitializeSearchInterface(args.query)
+		filtered_categories = params['filter']
 	else:
-		# If new incoming page results will put us over user defined search limit
-		# Trim the results down to the user defined limit and stop query
-		searchResults += pageResults['items']
-
-		if len(searchResults) > max_results_param:
-			searchResults = searchResults[0:max_results_param]
-			PAGES_LEFT_TO_QUERY = False
-
-	PAGE += 1
-
-	if PAGE > MAX_PAGES_TO_QUERY:
-		PAGES_LEFT_TO_QUERY = False
-
-
-'''
-### DEV BLOCK START
-This uses a search_sample.json file results for testing/dev purpose
-'''
-# Hard coded params for later use
-# SEARCH_QUERY = ""
-# PRINT_LOGS = True
-# OUTPUT_FILE_PREFIX = ''
-# with open("search_sample.json") as f:
-# 	searchResults = json.load(f)
-'''
-### DEV BLOCK END
-'''
-
-#
-# 3)
-# Omit any search results that whose body/title does not contain our search query
-# Checks for substring match
-#
-print(str(len(searchResults)) + " results retrieved.")
-
-# Filter out search results that does not contain our query in the body/title
-MATCHED_RESULTS, OMITTED_RESULTS = filterIssueWithQueryString(searchResults, SEARCH_QUERY)
-
-print(str(len(MATCHED_RESULTS)) + " results title/body closely matched with query.")
-print(str(len(OMITTED_RESULTS)) + " results omitted due to lack of match with query.")
-
-OMITTED_ISSUES = []
-for result in OMITTED_RESULTS:
-	OMITTED_ISSUES.append({
-		"issueID": result['id'],
-		"issueURL": result['html_url'],
-		"title": result['title'],
-		"body": result['body']
-	})
-
-if PRINT_LOGS:
-	print('\n OMITTED ISSUES \n')
-	printJSON(OMITTED_ISSUES)
-
-'''
-### DEV BLOCK START
-This slices the first 10 matches so we don't overload GitHub's API limit
-'''
-# Dev code to limit results to be processed to not further overload the API
-# MATCHED_RESULTS = MATCHED_RESULTS[0:10]
-
-# Test comment API URL:
-# https://api.github.com/repos/tensorflow/tensorflow/issues/27880/comments
-'''
-### DEV BLOCK END
-'''
-
-#
-# 4)
-# For each of the results (MATCHED_RESULTS) that matches our query
-# Fetch their comments and clean/tokenize them.
-#
-
-# Hold all comment lines, and tag each individual lines with the comment/issue related data
-# i.e URLs, IDs, links etc...
-CORPUS = []
-
-# Hold all issues with their comments API url to query
-issues_api_urls = []
-
-for r in MATCHED_RESULTS:
-	# For each issue, append to issues_api_urls the comments_url API endpoint to query the comments
-	issues_api_urls.append({
-		"issueID": r['id'],
-		"comments_url": r['comments_url'],
-		"issueURL_HTML": r['html_url']
-	})
-
-print("\n")
-
-# For each of the comment_url in the list to query, query for all the comments
-# and add them to the corpus.
-CORPUS += gitHubCommentAPI(issues_api_urls)
-
-#
-# 5)
-# Once we have fetch all the comments, and split them up into lines and tokenized them
-# Load the prediction model from the serialized file and predict the comments.
-#
-### Load Model/Vector - Use the serialized model/count vector files included
-model = load("models/GitHub_comments_logisticRegression.model")
-
-vectorizer = load("models/GitHub_comments_logisticRegression.countVector")
-
-for c in CORPUS:
-	test_vector = vectorizer.transform([c['commentLine']])
-	c['category'] = model.predict(test_vector)[0]
-
-# Filter out any results that has category that is in the list of categories to be omitted from results.
-CORPUS = [c for c in CORPUS if c['category'] not in FILTERED_CATEGORIES]
-
-# Print the resulting corpus with the category predicted for each comment.
-if PRINT_LOGS:
-	print('\n CLASSIFIED COMMENTS \n')
-	printJSON(CORPUS)
-
-print("\n")
-writeResultToCSV(OMITTED_ISSUES, OUTPUT_FILE_PREFIX + '_OMITTED_ISSUES')
-writeResultToCSV(CORPUS, OUTPUT_FILE_PREFIX + '_CLASSIFIED_COMMENTS')
-print("\n")
+		params['q'] = args.query
+		if args.queries:
+			params['queries'] = readQueries(args.queries)
+		params['max_results'] = args.max_results
+		params['sort_by'] = args.sort_by
+		params['print_logs'] = args.verbose
+		params['out_file_prefix'] = args.prefix_filename
+
+		if args.filter:
+			for f in args.filter:
+				filtered_categories.append(" ".join(f))
+
+	params['filter'] = filtered_categories
+	journal.recordParams(params)
+	print(f"Run ID: {run_id} (resume with --resume {run_id})")
+
+	query = params['q']
+	queries = params.get('queries')
+	max_results = int(params['max_results'])
+
+	# Load GitHub personal access token into memory.
+	loadAccessToken()
+	store = ResultStore(args.db) if args.backend == 'sqlite' else None
+
+	#
+	# 2)
+	# Load the prediction model from the serialized files included, and set up the miner
+	# (HTTP session, rate limit scheduler, response cache, preprocessing workers).
+	# Predictions of identical processed lines are shared by the whole run (and across runs with --prediction-cache).
+	#
+	classifier = Classifier(prediction_cache=args.prediction_cache, compact=not args.no_compact_model,
+							hashing=args.hashing_featurizer)
+	miner = Miner(classifier,
+				  concurrency=args.concurrency,
+				  workers=args.workers,
+				  batch_size=args.batch_size,
+				  chunk_size=args.chunk_size,
+				  max_retries=args.max_retries,
+				  cache=not args.no_cache,
+				  cache_dir=args.cache_dir,
+				  cache_ttl=args.cache_ttl,
+				  cache_max_size=args.cache_max_size * 1024 * 1024,
+				  offline=args.offline,
+				  result_format=args.format,
+				  store=store,
+				  print_logs=params['print_logs'],
+				  api=args.api,
+				  ignore_case=args.ignore_case,
+				  word_boundaries=args.word_boundaries)
+
+	#
+	# 3)
+	# Stream the issues through the mining pipeline:
+	# - Search for issues using GitHub's search query API
+	# - Omit any search results whose body/title does not contain our search query (substring match)
+	# - For each of the results that matches our query, fetch their comments
+	#   and split them up into lines tagged with the comment/issue related data (URLs, IDs, links etc...)
+	# - Clean/tokenize the comment lines and predict their category
+	# - Write the omitted issues and the classified comment lines to the results files as they are produced
+	#
+	with miner, classifier:
+		if queries:
+			# Issues matched by several queries are only fetched and classified once.
+			summary = miner.mineBatch(queries, max_results, params['sort_by'], params['out_file_prefix'],
+									  filtered_categories=filtered_categories,
+									  with_scores=args.scores,
+									  shard=args.shard or None,
+									  journal=journal,
+									  run_id=run_id)
+		else:
+			summary = miner.mine(query, max_results, params['sort_by'], params['out_file_prefix'],
+								 filtered_categories=filtered_categories,
+								 with_scores=args.scores,
+								 shard=args.shard or None,
+								 journal=journal,
+								 state=QueryState(query, filtered_categories) if args.incremental else None,
+								 run_id=run_id)
+	journal.close()
+	if store is not None:
+		store.close()
+
+	print("\n")
+	print(f"{summary['lines']} comment lines classified, {summary['written']} written to results.")
+	print(f"{summary['predicted']} distinct lines predicted by the model "
+		  f"(dedup ratio {summary['lines'] / max(summary['predicted'], 1):.1f}x)"
+		  + (f", {classifier.predictions.persisted_hits} predictions reused from {args.prediction_cache}."
+			 if args.prediction_cache else "."))
+	if queries:
+		print(f"{len(queries)} queries matched {summary['matched']} issues, {summary['issues']} unique: "
+			  f"{summary['issues_saved']} issue fetches and {summary['fetches_saved']} comment requests saved.")
+		for batch_query, query_summary in summary['queries'].items():
+			print(f"  {batch_query}: {query_summary['written']} lines written to {query_summary['results_file']}")
+	if args.incremental:
+		print(f"{summary['unchanged']} issues unchanged since the last run, results: {summary['results_file']}")
+	if miner.cache is not None:
+		miner.cache.printSummary()
+	if args.report:
+		report_path = f"./results/{run_id}.report.json" if args.report is True else args.report
+		metrics.writeReport(report_path, summary)
+		print(f"Run report: {report_path}")
+	if args.prometheus:
+		metrics.writePrometheus(args.prometheus, summary)
+	if args.profile_startup:
+		printStartupProfile(startup_time)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,45 @@
+import argparse
+
+from utils.store import ResultStore, DEFAULT_DB_PATH
+
+#
+# Query the SQLite results store written by `mine-issues.py --backend sqlite`
+# without loading every run into memory.
+#
+parser = argparse.ArgumentParser()
+parser.add_argument('--db',
+					default=DEFAULT_DB_PATH,
+					help='(string) path of the results database')
+
+subparsers = parser.add_subparsers(dest='command', required=True)
+
+categories_parser = subparsers.add_parser('categories', help='count comment lines per category')
+categories_parser.add_argument('-q', '--query',
+							   help='(string) only count the lines found by runs of this query')
+categories_parser.add_argument('-r', '--run',
+							   help='(string) only count the lines found by this run id')
+categories_parser.add_argument('-x', '--exclude',
+							   action='append',
+							   default=[],
+							   help='(string) category to leave out of the counts, can be repeated')
+
+issue_parser = subparsers.add_parser('issue', help='print the classified comment lines of an issue')
+issue_parser.add_argument('issue_id', type=int)
+
+subparsers.add_parser('runs', help='list the runs in the database')
+
+args = parser.parse_args()
+
+store = ResultStore(args.db)
+
+if args.command == 'categories':
+	for category, count in store.categoryCounts(query=args.query, run_id=args.run, exclude=args.exclude):
+		print(f'{count:8d}  {category}')
+elif args.command == 'issue':
+	for comment_url, line_number, comment_line, category in store.issueLines(args.issue_id):
+		print(f'{comment_url} [{line_number}] ({category}): {comment_line}')
+elif args.command == 'runs':
+	for run_id, query, started_at, lines in store.runs():
+		print(f'{run_id}  {started_at}  {lines:8d} lines  {query}')
+
+store.close()
@@ -0,0 +1,89 @@
+import csv
+
+from joblib import load
+
+from utils.batch import runBatchPipeline, readQueries, queryFilePrefix
+from utils.matcher import QueryMatcher
+from test.fakeGitHubServer import FakeGitHubServer
+
+MODEL = load("models/GitHub_comments_logisticRegression.model")
+VECTORIZER = load("models/GitHub_comments_logisticRegression.countVector")
+
+TITLES = {n: "Bug in tf.function" for n in range(1, 4)}
+TITLES.update({n: "tf.function inside tf.data map" for n in range(4, 7)})
+TITLES.update({n: "tf.data is slow" for n in range(7, 10)})
+
+# Every search returns the 9 issues, the query filter keeps those mentioning the query.
+def setupIssues(server):
+    items = [{
+        "id": number,
+        "title": title,
+        "body": "",
+        "comments": 2,
+        "comments_url": server.url(f"/repos/ponder-lab/test/issues/{number}/comments"),
+        "html_url": f"https://github.com/ponder-lab/test/issues/{number}"
+    } for number, title in TITLES.items()]
+    server.route('/search/issues', {"total_count": len(items), "items": items})
+
+    for number in TITLES:
+        server.route(f"/repos/ponder-lab/test/issues/{number}/comments", [{
+            "body": f"Thanks!\nI can reproduce issue {number}.",
+            "html_url": f"https://github.com/ponder-lab/test/issues/{number}#issuecomment-{n}",
+            "issue_url": server.url(f"/repos/ponder-lab/test/issues/{number}"),
+            "user": {"login": "y3pio", "type": "User"}
+        } for n in range(2)])
+
+def readResults(path):
+    with open(path) as f:
+        return list(csv.DictReader(f))
+
+def test_batch_fetches_shared_issues_once(tmp_path):
+    with FakeGitHubServer(rate_limit_headers=True) as server:
+        setupIssues(server)
+        summary = runBatchPipeline(["tf.function", "tf.data"], 100, 'comments', 'test', MODEL, VECTORIZER,
+                                   filtered_categories=['Social Conversation'],
+                                   search_url=server.url('/search/issues'), results_dir=str(tmp_path) + '/')
+        fetched = sorted(r['path'] for r in server.requests if r['path'].endswith('/comments'))
+
+    assert(fetched == sorted(f"/repos/ponder-lab/test/issues/{n}/comments" for n in TITLES))
+    assert(summary['matched'] == 12 and summary['issues'] == 9)
+    assert((summary['issues_saved'], summary['fetches_saved']) == (3, 3))
+    assert(summary['lines'] == 9 * 4)
+
+    tf_function = summary['queries']["tf.function"]
+    tf_data = summary['queries']["tf.data"]
+    assert((tf_function['matched'], tf_function['omitted'], tf_function['lines']) == (6, 3, 24))
+    assert((tf_data['matched'], tf_data['omitted'], tf_data['lines']) == (6, 3, 24))
+
+    function_lines = readResults(tf_function['results_file'])
+    data_lines = readResults(tf_data['results_file'])
+    assert(len(function_lines) == tf_function['written'] < 24)
+    assert({int(l['issueID']) for l in function_lines} <= set(range(1, 7)))
+    assert({int(l['issueID']) for l in data_lines} <= set(range(4, 10)))
+    assert(all(l['category'] != 'Social Conversation' for l in function_lines + data_lines))
+    assert(tf_function['results_file'].split('/')[-1].startswith('testtf_function_CLASSIFIED_COMMENTS'))
+
+def test_batch_scans_each_issue_once(tmp_path, monkeypatch):
+    scanned = []
+    matchingQueries = QueryMatcher.matchingQueries
+
+    def countedMatchingQueries(self, r):
+        scanned.append(r['id'])
+        return matchingQueries(self, r)
+    monkeypatch.setattr(QueryMatcher, 'matchingQueries', countedMatchingQueries)
+    with FakeGitHubServer(rate_limit_headers=True) as server:
+        setupIssues(server)
+        summary = runBatchPipeline(["TF.FUNCTION", "tf.data", "tf.dat"], 100, 'comments', 'test', MODEL, VECTORIZER,
+                                   ignore_case=True, word_boundaries=True,
+                                   search_url=server.url('/search/issues'), results_dir=str(tmp_path) + '/')
+
+    # Every search returns the 9 issues, their title/body are scanned once for the 3 queries.
+    assert(sorted(scanned) == list(TITLES))
+    assert([summary['queries'][q]['matched'] for q in ["TF.FUNCTION", "tf.data", "tf.dat"]] == [6, 6, 0])
+
+def test_read_queries(tmp_path):
+    path = tmp_path / "queries.txt"
+    path.write_text("# TensorFlow APIs\n@tf.function\n\ntf.data  \n@tf.function\n")
+
+    assert(readQueries(str(path)) == ["@tf.function", "tf.data"])
+    assert(queryFilePrefix("results_", "@tf.function") == "results_tf_function")
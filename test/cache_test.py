@@ -0,0 +1,73 @@
+import pytest
+import requests
+
+from utils.cache import ResponseCache, CacheMissError
+from test.fakeGitHubServer import FakeGitHubServer
+
+ETAG = '"abc123"'
+
+# Route serving a body with an ETag, answering 304 when the ETag is sent back.
+def etagged(body):
+    def respond(path, query, headers):
+        if headers.get('If-None-Match') == ETAG:
+            return 304, {'ETag': ETAG}, None
+        return 200, {'ETag': ETAG, 'Link': '<http://localhost/next>; rel="next"'}, body
+
+    return respond
+
+def fetch(url, headers):
+    return requests.get(url, headers=headers)
+
+def test_cache_revalidates_with_etag(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    with FakeGitHubServer() as server:
+        server.route('/comments', etagged([{'body': 'cached comment'}]))
+        first = cache.get(server.url('/comments'), fetch)
+        second = cache.get(server.url('/comments'), fetch)
+
+    assert(first.json() == second.json() == [{'body': 'cached comment'}])
+    assert(second.links['next']['url'] == 'http://localhost/next')
+    assert('If-None-Match' not in server.requests[0]['headers'])
+    assert(server.requests[1]['headers']['If-None-Match'] == ETAG)
+    assert((cache.hits, cache.revalidated, cache.misses) == (1, 1, 1))
+
+def test_cache_serves_fresh_entries_without_request(tmp_path):
+    with FakeGitHubServer() as server:
+        server.route('/comments', etagged([]))
+        ResponseCache(str(tmp_path)).get(server.url('/comments'), fetch)
+
+        # A new cache instance over the same directory reuses the stored entry.
+        cache = ResponseCache(str(tmp_path), ttl=3600)
+        cache.get(server.url('/comments'), fetch)
+
+    assert(len(server.requests) == 1)
+    assert(cache.hits == 1)
+
+def test_cache_offline_mode(tmp_path):
+    with FakeGitHubServer() as server:
+        server.route('/comments', etagged(['online']))
+        ResponseCache(str(tmp_path)).get(server.url('/comments'), fetch)
+
+        cache = ResponseCache(str(tmp_path), offline=True)
+        assert(cache.get(server.url('/comments'), fetch).json() == ['online'])
+        with pytest.raises(CacheMissError):
+            cache.get(server.url('/not-cached'), fetch)
+
+    assert(len(server.requests) == 1)
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    with FakeGitHubServer() as server:
+        for name in ['a', 'b', 'c']:
+            server.route('/' + name, ['x' * 100])
+
+        cache = ResponseCache(str(tmp_path), max_size=700)
+        cache.get(server.url('/a'), fetch)
+        cache.get(server.url('/b'), fetch)
+        # Use 'a' again so 'b' is the least recently used entry.
+        cache.get(server.url('/a'), fetch)
+        cache.get(server.url('/c'), fetch)
+
+    assert(cache.lookup(server.url('/b')) is None)
+    assert(cache.lookup(server.url('/a')) is not None)
+    assert(cache.lookup(server.url('/c')) is not None)
+    assert(cache.size <= 700)
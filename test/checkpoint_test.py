@@ -0,0 +1,60 @@
+from utils.checkpoint import RunJournal
+from utils.githubAPI import gitHubCommentAPI
+from test.fakeGitHubServer import FakeGitHubServer
+
+def test_journal_replays_completed_work(tmp_path):
+    journal = RunJournal('run', str(tmp_path))
+    journal.recordParams({'q': 'query', 'filter': []})
+    journal.recordSearchPage('https://api.github.com/search/issues?q=query&page=1', {'items': [{'id': 1}]})
+    journal.recordIssue(1, [{'issueID': 1, 'commentLine': 'hello'}])
+    journal.close()
+
+    # Simulate a run killed in the middle of writing a record.
+    with open(journal.path, 'a') as f:
+        f.write('{"type": "issue", "issueID": 2, "li')
+
+    resumed = RunJournal('run', str(tmp_path))
+    assert(resumed.params == {'q': 'query', 'filter': []})
+    assert(resumed.searchPage('https://api.github.com/search/issues?q=query&page=1') == {'items': [{'id': 1}]})
+    assert(resumed.searchPage('https://api.github.com/search/issues?q=query&page=2') is None)
+    assert(resumed.issueLines(1) == [{'issueID': 1, 'commentLine': 'hello'}])
+    assert(resumed.issueLines(2) is None)
+
+def test_comment_api_skips_journaled_issues(tmp_path):
+    journal = RunJournal('run', str(tmp_path))
+    journaled_lines = [{
+        'issueID': 1,
+        'issueURL_API': 'https://api.github.com/repos/ponder-lab/test/issues/1',
+        'issueURL_HTML': 'https://github.com/ponder-lab/test/issues/1',
+        'commentLine': 'from journal',
+        'commentURL': 'https://github.com/ponder-lab/test/issues/1#issuecomment-1'
+    }]
+    journal.recordIssue(1, journaled_lines)
+    # Journaled work is skipped by the runs resuming it.
+    journal.close()
+    journal = RunJournal('run', str(tmp_path))
+
+    with FakeGitHubServer() as server:
+        issues = []
+        for number in [1, 2]:
+            path = f"/repos/ponder-lab/test/issues/{number}/comments"
+            server.route(path, [{
+                "body": "Fetched comment",
+                "html_url": f"https://github.com/ponder-lab/test/issues/{number}#issuecomment-1",
+                "issue_url": server.url(f"/repos/ponder-lab/test/issues/{number}"),
+                "user": {"login": "y3pio", "type": "User"}
+            }])
+            issues.append({
+                "issueID": number,
+                "comments_url": server.url(path),
+                "issueURL_HTML": f"https://github.com/ponder-lab/test/issues/{number}"
+            })
+
+        results = gitHubCommentAPI(issues, journal=journal)
+        requested = [r['path'] for r in server.requests]
+
+    journal.close()
+    assert(requested == ["/repos/ponder-lab/test/issues/2/comments"])
+    assert(results[0] == journaled_lines[0])
+    assert(results[1]['issueID'] == 2)
+    assert(RunJournal('run', str(tmp_path)).issueLines(2) == results[1:])
@@ -0,0 +1,86 @@
+from joblib import load
+from utils.classifier import classifyCorpus, PredictionCache, modelHash
+
+MODEL = load("models/GitHub_comments_logisticRegression.model")
+VECTORIZER = load("models/GitHub_comments_logisticRegression.countVector")
+
+TEST_LINES = [
+    "hello pre processed string",
+    "thanks lot fix",
+    "QUOTE",
+    "CODE",
+    "URL",
+    "try run code get error",
+    "work around set flag false",
+    "SCREEN_NAME could take look pr",
+    "merged close issue",
+    "",
+]
+
+def buildCorpus():
+    return [{"commentLine": line} for line in TEST_LINES]
+
+def test_classify_corpus_matches_per_line_predict():
+    expected = [MODEL.predict(VECTORIZER.transform([line]))[0] for line in TEST_LINES]
+
+    for chunk_size in [1, 3, 1000]:
+        corpus = classifyCorpus(buildCorpus(), MODEL, VECTORIZER, chunk_size=chunk_size)
+        assert([c['category'] for c in corpus] == expected)
+
+def test_classify_corpus_scores():
+    corpus = classifyCorpus(buildCorpus(), MODEL, VECTORIZER, with_scores=True)
+    for c in corpus:
+        assert(0.0 < c['categoryScore'] <= 1.0)
+
+def test_classify_empty_corpus():
+    assert(classifyCorpus([], MODEL, VECTORIZER) == [])
+
+class CountingModel:
+    def __init__(self, model):
+        self.model = model
+        self.predicted = []
+
+    def predict(self, features):
+        self.predicted.append(features.shape[0])
+        return self.model.predict(features)
+
+    def predict_proba(self, features):
+        return self.model.predict_proba(features)
+
+def test_classify_corpus_predicts_identical_lines_once():
+    model = CountingModel(MODEL)
+    lines = TEST_LINES * 3
+    expected = [MODEL.predict(VECTORIZER.transform([line]))[0] for line in lines]
+
+    corpus = classifyCorpus([{"commentLine": line} for line in lines], model, VECTORIZER, with_scores=True)
+    assert([c['category'] for c in corpus] == expected)
+    assert(model.predicted == [len(TEST_LINES)])
+    assert(corpus[0]['categoryScore'] == corpus[len(TEST_LINES)]['categoryScore'])
+
+def test_prediction_cache_across_batches_and_runs(tmp_path):
+    path = str(tmp_path / "predictions.db")
+    model_hash = modelHash("models/GitHub_comments_logisticRegression.model",
+                           "models/GitHub_comments_logisticRegression.countVector")
+    model = CountingModel(MODEL)
+
+    cache = PredictionCache(model_hash, path)
+    first = classifyCorpus(buildCorpus()[:5], model, VECTORIZER, cache=cache)
+    second = classifyCorpus(buildCorpus(), model, VECTORIZER, cache=cache)
+    assert(model.predicted == [5, len(TEST_LINES) - 5])
+    assert((cache.lines, cache.predicted) == (5 + len(TEST_LINES), len(TEST_LINES)))
+    cache.close()
+
+    # A later run reuses the persisted predictions, but not for another model.
+    cache = PredictionCache(model_hash, path)
+    rerun = classifyCorpus(buildCorpus(), model, VECTORIZER, cache=cache)
+    assert(model.predicted == [5, len(TEST_LINES) - 5])
+    assert(rerun == second and cache.persisted_hits == len(TEST_LINES))
+    assert(cache.dedupRatio() == len(TEST_LINES))
+
+    # Predictions cached without scores are predicted again when scores are requested.
+    scored = classifyCorpus(buildCorpus(), model, VECTORIZER, with_scores=True, cache=PredictionCache(model_hash, path))
+    assert(model.predicted == [5, len(TEST_LINES) - 5, len(TEST_LINES)])
+    assert(all('categoryScore' in c for c in scored))
+
+    other = classifyCorpus(buildCorpus(), model, VECTORIZER, cache=PredictionCache("other", path))
+    assert(len(model.predicted) == 4 and other == second)
@@ -0,0 +1,64 @@
+'''
+Micro-benchmark of the processComment token loop against the previous implementation
+(new WordNetLemmatizer per token, stopword list scan, repeated str(token) calls).
+
+Run with `pytest -s test/commentProcessor_benchmark_test.py` to see tokens/sec.
+'''
+import json
+import re
+import time
+
+from nltk.stem import WordNetLemmatizer
+
+from utils.commentProcessor import getParser, getStopWords, processComment
+
+STOP_WORDS_LIST = list(getStopWords())
+
+def previousProcessComment(c):
+    c = c.replace('\n', '')
+    c = c.replace('\t', '')
+    processed_tokens = []
+    parsed_line = getParser()(c)
+    if len(parsed_line) == 0:
+        return ""
+    if(str(parsed_line[0]) == ">"):
+        return "QUOTE"
+    for token in parsed_line:
+        if token.orth_.isspace():
+            continue
+        elif str(token) == "CODE":
+            processed_tokens.append("CODE")
+        elif token.like_url:
+            processed_tokens.append('URL')
+        elif token.orth_.startswith('@'):
+            processed_tokens.append('SCREEN_NAME')
+        elif str(token) not in STOP_WORDS_LIST:
+            processed_tokens.append(WordNetLemmatizer().lemmatize(token.lower_))
+    return ' '.join(processed_tokens)
+
+def sampleLines():
+    with open("search_sample.json") as f:
+        items = json.load(f)['items']
+
+    lines = []
+    for item in items:
+        body = re.sub('```([^`]*)```|`([^`]*)`', 'CODE', item['body'] or "")
+        lines += [line for line in body.splitlines() if line.strip('\t')]
+
+    return lines
+
+def tokensPerSecond(process, lines, num_tokens):
+    start = time.perf_counter()
+    results = [process(line) for line in lines]
+    return results, num_tokens / (time.perf_counter() - start)
+
+def test_process_comment_benchmark():
+    lines = sampleLines() * 3
+    num_tokens = sum(len(getParser()(line)) for line in lines)
+
+    expected, previous_rate = tokensPerSecond(previousProcessComment, lines, num_tokens)
+    results, rate = tokensPerSecond(processComment, lines, num_tokens)
+
+    print(f'\n{num_tokens} tokens: previous {previous_rate:.0f} tokens/sec, current {rate:.0f} tokens/sec '
+          f'({rate / previous_rate:.1f}x)')
+    assert(results == expected)
@@ -1,4 +1,6 @@
-from utils.commentProcessor import processComment
+import random
+
+from utils.commentProcessor import processComment, processComments
 
 TEST_CASES = [
     {
@@ -21,4 +23,31 @@ TEST_CASES = [
 
 def test_comment_processor():
     for TEST in TEST_CASES:
-        assert(processComment(TEST['test'])) == TEST['expected_result']
\ No newline at end of file
+        assert(processComment(TEST['test'])) == TEST['expected_result']
+
+def test_process_comments_batched():
+    lines = [TEST['test'] for TEST in TEST_CASES]
+    assert(processComments(lines) == [TEST['expected_result'] for TEST in TEST_CASES])
+
+# Randomly generated lines mixing words, punctuation, URLs, screen names, quotes and CODE tokens
+# must process the same in batches across worker processes as line by line.
+PROPERTY_WORDS = [
+    "The", "model", "fails", "when", "calling", "tf.function", "on", "a", "dataset", "I'm", "can't",
+    "reproduce", "this", "issue", "Thanks", "!", "?", "...", "-", "/", "(", ")", ",", "CODE",
+    "https://github.com/pytorch/pytorch/pull/40161", "www.tensorflow.org", "@y3pio", "@ponder-lab",
+    "\t", "  ", "Works", "fine", "after", "upgrading", "to", "2.4", "+1", "LGTM", "closing", "'s"
+]
+
+def randomLine(rng):
+    words = [rng.choice(PROPERTY_WORDS) for _ in range(rng.randint(1, 25))]
+    if rng.random() < 0.1:
+        words.insert(0, ">")
+    return " ".join(words)
+
+def test_process_comments_matches_serial_property():
+    rng = random.Random(1234)
+    lines = [randomLine(rng) for _ in range(3000)]
+    expected = [processComment(line) for line in lines]
+
+    assert(processComments(lines, workers=1, batch_size=64) == expected)
+    assert(processComments(lines, workers=2, batch_size=100) == expected)
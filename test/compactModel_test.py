@@ -0,0 +1,90 @@
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+from joblib import load
+
+from utils.classifier import classifyCorpus, vectorizeLines, DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE
+from utils.compactModel import compactModel, exportCompactModel, loadCompactModel, verifyCompactModel, TokenCounts
+from utils.miner import Classifier
+from test.classifier_test import TEST_LINES, buildCorpus
+
+MODEL = load(DEFAULT_MODEL_FILE)
+VECTORIZER = load(DEFAULT_VECTORIZER_FILE)
+
+LINES = TEST_LINES + ["Error Error error", "a b c", "tensorflow" * 10, "naïve café über", "x_y 42 __init__"]
+
+@pytest.fixture(scope='module')
+def compact(tmp_path_factory):
+    return compactModel(DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE, str(tmp_path_factory.mktemp('models')))
+
+def test_token_counts_match_count_vectorizer(compact):
+    model, vectorizer = compact
+    expected = VECTORIZER.transform(LINES)
+    counts = vectorizer.transform(LINES)
+    assert(counts.shape == expected.shape)
+    assert(np.array_equal(counts.indptr, expected.indptr))
+    assert(np.array_equal(counts.indices, expected.indices))
+    assert(np.array_equal(counts.counts, expected.data))
+
+def test_long_tokens_are_not_laid_out(compact):
+    model, vectorizer = compact
+    lines = ["error " + "QUJD" * 250000 + " fix"] + LINES * 500
+    tracemalloc.start()
+    counts = vectorizer.transform(lines)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Laid out at the width of the 1M character token, the tokens would take gigabytes.
+    assert(peak < 100 * 2 ** 20)
+    expected = VECTORIZER.transform(lines)
+    assert(np.array_equal(counts.indices, expected.indices) and np.array_equal(counts.counts, expected.data))
+
+def test_predictions_match_joblib_model(compact):
+    model, vectorizer = compact
+    assert(verifyCompactModel(MODEL, VECTORIZER, model, vectorizer, LINES) == [])
+
+    for chunk_size in [1, 3, 1000]:
+        expected = classifyCorpus(buildCorpus(), MODEL, VECTORIZER, chunk_size=chunk_size, with_scores=True)
+        corpus = classifyCorpus(buildCorpus(), model, vectorizer, chunk_size=chunk_size, with_scores=True)
+        assert(corpus == expected)
+
+def test_stacked_chunks(compact):
+    model, vectorizer = compact
+    stacked = vectorizeLines(LINES, vectorizer, chunk_size=4)
+    counts = vectorizer.transform(LINES)
+    assert(isinstance(stacked, TokenCounts) and stacked.shape == counts.shape)
+    assert(np.array_equal(stacked.indptr, counts.indptr))
+    assert(np.array_equal(stacked.indices, counts.indices))
+
+def test_export_is_memory_mapped_and_cached(tmp_path, compact):
+    model, vectorizer = compact
+    assert(isinstance(vectorizer.vocabulary, np.memmap) and isinstance(model.coef, np.memmap))
+
+    compactModel(DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE, str(tmp_path))
+    exports = os.listdir(tmp_path)
+    assert(len(exports) == 1)
+    modified = os.path.getmtime(tmp_path / exports[0] / 'coef.npy')
+    compactModel(DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE, str(tmp_path))
+    assert(os.listdir(tmp_path) == exports)
+    assert(os.path.getmtime(tmp_path / exports[0] / 'coef.npy') == modified)
+
+def test_unsupported_vectorizer_falls_back_to_joblib(tmp_path, monkeypatch):
+    bigrams = load(DEFAULT_VECTORIZER_FILE)
+    bigrams.ngram_range = (1, 2)
+    with pytest.raises(ValueError):
+        exportCompactModel(MODEL, bigrams, str(tmp_path))
+
+    def unsupported(*args):
+        raise ValueError("only word unigram counts are supported")
+    monkeypatch.setattr('utils.miner.compactModel', unsupported)
+    classifier = Classifier(compact_dir=str(tmp_path))
+    assert(classifier.vectorizer.__class__.__name__ == 'CountVectorizer')
+
+def test_classifier_uses_compact_export(tmp_path):
+    compact = Classifier(compact_dir=str(tmp_path))
+    joblib = Classifier(compact=False)
+    assert(isinstance(compact.model, type(loadCompactModel(str(tmp_path / os.listdir(tmp_path)[0]))[0])))
+    lines = ["Thanks a lot, that fixed it!", "I get an error when running `make`", "@y3pio could you take a look?"]
+    assert(compact.classify(lines, with_scores=True) == joblib.classify(lines, with_scores=True))
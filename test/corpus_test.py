@@ -0,0 +1,46 @@
+import pickle
+
+from utils.corpus import CommentCorpus, commentLines, setColumn
+
+def line(issue_id, comment, text):
+    return {
+        "issueID": issue_id,
+        "issueURL_API": f"https://api.github.com/repos/ponder-lab/test/issues/{issue_id}",
+        "issueURL_HTML": f"https://github.com/ponder-lab/test/issues/{issue_id}",
+        "commentLine": text,
+        "commentURL": f"https://github.com/ponder-lab/test/issues/{issue_id}#issuecomment-{comment}"
+    }
+
+LINES = [line(1, 1, "first"), line(1, 1, "second"), line(1, 2, "third"), line(2, 3, "fourth")]
+
+def test_corpus_stores_issues_and_comments_once():
+    corpus = CommentCorpus(LINES)
+
+    assert(len(corpus) == 4)
+    assert(len(corpus.issues) == 2 and len(corpus.comments) == 3)
+    assert(corpus == LINES)
+    assert(corpus[-1] == LINES[-1] and corpus[1:3] == LINES[1:3])
+    assert(list(corpus[0].keys()) == ['issueID', 'issueURL_API', 'issueURL_HTML', 'commentLine', 'commentURL'])
+
+def test_corpus_columns_and_exclude():
+    corpus = CommentCorpus(LINES)
+    setColumn(corpus, 'commentLine', ["a", "b", "c", "d"])
+    setColumn(corpus, 'category', ["Usage", "Social Conversation", "Usage", "Workarounds"])
+    setColumn(corpus, 'categoryScore', [0.5, 0.25, 0.75, 1.0])
+
+    assert(commentLines(corpus) == ["a", "b", "c", "d"])
+    assert(corpus.categories == ["Usage", "Social Conversation", "Workarounds"])
+    assert(corpus[1] == dict(LINES[1], commentLine="b", category="Social Conversation", categoryScore=0.25))
+    rows = list(corpus.rows(exclude=["Social Conversation", "Not predicted"]))
+    assert([r['commentLine'] for r in rows] == ["a", "c", "d"])
+    assert(len(corpus.selected(["Usage"])) == 2)
+
+def test_corpus_columns_match_line_dicts():
+    lines = [dict(l) for l in LINES]
+    corpus = CommentCorpus(LINES)
+    for c in [lines, corpus]:
+        setColumn(c, 'category', ["Usage"] * 4)
+
+    assert(corpus == lines)
+    # Picklable like a list of line dicts.
+    assert(pickle.loads(pickle.dumps(corpus)) == lines)
@@ -0,0 +1,34 @@
+from benchmarks.e2e_benchmark import FakeGitHubAPI, runScale, regressions, QUERY
+from utils.filterResults import issueMatchesQuery
+from utils.githubAPI import configureCache
+from utils.sharding import gitHubShardedSearchIssues
+
+def test_fake_api_search_is_sharded_past_1000_issues():
+    configureCache(enabled=False)
+    with FakeGitHubAPI(1500) as api:
+        issues = list(gitHubShardedSearchIssues(QUERY, 1500, 'comments', search_url=api.url('/search/issues')))
+
+    assert(len({issue['id'] for issue in issues}) == 1500)
+
+def test_run_scale_reports_stages():
+    with FakeGitHubAPI(40) as api:
+        report = runScale(40, api.url('/search/issues'))
+
+    assert(report['issues'] == 40)
+    assert(report['summary']['matched'] == sum(issueMatchesQuery(api.issue(n), QUERY) for n in range(1, 41)) >= 30)
+    assert(report['summary']['lines'] > 0 and report['lines_per_second'] > 0)
+    assert({'search', 'fetch', 'preprocess', 'predict', 'write'} <= set(report['stages']))
+    assert(report['requests']['core']['requests'] > 0)
+
+def test_regressions():
+    def results(lines_per_second, fetch_seconds):
+        return {'scales': [{'issues': 100, 'lines_per_second': lines_per_second, 'stages': {
+            'fetch': {'seconds': fetch_seconds, 'items_per_second': 100 / fetch_seconds},
+            'write': {'seconds': 0.01, 'items_per_second': 100 / 0.01}
+        }}]}
+
+    assert(regressions(results(1000, 1), results(900, 1), 0.2) == [])
+    assert(regressions(results(700, 2), results(1000, 1), 0.2) == [
+        (100, 'lines_per_second', 1000, 700),
+        (100, 'fetch_items_per_second', 100, 50)
+    ])
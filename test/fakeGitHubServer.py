@@ -0,0 +1,112 @@
+'''
+Local stand-in for the GitHub REST API used by the tests.
+
+Serves canned JSON responses from a threaded HTTP server on localhost with an
+optional injected latency per request, so the fetch code can be exercised
+without network access or an access token.
+
+Routes are keyed by URL path. A route is either a JSON-serializable body, or a
+callable taking (path, query, headers) and returning (status, headers, body).
+For POST requests (the GraphQL API), `query` is the decoded JSON request body.
+
+With rate_limit_headers, responses carry generous X-RateLimit-* headers (unless
+the route sets its own) so the request scheduler never waits on the fake server.
+'''
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+class FakeGitHubServer:
+    def __init__(self, latency=0.0, record_requests=True, rate_limit_headers=False):
+        self.latency = latency
+        self.record_requests = record_requests
+        self.rate_limit_headers = rate_limit_headers
+        self.routes = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def route(self, path, response):
+        self.routes[path] = response
+
+    def url(self, path=''):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}{path}'
+
+    def handle(self, handler):
+        parts = urlsplit(handler.path)
+        if handler.command == 'POST':
+            query = json.loads(handler.body or b'{}')
+        else:
+            query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        headers = dict(handler.headers)
+
+        if self.record_requests:
+            with self.lock:
+                self.requests.append({'path': parts.path, 'query': query, 'headers': headers})
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        response = self.routes.get(parts.path)
+        if response is None:
+            return 404, {}, {'message': 'Not Found'}
+        if callable(response):
+            return response(parts.path, query, headers)
+
+        return 200, {}, response
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self.respond()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.body = self.rfile.read(length)
+                self.respond()
+
+            def respond(self):
+                status, headers, body = fake.handle(self)
+                if fake.rate_limit_headers:
+                    headers = {
+                        'X-RateLimit-Limit': '100000',
+                        'X-RateLimit-Remaining': '100000',
+                        'X-RateLimit-Reset': str(int(time.time()) + 3600),
+                        **headers
+                    }
+                payload = b'' if body is None else json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
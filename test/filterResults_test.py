@@ -1,4 +1,8 @@
-from utils.filterResults import filterIssueWithQueryString
+import pytest
+
+from utils import matcher
+from utils.filterResults import filterIssueWithQueryString, filterIssuesWithQueries
+from utils.matcher import QueryMatcher, TermAutomaton
 
 TEST_CASES = [
     {
@@ -43,4 +47,55 @@ def test_filter_results():
     for TEST in TEST_CASES:
         matched, omitted = filterIssueWithQueryString(TEST['items'], TEST['query'])
         assert(matched == TEST['expected_result'])
-        assert(omitted == TEST['omitted_result'])
\ No newline at end of file
+        assert(omitted == TEST['omitted_result'])
+
+ISSUES = [
+    {"title": "tf.data pipeline is slow", "body": "Using Dataset.cache() and prefetch"},
+    {"title": "TF.DATA docs", "body": None},
+    {"title": "Metadata of a tf.dataset", "body": "No caching here"},
+    {"title": None, "body": "keras_tuner crashes"},
+]
+
+def test_filter_results_case_and_word_boundaries():
+    matched, omitted = filterIssueWithQueryString(ISSUES, "tf.data", ignore_case=True)
+    assert(matched == ISSUES[:3])
+    matched, omitted = filterIssueWithQueryString(ISSUES, "tf.data", word_boundaries=True)
+    assert(matched == ISSUES[:1])
+    matched, omitted = filterIssueWithQueryString(ISSUES, "keras", word_boundaries=True)
+    assert(matched == [])
+
+def test_filter_results_boolean_queries():
+    matched, omitted = filterIssueWithQueryString(ISSUES, "tf.data AND cache")
+    assert(matched == ISSUES[:1])
+    matched, omitted = filterIssueWithQueryString(ISSUES, "Metadata OR keras AND crashes")
+    assert(matched == ISSUES[2:])
+
+def test_empty_query_terms_are_ignored():
+    for word_boundaries in [False, True]:
+        matched, omitted = filterIssueWithQueryString(ISSUES, "keras OR ", word_boundaries=word_boundaries)
+        assert(matched == filterIssueWithQueryString(ISSUES, "keras", word_boundaries=word_boundaries)[0])
+        matched, omitted = filterIssueWithQueryString(ISSUES, " AND tf.data", word_boundaries=word_boundaries)
+        assert(matched == filterIssueWithQueryString(ISSUES, "tf.data", word_boundaries=word_boundaries)[0])
+    with pytest.raises(ValueError):
+        QueryMatcher([" "])
+    with pytest.raises(ValueError):
+        QueryMatcher(["tf.data", " OR "])
+
+def test_filter_multiple_queries_matches_single_query_filter(monkeypatch):
+    queries = ["tf.data", "cache", "keras_tuner", "tf.data AND prefetch", "missing", "data"]
+    expected = {query: filterIssueWithQueryString(ISSUES, query) for query in queries}
+    assert(filterIssuesWithQueries(ISSUES, queries) == expected)
+
+    # Same results when the terms are found with the automaton.
+    monkeypatch.setattr(matcher, 'DIRECT_SCAN_MAX_TERMS', 0)
+    assert(QueryMatcher(queries).automaton is not None)
+    assert(filterIssuesWithQueries(ISSUES, queries) == expected)
+    assert(filterIssuesWithQueries(ISSUES, ["TF.data"], ignore_case=True, word_boundaries=True)["TF.data"][0] ==
+           ISSUES[:2])
+
+def test_automaton_finds_overlapping_terms():
+    terms = ["he", "she", "his", "hers", "s"]
+    automaton = TermAutomaton(terms)
+    assert(automaton.find("ushers") == {0, 1, 3, 4})
+    assert(sorted(automaton.occurrences("ushers")) == [(0, 4), (1, 4), (3, 6), (4, 2), (4, 6)])
+    assert(automaton.find("") == set())
@@ -0,0 +1,115 @@
+import logging
+import time
+
+from utils import githubAPI
+from utils.githubAPI import gitHubCommentAPI
+from test.fakeGitHubServer import FakeGitHubServer
+
+LATENCY = 0.2
+NUM_ISSUES = 8
+
+def comment(server, issue_number, n, login="y3pio", user_type="User"):
+    return {
+        "body": f"Comment {n} on issue {issue_number}\nSecond line of comment {n}",
+        "html_url": f"https://github.com/ponder-lab/test/issues/{issue_number}#issuecomment-{n}",
+        "issue_url": server.url(f"/repos/ponder-lab/test/issues/{issue_number}"),
+        "user": {"login": login, "type": user_type}
+    }
+
+def setupIssues(server, num_issues=NUM_ISSUES):
+    issues = []
+    for number in range(1, num_issues + 1):
+        path = f"/repos/ponder-lab/test/issues/{number}/comments"
+        server.route(path, [
+            comment(server, number, 1),
+            comment(server, number, 2, login="dependabot[bot]", user_type="Bot"),
+            comment(server, number, 3)
+        ])
+        issues.append({
+            "issueID": number,
+            "comments_url": server.url(path),
+            "issueURL_HTML": f"https://github.com/ponder-lab/test/issues/{number}"
+        })
+
+    return issues
+
+def test_comment_api_preserves_issue_order():
+    with FakeGitHubServer() as server:
+        issues = setupIssues(server)
+        sequential = gitHubCommentAPI(issues, concurrency=1)
+        concurrent = gitHubCommentAPI(issues, concurrency=NUM_ISSUES)
+
+    assert(sequential == concurrent)
+    assert(len(concurrent) == NUM_ISSUES * 4)
+    assert([c['issueID'] for c in concurrent] == sorted(c['issueID'] for c in concurrent))
+    assert(all('dependabot' not in c['commentURL'] for c in concurrent))
+    assert(all(not c['commentURL'].endswith('issuecomment-2') for c in concurrent))
+
+def test_comment_api_fetches_concurrently():
+    with FakeGitHubServer(latency=LATENCY) as server:
+        issues = setupIssues(server)
+        start = time.perf_counter()
+        gitHubCommentAPI(issues, concurrency=NUM_ISSUES)
+        elapsed = time.perf_counter() - start
+
+    # Sequential fetching would take at least NUM_ISSUES * LATENCY seconds.
+    assert(elapsed < NUM_ISSUES * LATENCY / 2)
+
+def test_session_pool_grows_with_concurrency(caplog):
+    # The scheduler creates the session with the default pool size.
+    session = githubAPI.getScheduler().session
+    with FakeGitHubServer(latency=LATENCY) as server:
+        issues = setupIssues(server, 32)
+        with caplog.at_level(logging.WARNING, logger='urllib3'):
+            gitHubCommentAPI(issues, concurrency=32)
+
+    assert(githubAPI.getSession() is session)
+    assert(session.get_adapter(server.url())._pool_maxsize >= 32)
+    assert(not [r for r in caplog.records if 'Connection pool is full' in r.getMessage()])
+
+def paginatedComments(server, issue_number, total):
+    comments = [comment(server, issue_number, n) for n in range(1, total + 1)]
+
+    def respond(path, query, headers):
+        per_page = int(query.get('per_page', 30))
+        page = int(query.get('page', 1))
+        last_page = max(1, -(-total // per_page))
+        response_headers = {}
+        if page < last_page:
+            next_url = server.url(f"{path}?per_page={per_page}&page={page + 1}")
+            response_headers['Link'] = f'<{next_url}>; rel="next"'
+        return 200, response_headers, comments[(page - 1) * per_page:page * per_page]
+
+    return respond
+
+def test_comment_api_follows_pagination():
+    with FakeGitHubServer() as server:
+        path = "/repos/ponder-lab/test/issues/1/comments"
+        server.route(path, paginatedComments(server, 1, 230))
+        issue = {
+            "issueID": 1,
+            "comments_url": server.url(path),
+            "issueURL_HTML": "https://github.com/ponder-lab/test/issues/1"
+        }
+        results = gitHubCommentAPI([issue])
+        requested_pages = [r['query'] for r in server.requests]
+
+    # 230 comments at 100 per page should take exactly 3 requests.
+    assert(requested_pages == [
+        {'per_page': '100'},
+        {'per_page': '100', 'page': '2'},
+        {'per_page': '100', 'page': '3'}
+    ])
+    assert(len(results) == 230 * 2)
+    assert(results[-1]['commentURL'].endswith('issuecomment-230'))
+
+def test_comment_api_skips_issues_without_comments():
+    with FakeGitHubServer() as server:
+        issue = {
+            "issueID": 1,
+            "comments_url": server.url("/repos/ponder-lab/test/issues/1/comments"),
+            "comments": 0,
+            "issueURL_HTML": "https://github.com/ponder-lab/test/issues/1"
+        }
+        assert(gitHubCommentAPI([issue]) == [])
+        assert(server.requests == [])
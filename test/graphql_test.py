@@ -0,0 +1,142 @@
+from joblib import load
+
+from utils import githubAPI
+from utils.githubAPI import gitHubGraphQLCommentStream, issueForComments, GRAPHQL_ISSUES_PER_REQUEST
+from utils.pipeline import runPipeline
+from test.fakeGitHubServer import FakeGitHubServer
+from test.pipeline_test import setupIssues, QUERY
+
+MODEL = load("models/GitHub_comments_logisticRegression.model")
+VECTORIZER = load("models/GitHub_comments_logisticRegression.countVector")
+
+RESET_AT = "2030-01-01T00:00:00Z"
+
+def commentNode(number, n, login="y3pio", typename="User", updated_at="2021-01-01T00:00:00Z"):
+    return {
+        "body": f"Thanks for the report!\nI can reproduce this with {QUERY} on version {n}.",
+        "url": f"https://github.com/ponder-lab/test/issues/{number}#issuecomment-{n}",
+        "updatedAt": updated_at,
+        "author": {"login": login, "__typename": typename}
+    }
+
+# Serve GraphQL responses shaped like those recorded from api.github.com for issues
+# numbered by their node ID ("I_<number>"), each with comment_counts[number] comments.
+# Each response reports `remaining` points, decreasing by one per request.
+# The nodes of the `missing` issues are null, with a NOT_FOUND error like GitHub's.
+def setupGraphQL(server, comment_counts, bots=(), remaining=4999, missing=()):
+    calls = []
+
+    def page(number, after):
+        start = int(after) if after else 0
+        end = min(start + 100, comment_counts[number])
+        nodes = [commentNode(number, n, *(("dependabot", "Bot") if n in bots else ()))
+                 for n in range(start, end)]
+        return {"pageInfo": {"hasNextPage": end < comment_counts[number], "endCursor": str(end)}, "nodes": nodes}
+
+    def graphql(path, body, headers):
+        calls.append(body['variables'])
+        rate_limit = {"cost": 1, "remaining": remaining - len(calls) + 1, "limit": 5000, "resetAt": RESET_AT}
+        variables = body['variables']
+        if 'ids' in variables:
+            nodes = [None if int(node_id[2:]) in missing else {"id": node_id, "comments": page(int(node_id[2:]), None)}
+                     for node_id in variables['ids']]
+            errors = [{"type": "NOT_FOUND", "path": ["nodes", i],
+                       "message": f"Could not resolve to a node with the global id of '{node_id}'."}
+                      for i, node_id in enumerate(variables['ids']) if nodes[i] is None]
+            response = {"data": {"rateLimit": rate_limit, "nodes": nodes}}
+            if errors:
+                response["errors"] = errors
+            return 200, {}, response
+        number = int(variables['id'][2:])
+        return 200, {}, {"data": {"rateLimit": rate_limit, "node": {"comments": page(number, variables['after'])}}}
+
+    server.route('/graphql', graphql)
+    return calls
+
+def issue(server, number, comments):
+    return issueForComments({
+        "id": number,
+        "node_id": f"I_{number}",
+        "url": server.url(f"/repos/ponder-lab/test/issues/{number}"),
+        "comments": comments,
+        "comments_url": server.url(f"/repos/ponder-lab/test/issues/{number}/comments"),
+        "html_url": f"https://github.com/ponder-lab/test/issues/{number}"
+    })
+
+def test_graphql_fetches_issues_in_bulk_and_skips_bots():
+    counts = {number: 3 for number in range(1, GRAPHQL_ISSUES_PER_REQUEST + 11)}
+    with FakeGitHubServer() as server:
+        calls = setupGraphQL(server, counts, bots=[1])
+        issues = [issue(server, number, count) for number, count in counts.items()]
+        results = list(gitHubGraphQLCommentStream(issues, graphql_url=server.url('/graphql')))
+
+    # One request per chunk of issues instead of one per issue.
+    assert(len(calls) == 2)
+    assert([i['issueID'] for i, lines in results] == list(counts))
+    # The bot's comment (2 lines) of every issue is filtered out.
+    assert(all(len(lines) == 4 for i, lines in results))
+    assert(results[0][1][0] == {
+        "issueID": 1,
+        "issueURL_API": issues[0]['issueURL_API'],
+        "issueURL_HTML": "https://github.com/ponder-lab/test/issues/1",
+        "commentLine": "Thanks for the report!",
+        "commentURL": "https://github.com/ponder-lab/test/issues/1#issuecomment-0"
+    })
+
+def test_graphql_follows_comment_cursors():
+    with FakeGitHubServer() as server:
+        calls = setupGraphQL(server, {1: 250, 2: 5})
+        issues = [issue(server, 1, 250), issue(server, 2, 5)]
+        results = list(gitHubGraphQLCommentStream(issues, graphql_url=server.url('/graphql')))
+
+    assert([len(lines) for i, lines in results] == [500, 10])
+    assert(calls[1:] == [{'id': 'I_1', 'after': '100'}, {'id': 'I_1', 'after': '200'}])
+
+def test_graphql_skips_issues_without_comments():
+    with FakeGitHubServer() as server:
+        calls = setupGraphQL(server, {1: 0, 2: 1})
+        results = list(gitHubGraphQLCommentStream([issue(server, 1, 0), issue(server, 2, 1)],
+                                                  graphql_url=server.url('/graphql')))
+
+    assert(calls == [{'ids': ['I_2']}])
+    assert([len(lines) for i, lines in results] == [0, 2])
+
+def test_graphql_syncs_points_budget():
+    with FakeGitHubServer() as server:
+        setupGraphQL(server, {1: 1}, remaining=1234)
+        list(gitHubGraphQLCommentStream([issue(server, 1, 1)], graphql_url=server.url('/graphql')))
+
+    bucket = githubAPI.getScheduler().bucket('graphql')
+    assert((bucket.remaining, bucket.limit, bucket.reset) == (1234, 5000, 1893456000))
+
+def test_graphql_errors_mark_issues_failed():
+    with FakeGitHubServer() as server:
+        server.route('/graphql', {"errors": [{"message": "Something went wrong"}]})
+        issues = [issue(server, 1, 1)]
+        results = list(gitHubGraphQLCommentStream(issues, graphql_url=server.url('/graphql')))
+
+    assert(results == [(issues[0], [])])
+    assert(issues[0]['fetchFailed'])
+
+def test_graphql_partial_errors_only_mark_missing_issues_failed():
+    with FakeGitHubServer() as server:
+        # Issue 2 was deleted: its node is null, with a NOT_FOUND error next to the data.
+        setupGraphQL(server, {1: 1, 3: 1}, missing=[2])
+        issues = [issue(server, number, 1) for number in [1, 2, 3]]
+        results = list(gitHubGraphQLCommentStream(issues, graphql_url=server.url('/graphql')))
+
+    assert([len(lines) for i, lines in results] == [2, 0, 2])
+    assert([bool(i.get('fetchFailed')) for i, lines in results] == [False, True, False])
+
+def test_pipeline_with_graphql_api(tmp_path):
+    with FakeGitHubServer() as server:
+        setupIssues(server, 8)
+        calls = setupGraphQL(server, {number: 5 for number in range(1, 9)})
+        rest = runPipeline(QUERY, 8, 'comments', 'rest', MODEL, VECTORIZER, search_url=server.url('/search/issues'),
+                           results_dir=str(tmp_path) + '/')
+        graphql = runPipeline(QUERY, 8, 'comments', 'graphql', MODEL, VECTORIZER,
+                              search_url=server.url('/search/issues'), results_dir=str(tmp_path) + '/',
+                              api='graphql', graphql_url=server.url('/graphql'))
+
+    assert(len(calls) == 1)
+    assert(graphql['lines'] == rest['lines'] == 6 * 10)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from joblib import load
+
+from benchmarks.classify_benchmark import loadSampleLines
+from utils.classifier import classifyCorpus, vectorizeLines, DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE
+from utils.compactModel import compactModel
+from utils.hashingFeaturizer import HashingFeaturizer, hashingFeaturizer
+from utils.miner import Classifier
+from test.classifier_test import buildCorpus
+from test.compactModel_test import LINES
+
+MODEL = load(DEFAULT_MODEL_FILE)
+VECTORIZER = load(DEFAULT_VECTORIZER_FILE)
+
+def assertSameFeatures(counts, lines):
+    expected = VECTORIZER.transform(lines)
+    assert(counts.shape == expected.shape)
+    assert(np.array_equal(counts.indptr, expected.indptr))
+    assert(np.array_equal(counts.indices, expected.indices))
+    assert(np.array_equal(counts.counts, expected.data))
+
+def test_same_feature_matrix_as_count_vectorizer(tmp_path):
+    lines = LINES + loadSampleLines() + list(VECTORIZER.vocabulary_)
+    compact_vectorizer = compactModel(DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE, str(tmp_path))[1]
+    for featurizer in [hashingFeaturizer(VECTORIZER), hashingFeaturizer(compact_vectorizer)]:
+        assertSameFeatures(featurizer.transform(lines), lines)
+        assertSameFeatures(vectorizeLines(lines, featurizer, chunk_size=100), lines)
+
+def test_tokens_with_a_term_hash_are_compared_to_the_term(monkeypatch):
+    featurizer = HashingFeaturizer(['bug', 'fix', 'thanks'], r'(?u)\b\w\w+\b')
+    # Every token hashes like 'bug'.
+    monkeypatch.setattr('utils.hashingFeaturizer.hashTokens',
+                        lambda tokens: np.full(len(tokens), featurizer.table_hashes[featurizer.table_features == 0][0]))
+    assert(featurizer.lookup(['bug', 'bugs', 'fix']).tolist() == [0, -1, -1])
+
+def test_colliding_terms_are_rejected(monkeypatch):
+    monkeypatch.setattr('utils.hashingFeaturizer.hashTokens', lambda tokens: np.zeros(len(tokens), dtype=np.uint64))
+    with pytest.raises(ValueError):
+        HashingFeaturizer(['bug', 'fix'], r'(?u)\b\w\w+\b')
+
+def test_classifier_with_hashing_featurizer(tmp_path):
+    classifier = Classifier(compact_dir=str(tmp_path), hashing=True)
+    assert(isinstance(classifier.vectorizer, HashingFeaturizer))
+    expected = classifyCorpus(buildCorpus(), MODEL, VECTORIZER, with_scores=True)
+    assert(classifier.classifyCorpus(buildCorpus(), with_scores=True) == expected)
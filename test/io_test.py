@@ -1,4 +1,10 @@
-from utils.io import printGHIssue
+import csv
+import json
+
+import pytest
+
+from utils.io import printGHIssue, newResultWriter, openResultFile
+from utils.state import mergeResults
 
 def test_gh_issue_printer(capsys):
     testIssue = {
@@ -9,4 +15,66 @@ def test_gh_issue_printer(capsys):
 
     printGHIssue(testIssue)
     captured = capsys.readouterr()
-    assert(captured.out == "12345 - https://github.com/ponder-lab - Test Issue\n")
\ No newline at end of file
+    assert(captured.out == "12345 - https://github.com/ponder-lab - Test Issue\n")
+
+ROWS = [
+    {
+        "issueID": 1,
+        "issueURL_HTML": "https://github.com/ponder-lab/test/issues/1",
+        "commentLine": f"line {n}",
+        "commentURL": f"https://github.com/ponder-lab/test/issues/1#issuecomment-{n // 3}",
+        "category": "Task Progress" if n % 2 else "Social Conversation"
+    }
+    for n in range(10)
+]
+
+def readCSV(path):
+    with openResultFile(path) as f:
+        return list(csv.DictReader(f))
+
+@pytest.mark.parametrize("result_format", ["csv", "csv.gz"])
+def test_csv_result_writer_in_chunks(tmp_path, result_format):
+    with newResultWriter("results", str(tmp_path) + "/", result_format, chunk_size=3) as writer:
+        writer.writeRows(ROWS[:4])
+        writer.writeRows(ROWS[4:])
+
+    assert(writer.outfile.endswith("." + result_format))
+    assert(writer.rows == 10)
+    assert(readCSV(writer.outfile) == [{k: str(v) for k, v in row.items()} for row in ROWS])
+
+def test_jsonl_result_writer(tmp_path):
+    with newResultWriter("results", str(tmp_path) + "/", "jsonl", chunk_size=4) as writer:
+        writer.writeRows(ROWS)
+
+    with open(writer.outfile) as f:
+        assert([json.loads(line) for line in f] == ROWS)
+
+def test_parquet_result_writer_dictionary_encodes_urls(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    # The first chunk has no value for the last column, its type is taken as string.
+    rows = [dict(row, body=None if n < 4 else "body") for n, row in enumerate(ROWS)]
+    with newResultWriter("results", str(tmp_path) + "/", "parquet", chunk_size=4) as writer:
+        writer.writeRows(rows)
+
+    parquet_file = pq.ParquetFile(writer.outfile)
+    assert(parquet_file.metadata.num_row_groups == 3)
+    table = parquet_file.read()
+    assert(str(table.schema.field("commentURL").type) == "dictionary<values=string, indices=int32, ordered=0>")
+    assert(table.to_pylist() == rows)
+
+def test_writer_without_rows_creates_no_file(tmp_path):
+    with newResultWriter("results", str(tmp_path) + "/", "csv.gz") as writer:
+        writer.writeRows([])
+
+    assert(writer.outfile is None)
+    assert(list(tmp_path.iterdir()) == [])
+
+def test_merge_compressed_results(tmp_path):
+    with newResultWriter("previous", str(tmp_path) + "/", "csv.gz") as previous:
+        previous.writeRows(ROWS[:6])
+    with newResultWriter("new", str(tmp_path) + "/", "csv") as new:
+        new.writeRows([dict(ROWS[3], commentLine="edited")])
+
+    merged_file = str(tmp_path / "merged.csv.gz")
+    assert(mergeResults(previous.outfile, new.outfile, merged_file) == 4)
+    assert([row["commentLine"] for row in readCSV(merged_file)] == ["line 0", "line 1", "line 2", "edited"])
@@ -0,0 +1,101 @@
+import json
+import logging
+import sys
+
+import pytest
+
+from utils.metrics import RunMetrics, resetMetrics, LATENCY_BUCKETS
+from test.fakeGitHubServer import FakeGitHubServer
+from test.pipeline_test import setupIssues, run
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_stage_timings():
+    clock = FakeClock()
+    metrics = RunMetrics(clock)
+    with metrics.stage('preprocess', 100):
+        clock.now += 2
+    with metrics.stage('search') as stage:
+        clock.now += 1
+        stage['items'] = 30
+    metrics.recordStage('preprocess', 3, 400)
+
+    report = metrics.report({'lines': 500, 'results_file': 'results.csv', 'queries': {}})
+    assert(report['duration_seconds'] == 3)
+    assert(report['stages'] == {
+        'preprocess': {'seconds': 5, 'items': 500, 'calls': 2, 'items_per_second': 100},
+        'search': {'seconds': 1, 'items': 30, 'calls': 1, 'items_per_second': 30}
+    })
+    assert(report['summary'] == {'lines': 500, 'results_file': 'results.csv'})
+    assert(report['lines_per_second'] == 500 / 3)
+    assert(report['peak_memory_bytes']['process'] > 0)
+
+def test_peak_memory_without_resource_module(tmp_path, monkeypatch):
+    # Windows has no resource module.
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    metrics = RunMetrics()
+    metrics.writeReport(tmp_path / 'report.json')
+    assert(json.loads((tmp_path / 'report.json').read_text())['peak_memory_bytes'] is None)
+
+def test_request_latency_histogram():
+    metrics = RunMetrics()
+    for seconds in [0.02] * 8 + [0.3, 20]:
+        metrics.recordRequest('core', seconds, 1000, 200)
+    metrics.recordRequest('search', 0.1, 0, None)
+
+    requests = metrics.report()['requests']
+    assert(requests['core']['requests'] == 10 and requests['core']['bytes'] == 10000)
+    assert(sum(requests['core']['latency_seconds']['buckets'].values()) == 10)
+    assert(requests['core']['latency_seconds']['buckets']['0.025'] == 8)
+    assert(requests['core']['latency_seconds']['buckets']['inf'] == 1)
+    assert((requests['core']['latency_seconds']['p50'], requests['core']['latency_seconds']['p90']) == (0.025, 0.5))
+    assert(requests['search']['errors'] == 1)
+    assert(len(requests['search']['latency_seconds']['buckets']) == len(LATENCY_BUCKETS))
+
+def test_pipeline_records_stages_and_requests(tmp_path):
+    metrics = resetMetrics()
+    with FakeGitHubServer() as server:
+        setupIssues(server, 12)
+        summary = run(server, tmp_path, 12, workers=2, batch_size=8)
+
+    metrics.writeReport(tmp_path / 'report.json', summary)
+    with open(tmp_path / 'report.json') as f:
+        report = json.load(f)
+
+    assert(set(report['stages']) == {'search', 'fetch', 'preprocess', 'vectorize', 'predict', 'write'})
+    assert(report['stages']['search']['items'] == 12)
+    assert(report['stages']['fetch']['items'] == 9)
+    assert(report['stages']['preprocess']['items'] == summary['lines'])
+    assert(report['stages']['write']['items'] == summary['written'])
+    assert(report['requests']['search']['requests'] == 1)
+    assert(report['requests']['core']['requests'] == 9)
+    assert(report['bytes_downloaded'] > 0)
+    assert(report['summary']['lines'] == summary['lines'])
+
+def test_request_urls_are_debug_logs(tmp_path, caplog):
+    with FakeGitHubServer() as server:
+        setupIssues(server, 4)
+        with caplog.at_level(logging.INFO, logger='utils'):
+            run(server, tmp_path, 4)
+        assert(not any('[COMMENTS URL GET]' in r.message for r in caplog.records))
+        with caplog.at_level(logging.DEBUG, logger='utils'):
+            run(server, tmp_path, 4)
+        assert(sum('[COMMENTS URL GET]' in r.message for r in caplog.records) == 3)
+
+def test_prometheus_report(tmp_path):
+    pytest.importorskip('prometheus_client')
+    metrics = RunMetrics()
+    with metrics.stage('predict', 10):
+        pass
+    metrics.recordRequest('core', 0.2, 512, 200)
+    metrics.writePrometheus(tmp_path / 'run.prom', {'lines': 10})
+
+    text = (tmp_path / 'run.prom').read_text()
+    assert('issue_miner_stage_items_total{stage="predict"} 10.0' in text)
+    assert('issue_miner_request_latency_seconds_bucket{le="0.25",resource="core"} 1.0' in text)
+    assert('issue_miner_lines 10.0' in text)
@@ -0,0 +1,75 @@
+import importlib.util
+
+import pytest
+from joblib import load
+
+from utils import githubAPI
+from utils.checkpoint import RunJournal
+from utils.miner import Miner, Classifier
+from test.fakeGitHubServer import FakeGitHubServer
+from test.pipeline_test import setupIssues, readResults, QUERY
+
+MODEL = load("models/GitHub_comments_logisticRegression.model")
+VECTORIZER = load("models/GitHub_comments_logisticRegression.countVector")
+
+def newMiner(server, tmp_path, classifier, **options):
+    return Miner(classifier, cache=False, report_rate_limit=False, results_dir=str(tmp_path) + '/',
+                 search_url=server.url('/search/issues'), **options)
+
+def test_miner_reuses_classifier_and_session_across_queries(tmp_path):
+    classifier = Classifier()
+    with FakeGitHubServer() as server:
+        setupIssues(server, 12)
+        with newMiner(server, tmp_path, classifier) as miner:
+            session = githubAPI.getSession()
+            first = miner.mine(QUERY, 12, out_file_prefix='test')
+            second = miner.mine(QUERY, 12, out_file_prefix='test', filtered_categories=['Social Conversation'])
+            assert(githubAPI.getSession() is session)
+
+    assert((first['lines'], second['lines']) == (90, 90))
+    assert(second['written'] < first['written'] == 90)
+    # Lines of the second query were all predicted by the first one.
+    assert(first['predicted'] > 0 and second['predicted'] == 0)
+    assert(len(readResults(tmp_path, 'CLASSIFIED_COMMENTS')) in [first['written'], second['written']])
+
+def test_miner_stages(tmp_path):
+    with FakeGitHubServer() as server:
+        setupIssues(server, 8)
+        with newMiner(server, tmp_path, Classifier(), workers=2, batch_size=4) as miner:
+            issues = list(miner.search(QUERY, 8, matching=True))
+            corpus = miner.classify(miner.preprocess(miner.fetchComments(issues)))
+
+    assert(len(issues) == 6 and all(QUERY in r['title'] for r in issues))
+    assert(len(corpus) == 6 * 10)
+    assert([c['category'] for c in corpus] == list(MODEL.predict(VECTORIZER.transform([c['commentLine'] for c in corpus]))))
+
+def test_classifier_classifies_raw_lines():
+    classifier = Classifier()
+    categories = classifier.classify(["Thanks a lot!", "> quoted"], with_scores=True)
+
+    assert(categories[0][0] == MODEL.predict(VECTORIZER.transform(["thanks lot"]))[0])
+    assert(categories[1][0] == MODEL.predict(VECTORIZER.transform(["QUOTE"]))[0])
+    assert(0 < categories[0][1] <= 1)
+
+def test_cli_module_does_not_run_on_import():
+    spec = importlib.util.spec_from_file_location('mine_issues', 'mine-issues.py')
+    module = importlib.util.module_from_spec(spec)
+    # Would exit on the missing query argument if the CLI ran at import time.
+    spec.loader.exec_module(module)
+    assert(callable(module.main))
+
+def test_cli_rejects_runs_it_cannot_resume(tmp_path, monkeypatch, capsys):
+    spec = importlib.util.spec_from_file_location('mine_issues', 'mine-issues.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'results').mkdir()
+    (tmp_path / 'results' / 'empty.journal.jsonl').write_text('')
+    RunJournal('started', str(tmp_path / 'results')).recordParams({'q': QUERY, 'filter': []})
+
+    for args in [['--resume', 'unknown'], ['--resume', 'empty'], ['other query', '--resume', 'started']]:
+        monkeypatch.setattr('sys.argv', ['mine-issues.py'] + args)
+        with pytest.raises(SystemExit) as exit:
+            module.main()
+        assert(exit.value.code == 2)
+        assert(args[-1] in capsys.readouterr().err)
@@ -0,0 +1,140 @@
+import csv
+import time
+import tracemalloc
+
+from joblib import load
+
+from utils.checkpoint import RunJournal
+from utils.pipeline import runPipeline, bufferedStage
+from test.fakeGitHubServer import FakeGitHubServer
+
+MODEL = load("models/GitHub_comments_logisticRegression.model")
+VECTORIZER = load("models/GitHub_comments_logisticRegression.countVector")
+
+QUERY = "tf.function"
+COMMENTS_PER_ISSUE = 5
+
+# Serve a synthetic population of `num_issues` issues, generated on request so the
+# fake server's memory doesn't grow with the number of issues.
+def setupIssues(server, num_issues):
+    def issue(number):
+        return {
+            "id": number,
+            "node_id": f"I_{number}",
+            "url": server.url(f"/repos/ponder-lab/test/issues/{number}"),
+            "title": f"Issue {number} about {QUERY}" if number % 4 else f"Unrelated issue {number}",
+            "body": "Some description",
+            "comments": COMMENTS_PER_ISSUE,
+            "comments_url": server.url(f"/repos/ponder-lab/test/issues/{number}/comments"),
+            "html_url": f"https://github.com/ponder-lab/test/issues/{number}"
+        }
+
+    def search(path, query, headers):
+        page, per_page = int(query['page']), int(query['per_page'])
+        numbers = range((page - 1) * per_page + 1, min(page * per_page, num_issues) + 1)
+        return 200, {}, {"total_count": num_issues, "items": [issue(n) for n in numbers]}
+
+    def comments(path, query, headers):
+        number = int(path.split('/')[-2])
+        return 200, {}, [{
+            "body": f"Thanks for the report!\nI can reproduce this with {QUERY} on version {n}.",
+            "html_url": f"https://github.com/ponder-lab/test/issues/{number}#issuecomment-{n}",
+            "issue_url": server.url(f"/repos/ponder-lab/test/issues/{number}"),
+            "user": {"login": "y3pio", "type": "User"}
+        } for n in range(COMMENTS_PER_ISSUE)]
+
+    server.route('/search/issues', search)
+    for number in range(1, num_issues + 1):
+        server.route(f"/repos/ponder-lab/test/issues/{number}/comments", comments)
+
+def run(server, tmp_path, num_issues, **options):
+    return runPipeline(QUERY, num_issues, 'comments', 'test', MODEL, VECTORIZER,
+                       search_url=server.url('/search/issues'), results_dir=str(tmp_path) + '/',
+                       **options)
+
+def readResults(tmp_path, name):
+    files = list(tmp_path.glob(f"test_{name}_*.csv"))
+    if not files:
+        return []
+    with open(files[0]) as f:
+        return list(csv.DictReader(f))
+
+def test_pipeline_writes_classified_comments(tmp_path):
+    with FakeGitHubServer() as server:
+        setupIssues(server, 40)
+        summary = run(server, tmp_path, 40, batch_size=16)
+
+    comments = readResults(tmp_path, 'CLASSIFIED_COMMENTS')
+    omitted = readResults(tmp_path, 'OMITTED_ISSUES')
+
+    assert(summary == {'results': 40, 'matched': 30, 'omitted': 10, 'unchanged': 0, 'lines': 300, 'written': 300,
+                       'predicted': 6})
+    assert(len(comments) == 300 and len(omitted) == 10)
+    assert(list(comments[0].keys()) == ['issueID', 'issueURL_API', 'issueURL_HTML', 'commentLine', 'commentURL', 'category'])
+    # Issues stay in search order.
+    issue_ids = [int(c['issueID']) for c in comments]
+    assert(issue_ids == sorted(issue_ids))
+    assert(all(int(o['issueID']) % 4 == 0 for o in omitted))
+
+def test_pipeline_filters_categories(tmp_path):
+    with FakeGitHubServer() as server:
+        setupIssues(server, 8)
+        summary = run(server, tmp_path, 8, filtered_categories=['Social Conversation'])
+
+    comments = readResults(tmp_path, 'CLASSIFIED_COMMENTS')
+    assert(summary['lines'] == 60)
+    assert(len(comments) == summary['written'] < 60)
+    assert(all(c['category'] != 'Social Conversation' for c in comments))
+
+def peakMemory(server, tmp_path, num_issues, journal=None):
+    tracemalloc.start()
+    run(server, tmp_path, num_issues, batch_size=50, queue_size=2, journal=journal)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def test_pipeline_memory_does_not_grow_with_results(tmp_path):
+    with FakeGitHubServer(record_requests=False) as server:
+        setupIssues(server, 500)
+        # Warm up the tokenizer/stopwords so they are not counted.
+        run(server, tmp_path, 10)
+        small = peakMemory(server, tmp_path, 100)
+        large = peakMemory(server, tmp_path, 500)
+        # Nor when the run is journaled (as mine-issues.py runs always are).
+        journal = RunJournal('small', str(tmp_path))
+        small_journaled = peakMemory(server, tmp_path, 100, journal)
+        journal.close()
+        journal = RunJournal('large', str(tmp_path))
+        large_journaled = peakMemory(server, tmp_path, 500, journal)
+        journal.close()
+
+    assert(large < small * 1.25)
+    assert(large_journaled < small_journaled * 1.25)
+
+def test_buffered_stage_is_bounded():
+    produced = []
+
+    def producer():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    stage = bufferedStage(producer(), maxsize=3)
+    assert(next(stage) == 0)
+    time.sleep(0.1)
+    # Only the queue's worth of items (plus the one being put) run ahead of the consumer.
+    assert(len(produced) <= 5)
+    assert(list(stage) == list(range(1, 100)))
+
+def test_buffered_stage_propagates_errors():
+    def failing():
+        yield 1
+        raise ValueError("stage failed")
+
+    stage = bufferedStage(failing())
+    assert(next(stage) == 1)
+    try:
+        next(stage)
+        assert(False)
+    except ValueError as e:
+        assert(str(e) == "stage failed")
@@ -0,0 +1,120 @@
+import time
+
+import pytest
+import requests
+
+from utils.scheduler import RequestScheduler, RequestFailedError, projectCompletion
+from test.fakeGitHubServer import FakeGitHubServer
+
+# Clock that only advances when slept on, so tests never really wait.
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def newScheduler(clock, max_retries=3):
+    return RequestScheduler(requests.Session(), max_retries=max_retries, clock=clock.time, sleep=clock.sleep)
+
+# Route that replays the given responses in order, then keeps returning the last one.
+def replay(*responses):
+    responses = list(responses)
+
+    def respond(path, query, headers):
+        return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    return respond
+
+def test_retries_after_rate_limit_reset():
+    clock = FakeClock()
+    with FakeGitHubServer() as server:
+        reset = str(int(clock.now) + 30)
+        server.route('/search/issues', replay(
+            (403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset}, {'message': 'rate limited'}),
+            (200, {'X-RateLimit-Remaining': '29'}, {'items': []})
+        ))
+        res = newScheduler(clock).get(server.url('/search/issues'), resource='search')
+
+    assert(res.json() == {'items': []})
+    assert(len(server.requests) == 2)
+    assert(29 <= clock.sleeps[0] <= 32)
+
+def test_retries_with_retry_after():
+    clock = FakeClock()
+    with FakeGitHubServer() as server:
+        server.route('/comments', replay(
+            (429, {'Retry-After': '7'}, {'message': 'secondary rate limit'}),
+            (200, {}, [])
+        ))
+        newScheduler(clock).get(server.url('/comments'))
+
+    assert(clock.sleeps == [7.0])
+
+def test_retries_server_errors_with_backoff():
+    clock = FakeClock()
+    with FakeGitHubServer() as server:
+        server.route('/comments', replay((502, {}, None), (503, {}, None), (200, {}, [])))
+        newScheduler(clock).get(server.url('/comments'))
+
+    assert(clock.sleeps == [1.0, 2.0])
+
+def test_raises_after_max_retries():
+    clock = FakeClock()
+    with FakeGitHubServer() as server:
+        server.route('/comments', replay((500, {}, None)))
+        with pytest.raises(RequestFailedError):
+            newScheduler(clock, max_retries=2).get(server.url('/comments'))
+
+    assert(len(server.requests) == 3)
+
+def test_does_not_retry_non_rate_limit_403():
+    clock = FakeClock()
+    with FakeGitHubServer() as server:
+        server.route('/comments', replay((403, {'X-RateLimit-Remaining': '100'}, {'message': 'forbidden'})))
+        with pytest.raises(RequestFailedError):
+            newScheduler(clock).get(server.url('/comments'))
+
+    assert(len(server.requests) == 1)
+    assert(clock.sleeps == [])
+
+def test_throttles_proactively_when_budget_is_spent():
+    clock = FakeClock()
+    with FakeGitHubServer() as server:
+        reset = str(int(clock.now) + 45)
+        server.route('/search/issues', replay(
+            (200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset}, {'items': []}),
+            (200, {'X-RateLimit-Remaining': '29'}, {'items': []})
+        ))
+        scheduler = newScheduler(clock)
+        scheduler.get(server.url('/search/issues'), resource='search')
+        scheduler.get(server.url('/search/issues'), resource='search')
+
+    # The second search waits for the reset, the core budget is untouched.
+    assert(len(clock.sleeps) == 1 and 44 <= clock.sleeps[0] <= 46)
+    assert(scheduler.buckets['core'].remaining == 5000)
+
+def test_search_budget_is_separate_from_core():
+    clock = FakeClock()
+    with FakeGitHubServer() as server:
+        server.route('/search/issues', {'items': []})
+        server.route('/comments', [])
+        scheduler = newScheduler(clock)
+        for _ in range(31):
+            scheduler.get(server.url('/search/issues'), resource='search')
+        for _ in range(31):
+            scheduler.get(server.url('/comments'))
+
+    # Only the 31st search had to wait for the 1 minute search window.
+    assert(len(clock.sleeps) == 1 and 0 < clock.sleeps[0] <= 60)
+
+def test_project_completion():
+    now = 1000
+    assert(projectCompletion(10, 5000, 100, now + 600, 3600, now) == now)
+    assert(projectCompletion(150, 5000, 100, now + 600, 3600, now) == now + 600)
+    assert(projectCompletion(10100, 5000, 100, now + 600, 3600, now) == now + 600 + 3600)
@@ -0,0 +1,117 @@
+import http.client
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from joblib import load
+
+from utils.classifier import PredictionCache
+from utils.commentProcessor import processComment
+from utils.server import MicroBatcher, newClassificationServer
+
+MODEL = load("models/GitHub_comments_logisticRegression.model")
+VECTORIZER = load("models/GitHub_comments_logisticRegression.countVector")
+
+LINES = [
+    "Thanks a lot for the fix!",
+    "> quoted from the issue",
+    "I tried running the code and got an error",
+    "A workaround is to set the flag to false",
+    "@y3pio could you take a look at https://github.com/ponder-lab/test/pull/1",
+]
+
+def expected(line):
+    processed = processComment(line)
+    return processed, MODEL.predict(VECTORIZER.transform([processed]))[0]
+
+class Service:
+    def __init__(self, max_wait=0.005, prediction_cache=None, **options):
+        self.batcher = MicroBatcher(MODEL, VECTORIZER, max_wait=max_wait, prediction_cache=prediction_cache)
+        self.server = newClassificationServer(self.batcher, port=0, **options)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+
+    def url(self, path):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self.batcher.close()
+
+def test_classify_lines_and_comments():
+    with Service() as service:
+        lines = requests.post(service.url('/classify'), json={'lines': LINES}).json()['results']
+        comments = requests.post(service.url('/classify'), json={'comments': ["\n".join(LINES[:2]), LINES[2]]}).json()
+
+    assert([(r['line'], r['category']) for r in lines] == [expected(line) for line in LINES])
+    assert(all(0 < r['score'] <= 1 for r in lines))
+    assert([len(c) for c in comments['results']] == [2, 1])
+    assert(comments['results'][1][0]['category'] == expected(LINES[2])[1])
+
+def test_concurrent_requests_are_micro_batched():
+    with Service(max_wait=0.2) as service:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(
+                lambda line: requests.post(service.url('/classify'), json={'lines': [line]}).json(),
+                LINES * 4))
+        metrics = requests.get(service.url('/metrics')).json()
+
+    assert([r['results'][0]['category'] for r in responses] == [expected(line)[1] for line in LINES * 4])
+    assert(metrics['requests'] == 20 and metrics['lines'] == 20)
+    # Requests waiting on the same micro-batch are classified by one predict call.
+    assert(metrics['batches'] < 20 and metrics['requests_per_batch'] > 1)
+    assert(metrics['latency_ms']['p50'] is not None)
+
+def test_bad_requests():
+    with Service() as service:
+        assert(requests.post(service.url('/classify'), data="not json").status_code == 400)
+        assert(requests.post(service.url('/classify'), json={'lines': [1]}).status_code == 400)
+        assert(requests.post(service.url('/classify'), json={'lines': "abc"}).status_code == 400)
+        assert(requests.post(service.url('/classify'), json={'comments': "abc"}).status_code == 400)
+        assert(requests.post(service.url('/classify'), json={'comments': [["abc"]]}).status_code == 400)
+        assert(requests.get(service.url('/nothing')).status_code == 404)
+        assert(requests.get(service.url('/metrics')).json()['errors'] == 5)
+
+def test_persisted_prediction_cache(tmp_path):
+    path = str(tmp_path / "predictions.db")
+    # Created on this thread, used by the batching thread.
+    cache = PredictionCache('model', path)
+    with Service(prediction_cache=cache) as service:
+        first = requests.post(service.url('/classify'), json={'lines': LINES})
+        second = requests.post(service.url('/classify'), json={'lines': LINES})
+    cache.close()
+
+    assert(first.status_code == second.status_code == 200)
+    assert(first.json() == second.json())
+    assert([r['category'] for r in first.json()['results']] == [expected(line)[1] for line in LINES])
+
+    reopened = PredictionCache('model', path)
+    processed = {expected(line)[0] for line in LINES}
+    assert(len(reopened.lookup(list(processed))) == reopened.persisted_hits == len(processed))
+    reopened.close()
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / "classify.sock")
+    with Service(socket_path=path):
+        connection = UnixConnection(path)
+        connection.request('POST', '/classify', json.dumps({'lines': LINES[:1]}), {'Content-Type': 'application/json'})
+        response = json.loads(connection.getresponse().read())
+        connection.close()
+
+    assert(response['results'][0]['category'] == expected(LINES[0])[1])
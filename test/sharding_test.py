@@ -0,0 +1,131 @@
+import datetime
+import random
+import re
+
+from utils.sharding import gitHubShardedSearchIssues, shardQuery
+from test.fakeGitHubServer import FakeGitHubServer
+from test.pipeline_test import run
+
+QUERY = "tf.function"
+POPULATION_START = datetime.datetime(2016, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Synthetic issue population with random creation dates over ~5 years.
+def population(size):
+    rng = random.Random(42)
+    issues = []
+    for number in range(1, size + 1):
+        created = POPULATION_START + datetime.timedelta(seconds=rng.randint(0, 5 * 365 * 24 * 3600))
+        issues.append({"id": number, "created_at": created, "comments": rng.randint(0, 100)})
+    return issues
+
+def parseDate(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=datetime.timezone.utc)
+
+# Fake search endpoint over a population, returning at most 1000 results per query like GitHub.
+# Ranges overlap by a second at their lower bound so issues on shard boundaries show up twice.
+def searchRoute(issues):
+    def respond(path, query, headers):
+        q = query['q']
+        matching = issues
+        created = re.search(r'created:(\S+)\.\.(\S+)', q)
+        if created:
+            start = parseDate(created.group(1)) - datetime.timedelta(seconds=1)
+            end = parseDate(created.group(2))
+            matching = [i for i in issues if start <= i['created_at'] <= end]
+
+        matching = sorted(matching, key=lambda i: -i['comments'])
+        page, per_page = int(query.get('page', 1)), int(query['per_page'])
+        if (page - 1) * per_page >= 1000:
+            return 422, {}, {"message": "Only the first 1000 search results are available"}
+
+        items = [{
+            "id": i['id'],
+            "title": QUERY,
+            "body": "",
+            "comments": i['comments'],
+            "created_at": i['created_at'].strftime('%Y-%m-%dT%H:%M:%SZ')
+        } for i in matching[:1000][(page - 1) * per_page:page * per_page]]
+        return 200, {}, {"total_count": len(matching), "incomplete_results": False, "items": items}
+
+    return respond
+
+def test_sharded_search_retrieves_whole_population():
+    issues = population(2500)
+    with FakeGitHubServer(rate_limit_headers=True) as server:
+        server.route('/search/issues', searchRoute(issues))
+        results = list(gitHubShardedSearchIssues(QUERY, 10000, 'comments', search_url=server.url('/search/issues')))
+
+    ids = [r['id'] for r in results]
+    assert(len(ids) == len(set(ids)))
+    assert(set(ids) == {i['id'] for i in issues})
+
+def test_sharded_search_stops_at_max_results():
+    issues = population(2500)
+    with FakeGitHubServer(rate_limit_headers=True) as server:
+        server.route('/search/issues', searchRoute(issues))
+        results = list(gitHubShardedSearchIssues(QUERY, 1500, 'comments', search_url=server.url('/search/issues')))
+
+    assert(len(results) == 1500)
+    assert(len({r['id'] for r in results}) == 1500)
+
+def test_small_query_is_not_sharded():
+    issues = population(300)
+    with FakeGitHubServer(rate_limit_headers=True) as server:
+        server.route('/search/issues', searchRoute(issues))
+        results = list(gitHubShardedSearchIssues(QUERY, 10000, 'comments', search_url=server.url('/search/issues')))
+        queries = [r['query']['q'] for r in server.requests]
+
+    assert(len(results) == 300)
+    assert(all('created:' not in q for q in queries))
+    # Sorted by comments like an unsharded search.
+    assert([r['comments'] for r in results] == sorted((r['comments'] for r in results), reverse=True))
+
+def test_shard_query_splits_until_under_limit():
+    issues = population(2500)
+    counts = []
+
+    def count(q):
+        created = re.search(r'created:(\S+)\.\.(\S+)', q)
+        start, end = parseDate(created.group(1)), parseDate(created.group(2))
+        total = sum(1 for i in issues if start <= i['created_at'] <= end)
+        counts.append(total)
+        return total
+
+    shards = shardQuery(QUERY, count, limit=400)
+
+    assert(all(total <= 400 for _, total in shards))
+    assert(sum(total for _, total in shards) == 2500)
+    # Shards are ordered from the latest to the earliest creation date range.
+    starts = [re.search(r'created:(\S+)\.\.', q).group(1) for q, _ in shards]
+    assert(starts == sorted(starts, reverse=True))
+
+def test_shards_that_cannot_be_counted_are_reported(caplog):
+    issues = population(2500)
+    skipped = []
+
+    def count(q):
+        created = re.search(r'created:(\S+)\.\.(\S+)', q)
+        start, end = parseDate(created.group(1)), parseDate(created.group(2))
+        # The count request of the latest half of the population fails.
+        if start >= datetime.datetime(2018, 7, 1, tzinfo=datetime.timezone.utc):
+            return None
+        return sum(1 for i in issues if start <= i['created_at'] <= end)
+
+    shards = shardQuery(QUERY, count, limit=400, skipped=skipped)
+
+    assert(skipped and all(q not in skipped for q, _ in shards))
+    assert(0 < sum(total for _, total in shards) < 2500)
+    assert(all(q in caplog.text for q in skipped))
+
+def test_query_that_cannot_be_counted_is_reported(monkeypatch, caplog):
+    monkeypatch.setattr('utils.sharding.gitHubSearchTotalCount', lambda q, search_url: None)
+    skipped = []
+    assert(list(gitHubShardedSearchIssues(QUERY, 10000, 'comments', skipped=skipped)) == [])
+    assert(skipped == [QUERY])
+    assert(f"couldn't count the issues of {QUERY}" in caplog.text)
+
+def test_pipeline_summary_counts_skipped_shards(monkeypatch, tmp_path):
+    monkeypatch.setattr('utils.sharding.gitHubSearchTotalCount', lambda q, search_url: None)
+    with FakeGitHubServer() as server:
+        summary = run(server, tmp_path, 2000, shard=True)
+    assert(summary['skipped_shards'] == 1 and summary['results'] == 0)
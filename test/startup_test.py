@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ['spacy', 'nltk', 'pandas', 'joblib', 'sklearn', 'scipy', 'pyfiglet', 'PyInquirer']
+
+# Top level modules imported by running `args` with python -X importtime.
+def importedModules(args):
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, capture_output=True, text=True)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            modules.add(line.split('|')[-1].strip().split('.')[0])
+
+    return result, modules
+
+def test_utils_import_without_heavy_dependencies():
+    result, modules = importedModules(['-c', 'import utils.commentProcessor, utils.classifier, utils.githubAPI, utils.io'])
+    assert(result.returncode == 0)
+    assert(modules.isdisjoint(HEAVY_MODULES))
+
+def test_help_does_not_load_heavy_dependencies():
+    result, modules = importedModules(['mine-issues.py', '-h'])
+    assert(result.returncode == 0)
+    assert('usage' in result.stdout)
+    assert(modules.isdisjoint(HEAVY_MODULES))
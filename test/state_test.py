@@ -0,0 +1,130 @@
+import csv
+import re
+
+from joblib import load
+
+from utils.pipeline import runPipeline
+from utils.state import QueryState, mergeResults, utcNow
+from test.fakeGitHubServer import FakeGitHubServer
+
+MODEL = load("models/GitHub_comments_logisticRegression.model")
+VECTORIZER = load("models/GitHub_comments_logisticRegression.countVector")
+
+QUERY = "tf.function"
+OLD_DATE = "2020-01-01T00:00:00Z"
+
+# Fake GitHub holding mutable issues, honouring the `updated:>=` search qualifier
+# and the `since` comments parameter.
+class FakeRepo:
+    def __init__(self, server, num_issues):
+        self.server = server
+        self.issues = {}
+        for number in range(1, num_issues + 1):
+            self.issues[number] = {"updated_at": OLD_DATE, "comments": []}
+            for n in range(3):
+                self.addComment(number, f"Comment {n} about {QUERY}", OLD_DATE)
+
+        server.route('/search/issues', self.search)
+
+    def addComment(self, number, body, updated_at):
+        comments = self.issues[number]["comments"]
+        comments.append({
+            "body": body,
+            "updated_at": updated_at,
+            "html_url": f"https://github.com/ponder-lab/test/issues/{number}#issuecomment-{len(comments)}",
+            "issue_url": self.server.url(f"/repos/ponder-lab/test/issues/{number}"),
+            "user": {"login": "y3pio", "type": "User"}
+        })
+        self.issues[number]["updated_at"] = updated_at
+        self.server.route(f"/repos/ponder-lab/test/issues/{number}/comments", self.commentsRoute(number))
+
+    def commentsRoute(self, number):
+        def respond(path, query, headers):
+            since = query.get('since', '')
+            return 200, {}, [c for c in self.issues[number]["comments"] if c["updated_at"] >= since]
+        return respond
+
+    def search(self, path, query, headers):
+        updated = re.search(r'updated:>=(\S+)', query['q'])
+        since = updated.group(1) if updated else ''
+        items = [{
+            "id": number,
+            "title": f"Issue about {QUERY}",
+            "body": "",
+            "updated_at": issue["updated_at"],
+            "comments": len(issue["comments"]),
+            "comments_url": self.server.url(f"/repos/ponder-lab/test/issues/{number}/comments"),
+            "html_url": f"https://github.com/ponder-lab/test/issues/{number}"
+        } for number, issue in self.issues.items() if issue["updated_at"] >= since]
+        page, per_page = int(query['page']), int(query['per_page'])
+        return 200, {}, {"total_count": len(items), "items": items[(page - 1) * per_page:page * per_page]}
+
+def run(server, tmp_path, state):
+    return runPipeline(QUERY, 1000, 'comments', 'test', MODEL, VECTORIZER, state=state,
+                       search_url=server.url('/search/issues'), results_dir=str(tmp_path) + '/')
+
+def readRows(path):
+    with open(path) as f:
+        return list(csv.DictReader(f))
+
+def test_incremental_run_only_mines_updates(tmp_path):
+    with FakeGitHubServer(rate_limit_headers=True) as server:
+        repo = FakeRepo(server, 20)
+        first = run(server, tmp_path, QueryState(QUERY, directory=str(tmp_path / 'state')))
+        first_requests = len(server.requests)
+
+        # One new comment on issue 1, and comment 0 of issue 2 edited.
+        now = utcNow()
+        repo.addComment(1, "A brand new comment", now)
+        repo.issues[2]["comments"][0]["body"] = "Edited comment"
+        repo.issues[2]["comments"][0]["updated_at"] = now
+        repo.issues[2]["updated_at"] = now
+
+        server.requests.clear()
+        second = run(server, tmp_path, QueryState(QUERY, directory=str(tmp_path / 'state')))
+        second_requests = server.requests
+
+    assert(first['lines'] == 60 and first_requests == 21)
+    # 1 search page + the comments of the 2 updated issues.
+    assert(len(second_requests) == 3)
+    assert(second_requests[0]['query']['q'].startswith(QUERY + ' updated:>='))
+    assert(all('since' in r['query'] for r in second_requests[1:]))
+    assert(second['lines'] == 2)
+
+    merged = readRows(second['results_file'])
+    assert(len(merged) == 61)
+    assert(len({r['commentURL'] for r in merged}) == 61)
+    assert([r['commentLine'] for r in merged if r['commentURL'].endswith('/2#issuecomment-0')] == ['edited comment'])
+
+def test_merge_results_replaces_updated_comments(tmp_path):
+    previous, new, merged = tmp_path / 'previous.csv', tmp_path / 'new.csv', tmp_path / 'merged.csv'
+    previous.write_text("issueID,commentLine,commentURL,category\n1,old,url1,A\n1,old second line,url1,A\n2,kept,url2,B\n")
+    new.write_text("issueID,commentLine,commentURL,category,categoryScore\n1,edited,url1,C,0.5\n3,new,url3,D,0.9\n")
+
+    assert(mergeResults(str(previous), str(new), str(merged)) == 3)
+    assert(merged.read_text() == "issueID,commentLine,commentURL,category\n2,kept,url2,B\n1,edited,url1,C\n3,new,url3,D\n")
+
+def test_issues_that_failed_are_mined_by_the_next_run(tmp_path):
+    with FakeGitHubServer(rate_limit_headers=True) as server:
+        repo = FakeRepo(server, 5)
+        server.route("/repos/ponder-lab/test/issues/3/comments", lambda path, query, headers: (404, {}, {}))
+        first_state = QueryState(QUERY, directory=str(tmp_path / 'state'))
+        first = run(server, tmp_path, first_state)
+
+        server.route("/repos/ponder-lab/test/issues/3/comments", repo.commentsRoute(3))
+        server.requests.clear()
+        second_state = QueryState(QUERY, directory=str(tmp_path / 'state'))
+        second = run(server, tmp_path, second_state)
+        second_requests = server.requests
+
+    # The first run's last run isn't kept, so the second searches every issue again...
+    assert(first['lines'] == 12 and first_state.last_run is None)
+    assert(second_requests[0]['query']['q'] == QUERY)
+    # ...but only fetches the failed one, the others are unchanged.
+    assert([r['path'] for r in second_requests[1:]] == ['/repos/ponder-lab/test/issues/3/comments'])
+    assert(second['lines'] == 3 and second['unchanged'] == 4)
+    assert(QueryState(QUERY, directory=str(tmp_path / 'state')).last_run == second_state.run_started)
+
+    merged = readRows(second['results_file'])
+    assert(len(merged) == 15)
+    assert(len([r for r in merged if r['commentURL'].startswith('https://github.com/ponder-lab/test/issues/3#')]) == 3)
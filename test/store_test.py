@@ -0,0 +1,73 @@
+import subprocess
+import sys
+
+from utils.store import ResultStore
+
+def line(issue_id, comment, text, category):
+    return {
+        "issueID": issue_id,
+        "issueURL_API": f"https://api.github.com/repos/ponder-lab/test/issues/{issue_id}",
+        "issueURL_HTML": f"https://github.com/ponder-lab/test/issues/{issue_id}",
+        "commentLine": text,
+        "commentURL": f"https://github.com/ponder-lab/test/issues/{issue_id}#issuecomment-{comment}",
+        "category": category
+    }
+
+FIRST_RUN = [
+    line(1, 1, "thanks", "Social Conversation"),
+    line(1, 1, "fixed master", "Task Progress"),
+    line(1, 2, "CODE", "Bug Reproduction"),
+    line(2, 3, "thanks", "Social Conversation"),
+]
+
+# Overlaps the first run on issue 2, and adds issue 3.
+SECOND_RUN = [
+    line(2, 3, "thanks", "Social Conversation"),
+    line(3, 4, "try workaround", "Workarounds"),
+]
+
+def populate(path):
+    store = ResultStore(path)
+    store.startRun('run1', 'tf.function')
+    store.commentWriter('run1').writeRows(FIRST_RUN[:2])
+    store.commentWriter('run1').writeRows(FIRST_RUN[2:])
+    store.omittedWriter('run1').writeRows([{"issueID": 9, "issueURL": "url", "title": "t", "body": None}])
+    store.startRun('run2', 'tf.data')
+    store.commentWriter('run2').writeRows(SECOND_RUN)
+    return store
+
+def test_store_deduplicates_lines_across_runs(tmp_path):
+    store = populate(str(tmp_path / 'results.db'))
+
+    assert(store.categoryCounts() == [
+        ('Social Conversation', 2), ('Bug Reproduction', 1), ('Task Progress', 1), ('Workarounds', 1)
+    ])
+    assert(store.categoryCounts(query='tf.data') == [('Social Conversation', 1), ('Workarounds', 1)])
+    assert(store.categoryCounts(run_id='run1', exclude=['Social Conversation']) == [
+        ('Bug Reproduction', 1), ('Task Progress', 1)
+    ])
+    assert([run[0] for run in store.runs()] == ['run1', 'run2'])
+    assert([run[3] for run in store.runs()] == [4, 2])
+
+def test_store_issue_lines(tmp_path):
+    store = populate(str(tmp_path / 'results.db'))
+
+    assert([(l[1], l[2]) for l in store.issueLines(1)] == [(0, "thanks"), (1, "fixed master"), (0, "CODE")])
+    assert(store.issueLines(42) == [])
+
+def test_store_replaces_lines_of_remined_comments(tmp_path):
+    store = populate(str(tmp_path / 'results.db'))
+    store.startRun('run3', 'tf.function')
+    # Comment 1 of issue 1 was edited down to a single line.
+    store.commentWriter('run3').writeRows([line(1, 1, "edited", "Solution Discussion")])
+
+    assert([(l[1], l[2]) for l in store.issueLines(1)] == [(0, "edited"), (0, "CODE")])
+
+def test_query_results_script(tmp_path):
+    db = str(tmp_path / 'results.db')
+    populate(db).close()
+
+    result = subprocess.run([sys.executable, 'query-results.py', '--db', db, 'categories', '-q', 'tf.function'],
+                            capture_output=True, text=True)
+    assert(result.returncode == 0)
+    assert(result.stdout.split('\n')[0].split() == ['2', 'Social', 'Conversation'])
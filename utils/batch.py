@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+'''
+Batch mining of many related queries, sharing the work of the issues they have in common.
+
+Mining related queries one by one (`@tf.function`, `tf.data`, ...) fetches and classifies
+the comments of popular issues once per query matching them. runBatchPipeline instead:
+    - runs the searches of every query (one after the other, under the shared rate limit
+      scheduler of utils/githubAPI.py) and filters their results as runPipeline does, with
+      one QueryMatcher of all the queries scanning the title/body of each issue once
+    - fetches the comments of the union of the matched issues exactly once
+    - preprocesses and classifies each comment line once
+    - writes every classified line to the results of each query that matched its issue
+
+Only the search results and the issue -> queries index are held for the whole batch,
+the comment lines are streamed through the stages of utils/pipeline.py.
+'''
+import functools
+import re
+
+from utils.classifier import classifyCorpus, PredictionCache, DEFAULT_CHUNK_SIZE
+from utils.commentProcessor import processCorpusBatches, newProcessPool, DEFAULT_BATCH_SIZE
+from utils.githubAPI import gitHubSearchIssues, issueForComments, commentStream, printGitHubRateLimitStatus,\
+    DEFAULT_CONCURRENCY, COMMENTS_PER_PAGE, GITHUB_API_SEARCH_ISSUES_URL, GITHUB_GRAPHQL_URL
+from utils.io import newResultWriter
+from utils.matcher import QueryMatcher
+from utils.metrics import getMetrics
+from utils.pipeline import bufferedStage, batchLines, DEFAULT_QUEUE_SIZE
+from utils.sharding import gitHubShardedSearchIssues
+
+# Read a file of queries, one per line. Blank lines and lines starting with # are skipped.
+def readQueries(path):
+    with open(path) as f:
+        queries = [line.strip() for line in f]
+
+    return list(dict.fromkeys(q for q in queries if q and not q.startswith('#')))
+
+# File name part of a query's result files.
+def queryFilePrefix(out_file_prefix, query):
+    return out_file_prefix + (re.sub('[^A-Za-z0-9]+', '_', query).strip('_') or 'query')
+
+# Mine a list of queries, fetching and classifying the comments of issues matched by
+# several queries only once. Each query gets its own omitted issues and classified comments
+# results (files prefixed by queryFilePrefix, or runs `<run_id>_<n>` of a ResultStore).
+# Options are those of utils/pipeline.py's runPipeline.
+# Returns a summary dict of the batch totals, with the requests saved by deduplicating
+# issues across queries, and a 'queries' dict of each query's summary.
+def runBatchPipeline(queries, max_results, sort_by, out_file_prefix, model, vectorizer,
+                     filtered_categories=(), concurrency=DEFAULT_CONCURRENCY, workers=1,
+                     batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, with_scores=False,
+                     journal=None, report_rate_limit=False, shard=False, store=None, run_id=None,
+                     result_format='csv', prediction_cache=None, executor=None,
+                     search_url=GITHUB_API_SEARCH_ISSUES_URL, results_dir='./results/',
+                     queue_size=DEFAULT_QUEUE_SIZE, api='rest', graphql_url=GITHUB_GRAPHQL_URL,
+                     ignore_case=False, word_boundaries=False):
+    summary = {'results': 0, 'matched': 0, 'omitted': 0, 'issues': 0, 'issues_saved': 0, 'fetches_saved': 0,
+               'lines': 0, 'written': 0, 'predicted': 0}
+    query_summaries = {query: {'results': 0, 'matched': 0, 'omitted': 0, 'lines': 0, 'written': 0}
+                       for query in queries}
+    cache = prediction_cache if prediction_cache is not None else PredictionCache()
+    predicted = cache.predicted
+
+    own_executor = executor is None and workers > 1
+    if own_executor:
+        executor = newProcessPool(workers)
+
+    omitted_writers = {}
+    comments_writers = {}
+    for n, query in enumerate(queries):
+        if store is not None:
+            query_run_id = f"{run_id}_{n}"
+            store.startRun(query_run_id, query)
+            omitted_writers[query] = store.omittedWriter(query_run_id)
+            comments_writers[query] = store.commentWriter(query_run_id)
+        else:
+            prefix = queryFilePrefix(out_file_prefix, query)
+            omitted_writers[query] = newResultWriter(prefix + '_OMITTED_ISSUES', results_dir, result_format, batch_size)
+            comments_writers[query] = newResultWriter(prefix + '_CLASSIFIED_COMMENTS', results_dir, result_format,
+                                                      batch_size)
+
+    try:
+        # Search every query first, indexing the queries matching each issue.
+        issues = {}
+        issue_queries = {}
+        # Queries matched by the title/body of each issue, scanned once however many searches return it.
+        matcher = QueryMatcher(queries, ignore_case, word_boundaries)
+        matched_queries = {}
+        # Sharded searches whose count failed, see utils/sharding.py.
+        skipped_shards = []
+        search = functools.partial(gitHubShardedSearchIssues, skipped=skipped_shards) if shard else gitHubSearchIssues
+        for query in queries:
+            query_summary = query_summaries[query]
+            for r in search(query, max_results, sort_by, journal, search_url):
+                query_summary['results'] += 1
+                if r['id'] not in matched_queries:
+                    matched_queries[r['id']] = frozenset(matcher.matchingQueries(r))
+                if query in matched_queries[r['id']]:
+                    if query in issue_queries.get(r['id'], ()):
+                        continue
+                    query_summary['matched'] += 1
+                    if r['id'] in issue_queries:
+                        summary['issues_saved'] += 1
+                        summary['fetches_saved'] += -(-r['comments'] // COMMENTS_PER_PAGE)
+                        issue_queries[r['id']].append(query)
+                    else:
+                        issues[r['id']] = issueForComments(r)
+                        issue_queries[r['id']] = [query]
+                else:
+                    query_summary['omitted'] += 1
+                    omitted_writers[query].writeRows([{
+                        "issueID": r['id'],
+                        "issueURL": r['html_url'],
+                        "title": r['title'],
+                        "body": r['body']
+                    }])
+            print(f"{query}: {query_summary['results']} results retrieved, {query_summary['matched']} matched, "
+                  f"{query_summary['omitted']} omitted.")
+
+        for key in ['results', 'matched', 'omitted']:
+            summary[key] = sum(s[key] for s in query_summaries.values())
+        summary['issues'] = len(issues)
+        if shard:
+            summary['skipped_shards'] = len(skipped_shards)
+            if skipped_shards:
+                print(f"{len(skipped_shards)} created date shards couldn't be searched, their issues are missing.")
+        print(f"{summary['matched']} matched issues across {len(queries)} queries, {len(issues)} unique: "
+              f"{summary['issues_saved']} issue fetches ({summary['fetches_saved']} comment requests) saved.")
+        if report_rate_limit and api == 'rest':
+            printGitHubRateLimitStatus(core_requests=sum(-(-i['comments'] // COMMENTS_PER_PAGE)
+                                                         for i in issues.values()))
+
+        # Then fetch, preprocess and classify the union of the matched issues once.
+        fetch = commentStream(api, graphql_url)
+        comments = bufferedStage(fetch(iter(issues.values()), concurrency, journal), queue_size)
+        batches = processCorpusBatches(batchLines(comments, batch_size), executor, workers, batch_size)
+
+        for batch in bufferedStage(batches, queue_size):
+            summary['lines'] += len(batch)
+            classifyCorpus(batch, model, vectorizer, chunk_size=chunk_size, with_scores=with_scores, cache=cache)
+            summary['predicted'] = cache.predicted - predicted
+
+            rows = {query: [] for query in queries}
+            for row in batch.rows():
+                for query in issue_queries[row['issueID']]:
+                    query_summaries[query]['lines'] += 1
+                    if comments_writers[query].keeps_filtered_categories or row['category'] not in filtered_categories:
+                        rows[query].append(row)
+
+            for query, query_rows in rows.items():
+                query_summaries[query]['written'] += len(query_rows)
+                summary['written'] += len(query_rows)
+                with getMetrics().stage('write', len(query_rows)):
+                    comments_writers[query].writeRows(query_rows)
+    finally:
+        for writer in list(omitted_writers.values()) + list(comments_writers.values()):
+            writer.close()
+        if own_executor:
+            executor.shutdown()
+
+    for query, query_summary in query_summaries.items():
+        writer = comments_writers[query]
+        query_summary['results_file'] = store.path if store is not None else writer.outfile
+    summary['queries'] = query_summaries
+
+    return summary
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+'''
+Persistent on-disk cache of GitHub API responses.
+
+Responses are stored per URL along with their ETag/Last-Modified validators.
+Stale entries are revalidated with If-None-Match/If-Modified-Since conditional
+requests: a 304 Not Modified reply serves the cached body and does not count
+against GitHub's rate limit. Fresh entries (younger than the TTL) are served
+without any request, and offline mode serves only from the cache.
+
+The cache is bounded in size, evicting the least recently used entries first.
+'''
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from requests.utils import parse_header_links
+
+from utils.scheduler import RequestFailedError
+
+DEFAULT_CACHE_DIR = './cache'
+DEFAULT_TTL = 0
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+# Raised in offline mode when a URL is not in the cache.
+class CacheMissError(RequestFailedError):
+    pass
+
+# Response served from the cache, exposing the parts of requests.Response we use.
+class CachedResponse:
+    status_code = 200
+
+    def __init__(self, entry):
+        self.url = entry['url']
+        self.text = entry['body']
+        self.headers = {'Link': entry['link']} if entry.get('link') else {}
+
+    def json(self):
+        return json.loads(self.text)
+
+    @property
+    def links(self):
+        links = {}
+        for link in parse_header_links(self.headers.get('Link', '')):
+            links[link.get('rel') or link.get('url')] = link
+        return links
+
+class ResponseCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE,
+                 offline=False, clock=time.time):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        # Entry key -> size on disk, ordered from least to most recently used.
+        os.makedirs(directory, exist_ok=True)
+        self.index = OrderedDict()
+        entries = [f for f in os.listdir(directory) if f.endswith('.json')]
+        for f in sorted(entries, key=lambda f: os.path.getmtime(self.path(f[:-5]))):
+            self.index[f[:-5]] = os.path.getsize(self.path(f[:-5]))
+        self.size = sum(self.index.values())
+
+    def key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def lookup(self, url):
+        key = self.key(url)
+        with self.lock:
+            if key not in self.index:
+                return None
+            self.index.move_to_end(key)
+
+        try:
+            with open(self.path(key)) as f:
+                entry = json.load(f)
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            return None
+
+        return entry if entry['url'] == url else None
+
+    def store(self, url, entry):
+        key = self.key(url)
+        data = json.dumps(entry)
+        with open(self.path(key), 'w') as f:
+            f.write(data)
+
+        with self.lock:
+            self.size += len(data) - self.index.pop(key, 0)
+            self.index[key] = len(data)
+            self.evict()
+
+    # Remove least recently used entries until the cache fits in max_size.
+    def evict(self):
+        while self.size > self.max_size and len(self.index) > 1:
+            key, size = self.index.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    # Get a URL through the cache.
+    # `fetch(url, headers=...)` makes the actual request when the cache can't serve it.
+    def get(self, url, fetch, headers=None):
+        headers = dict(headers or {})
+        entry = self.lookup(url)
+
+        if entry is not None and (self.offline or self.clock() - entry['stored_at'] < self.ttl):
+            self.hits += 1
+            return CachedResponse(entry)
+
+        if self.offline:
+            self.misses += 1
+            raise CacheMissError(f"{url} is not cached (offline mode)")
+
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        res = fetch(url, headers=headers)
+
+        if res.status_code == 304 and entry is not None:
+            self.hits += 1
+            self.revalidated += 1
+            entry['stored_at'] = self.clock()
+            self.store(url, entry)
+            return CachedResponse(entry)
+
+        self.misses += 1
+        self.store(url, {
+            'url': url,
+            'etag': res.headers.get('ETag'),
+            'last_modified': res.headers.get('Last-Modified'),
+            'link': res.headers.get('Link'),
+            'stored_at': self.clock(),
+            'body': res.text
+        })
+        return res
+
+    def printSummary(self):
+        print(f'Response cache: {self.hits} hits ({self.revalidated} revalidated), {self.misses} misses')
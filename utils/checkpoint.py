@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+'''
+Checkpoint journal for resumable mining runs.
+
+Each run appends its completed work to an append-only JSONL journal in the
+results folder as it goes:
+    - {"type": "params", ...}                         the run's search params
+    - {"type": "search_page", "url": url, "result": {...}}  a fetched search page
+    - {"type": "issue", "issueID": id, "lines": [...]}      an issue's comment lines
+
+Resuming a run replays its journal so completed search pages and issue comment
+fetches are skipped, and only the remaining work is requested from GitHub.
+Work is only appended to the file while running, the completed work is only held in
+memory when replayed, so a run's memory doesn't grow with its results.
+'''
+import datetime
+import json
+import os
+import threading
+
+DEFAULT_JOURNAL_DIR = './results'
+
+def newRunId(prefix=''):
+    return prefix + datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+
+def journalPath(run_id, directory=DEFAULT_JOURNAL_DIR):
+    return os.path.join(directory, run_id + '.journal.jsonl')
+
+class RunJournal:
+    def __init__(self, run_id, directory=DEFAULT_JOURNAL_DIR):
+        self.run_id = run_id
+        self.path = journalPath(run_id, directory)
+        self.lock = threading.Lock()
+
+        self.params = None
+        self.search_pages = {}
+        self.issues = {}
+
+        if os.path.exists(self.path):
+            self.replay()
+
+        self.file = open(self.path, 'a')
+
+    # Load the completed work recorded by a previous (interrupted) run.
+    def replay(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                # A run killed mid-write can leave a truncated last line.
+                except ValueError:
+                    continue
+
+                if record['type'] == 'params':
+                    self.params = record['params']
+                elif record['type'] == 'search_page':
+                    self.search_pages[record['url']] = record['result']
+                elif record['type'] == 'issue':
+                    self.issues[record['issueID']] = record['lines']
+
+    def append(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+    def recordParams(self, params):
+        if self.params is None:
+            self.params = params
+            self.append({'type': 'params', 'params': params})
+
+    # Search pages are keyed by their full URL, which holds the query and page number.
+    def searchPage(self, url):
+        return self.search_pages.get(url)
+
+    def recordSearchPage(self, url, result):
+        self.append({'type': 'search_page', 'url': url, 'result': result})
+
+    def issueLines(self, issue_id):
+        return self.issues.get(issue_id)
+
+    def recordIssue(self, issue_id, lines):
+        self.append({'type': 'issue', 'issueID': issue_id, 'lines': lines})
+
+    def close(self):
+        self.file.close()
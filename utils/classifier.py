@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+'''
+Classify the processed comment lines of a CORPUS in bulk.
+
+Instead of calling vectorizer.transform() and model.predict() once per comment line,
+the lines are transformed in chunks, stacked into a single sparse matrix and
+predicted with one call, which avoids paying sklearn's per-call validation and
+sparse matrix construction for every line. Identical processed lines are predicted
+once, and a PredictionCache reuses predictions across batches and runs.
+
+Pre-condition:
+    - CORPUS list of line dicts (or CommentCorpus, see utils/corpus.py), each with a processed 'commentLine'
+    - The loaded model and count vectorizer
+
+Post-condition:
+    - Each line dict is tagged with its predicted 'category'
+      (and 'categoryScore' if scores were requested)
+'''
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from utils.corpus import commentLines, setColumn
+from utils.lazy import lazyImport
+from utils.metrics import getMetrics
+
+DEFAULT_MODEL_FILE = 'models/GitHub_comments_logisticRegression.model'
+DEFAULT_VECTORIZER_FILE = 'models/GitHub_comments_logisticRegression.countVector'
+# Number of lines transformed per vectorizer.transform() call.
+DEFAULT_CHUNK_SIZE = 5000
+# Number of predictions a PredictionCache keeps in memory.
+DEFAULT_MEMO_SIZE = 65536
+DEFAULT_PREDICTION_CACHE = './cache/predictions.db'
+# Lines looked up per query, below SQLite's limit of bound parameters.
+SQLITE_MAX_PARAMS = 500
+
+PREDICTIONS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS predictions (
+    model_hash TEXT NOT NULL,
+    line TEXT NOT NULL,
+    category TEXT NOT NULL,
+    score REAL,
+    PRIMARY KEY (model_hash, line)
+)'''
+
+# Transform a list of processed lines into one sparse feature matrix, chunk by chunk.
+def vectorizeLines(lines, vectorizer, chunk_size=DEFAULT_CHUNK_SIZE):
+    chunks = []
+    for start in range(0, len(lines), chunk_size):
+        chunks.append(vectorizer.transform(lines[start:start + chunk_size]))
+
+    if len(chunks) == 1:
+        return chunks[0]
+    # Token counts of the compact vectorizer (see utils/compactModel.py) aren't sparse matrices.
+    if hasattr(chunks[0], 'stack'):
+        return chunks[0].stack(chunks)
+
+    return lazyImport('scipy.sparse').vstack(chunks, format='csr')
+
+# Predict the category of every line in the corpus, writing the result back to each line dict.
+# If with_scores is set, the predict_proba probability of the predicted category
+# is also stored under 'categoryScore'.
+# Identical processed lines ("QUOTE", "CODE", "thanks", ...) are only vectorized and
+# predicted once. With a PredictionCache, lines it already holds aren't predicted again.
+def classifyCorpus(corpus, model, vectorizer, chunk_size=DEFAULT_CHUNK_SIZE, with_scores=False, cache=None):
+    if not corpus:
+        return corpus
+
+    lines = commentLines(corpus)
+    unique = list(dict.fromkeys(lines))
+    predictions = cache.lookup(unique, with_scores) if cache is not None else {}
+    missing = [line for line in unique if line not in predictions]
+
+    if missing:
+        with getMetrics().stage('vectorize', len(missing)):
+            features = vectorizeLines(missing, vectorizer, chunk_size)
+        with getMetrics().stage('predict', len(missing)):
+            categories = model.predict(features)
+            if with_scores:
+                scores = [float(score) for score in model.predict_proba(features).max(axis=1)]
+            else:
+                scores = [None] * len(missing)
+        missing_predictions = {line: (str(category), score)
+                               for line, category, score in zip(missing, categories, scores)}
+        if cache is not None:
+            cache.store(missing_predictions)
+        predictions.update(missing_predictions)
+
+    if cache is not None:
+        cache.lines += len(lines)
+        cache.predicted += len(missing)
+
+    setColumn(corpus, 'category', [predictions[line][0] for line in lines])
+    if with_scores:
+        setColumn(corpus, 'categoryScore', [predictions[line][1] for line in lines])
+
+    return corpus
+
+# Hash of the model and count vectorizer files, predictions cached for other model files aren't reused.
+def modelHash(*paths):
+    sha = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+
+    return sha.hexdigest()
+
+# Predictions (category, score) of processed lines, shared by the batches of a run.
+# The most recently used predictions are kept in memory. With a database path, predictions
+# are also persisted in SQLite keyed by (model hash, processed line) and reused across runs.
+# Predictions made without scores are stored without one, and predicted again by runs with scores.
+# The database connection may be used from another thread than the one creating the cache
+# (e.g. the classification service's batching thread), its accesses are serialized by a lock.
+class PredictionCache:
+    def __init__(self, model_hash=None, path=None, max_size=DEFAULT_MEMO_SIZE):
+        self.model_hash = model_hash
+        self.path = path
+        self.max_size = max_size
+        self.memo = OrderedDict()
+        self.db = None
+        self.db_lock = threading.Lock()
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(PREDICTIONS_SCHEMA)
+
+        # Lines classified, lines actually predicted by the model, and database hits.
+        self.lines = 0
+        self.predicted = 0
+        self.persisted_hits = 0
+
+    # Cached predictions of the given unique lines, as a dict of line -> (category, score).
+    # With `with_scores`, predictions cached without a score are left out.
+    def lookup(self, lines, with_scores=False):
+        found = {}
+        for line in lines:
+            prediction = self.memo.get(line)
+            if prediction is not None and (prediction[1] is not None or not with_scores):
+                self.memo.move_to_end(line)
+                found[line] = prediction
+
+        if self.db is not None:
+            missing = [line for line in lines if line not in found]
+            for start in range(0, len(missing), SQLITE_MAX_PARAMS):
+                chunk = missing[start:start + SQLITE_MAX_PARAMS]
+                with self.db_lock:
+                    rows = self.db.execute(
+                        f"SELECT line, category, score FROM predictions WHERE model_hash = ? "
+                        f"AND line IN ({','.join('?' * len(chunk))})", [self.model_hash] + chunk).fetchall()
+                for line, category, score in rows:
+                    if score is not None or not with_scores:
+                        found[line] = (category, score)
+                        self.persisted_hits += 1
+                        self.remember(line, (category, score))
+
+        return found
+
+    # Cache new predictions, a dict of line -> (category, score).
+    def store(self, predictions):
+        for line, prediction in predictions.items():
+            self.remember(line, prediction)
+
+        if self.db is not None:
+            with self.db_lock, self.db:
+                self.db.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                                    [(self.model_hash, line, category, score)
+                                     for line, (category, score) in predictions.items()])
+
+    def remember(self, line, prediction):
+        self.memo[line] = prediction
+        self.memo.move_to_end(line)
+        if len(self.memo) > self.max_size:
+            self.memo.popitem(last=False)
+
+    # Number of lines classified per line actually predicted by the model.
+    def dedupRatio(self):
+        return self.lines / max(self.predicted, 1)
+
+    def close(self):
+        if self.db is not None:
+            with self.db_lock:
+                self.db.close()
@@ -15,58 +15,201 @@ Post-condition:
 
 # Download on first run.
 # TODO: Transfer this to CLI startup?
-import nltk
 # nltk.download('wordnet')
 # nltk.download('stopwords')
 
-import spacy
+import multiprocessing
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from string import punctuation
-from nltk.stem import WordNetLemmatizer
 
-# Generate a stopword list.
-from nltk.corpus import stopwords
-eng = spacy.load('en_core_web_sm')
-from spacy.lang.en import English
+from utils.corpus import commentLines, setColumn
+from utils.lazy import lazyImport, timedLoad
+from utils.metrics import getMetrics
 
-parser = English()
+# spaCy tokenizer, stopword set and lemmatizer are loaded on first use (see getters below).
+PARSER = None
+STOP_WORDS = None
+LEMMATIZER = None
 
-stop_words = list(punctuation) + ["'s","'m","n't","'re","-","'ll",'...', "/"] + stopwords.words('english')
+def getParser():
+    global PARSER
+    if PARSER is None:
+        English = lazyImport('spacy.lang.en').English
+        PARSER = timedLoad('spacy English tokenizer', English)
 
+    return PARSER
 
-def get_lemma(item):
-    return WordNetLemmatizer().lemmatize(item)
+# Generate a stopword set, for constant time membership checks of every token.
+def getStopWords():
+    global STOP_WORDS
+    if STOP_WORDS is None:
+        stopwords = lazyImport('nltk.corpus').stopwords
+        english = timedLoad('nltk stopwords corpus', lambda: stopwords.words('english'))
+        STOP_WORDS = frozenset(list(punctuation) + ["'s","'m","n't","'re","-","'ll",'...', "/"] + english)
 
-# Main parser/processor function
+    return STOP_WORDS
 
-def processComment(c):
-    # Replace \n newline character and \t tabs
+# Single lemmatizer shared by every token.
+def getLemmatizer():
+    global LEMMATIZER
+    if LEMMATIZER is None:
+        LEMMATIZER = lazyImport('nltk.stem').WordNetLemmatizer()
+
+    return LEMMATIZER
+
+# Issue comment vocabulary is highly repetitive, so lemmas are memoized.
+LEMMA_CACHE_SIZE = 65536
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def get_lemma(item):
+    return getLemmatizer().lemmatize(item)
+
+# Number of lines the spacy tokenizer processes per batch with parser.pipe()
+DEFAULT_BATCH_SIZE = 1000
+
+# Split a raw comment body into its non-empty raw lines.
+# Code is tokenized before splitting lines to prevent random code formatted lines
+# to throw error and skew the results.
+def splitComment(body):
+    code_tokenized_comment = re.sub('```([^`]*)```|`([^`]*)`', 'CODE', body)
+    lines = []
+    for line in code_tokenized_comment.splitlines():
+        line = line.strip('\n')
+        line = line.strip('\t')
+        if line:
+            lines.append(line)
+
+    return lines
+
+# Replace \n newline character and \t tabs
+def cleanLine(c):
     c = c.replace('\n', '')
     c = c.replace('\t', '')
+    return c
 
+# Process a line already parsed into Tokens by the spacy parser.
+def processParsedLine(parsed_line):
     # Array to store all processed string tokens
     processed_tokens = []
+    stop_words = getStopWords()
 
-    # Parse them into Token using spacy parser
-    parsed_line = parser(c)
+    # Nothing left to process once newlines/tabs are removed.
+    if len(parsed_line) == 0:
+        return ""
 
     # If the line starts with ">" (markdown for quote), return QUOTE token for line
     # as this line is a quoted line.
-    if(str(parsed_line[0]) == ">"):
+    if(parsed_line[0].orth_ == ">"):
         return "QUOTE"
 
     # For each token/word in the line that, tokenize the remaining URL/SCREEN_NAME
     # And also filter out words that are in the stop_words list.
     for token in parsed_line:
-        if token.orth_.isspace():
+        text = token.orth_
+        if text.isspace():
             continue
-        elif str(token) == "CODE":
+        elif text == "CODE":
             processed_tokens.append("CODE")
         elif token.like_url:
             processed_tokens.append('URL')
-        elif token.orth_.startswith('@'):
+        elif text.startswith('@'):
             processed_tokens.append('SCREEN_NAME')
-        elif str(token) not in stop_words:
+        elif text not in stop_words:
             processed_tokens.append(get_lemma(token.lower_))
 
     # Return it as a string.
     return ' '.join(processed_tokens)
+
+# Main parser/processor function
+
+def processComment(c):
+    # Parse them into Token using spacy parser
+    return processParsedLine(getParser()(cleanLine(c)))
+
+# Process a list of lines in a single process, tokenizing them in batches with parser.pipe()
+def processLines(lines, batch_size=DEFAULT_BATCH_SIZE):
+    cleaned_lines = (cleanLine(c) for c in lines)
+    parsed_lines = getParser().pipe(cleaned_lines, batch_size=batch_size)
+    return [processParsedLine(parsed_line) for parsed_line in parsed_lines]
+
+# Process a list of raw lines, splitting them across `workers` processes.
+# Each worker loads the tokenizer once and processes a contiguous chunk of the lines,
+# the processed lines are returned in the same order as the input lines.
+def processComments(lines, workers=1, batch_size=DEFAULT_BATCH_SIZE):
+    lines = list(lines)
+    if workers <= 1 or len(lines) <= batch_size:
+        return processLines(lines, batch_size)
+
+    chunk_size = max(batch_size, -(-len(lines) // (workers * 4)))
+    chunks = [lines[i:i + chunk_size] for i in range(0, len(lines), chunk_size)]
+
+    results = []
+    with newProcessPool(workers) as executor:
+        for processed in executor.map(processLines, chunks, [batch_size] * len(chunks)):
+            results += processed
+
+    return results
+
+# Process pool to preprocess lines with.
+# The worker processes are started right away, so when this is called before any other
+# thread is started they are forked from a single threaded process.
+def newProcessPool(workers):
+    # Fork workers where possible, they inherit the tokenizer/stopwords loaded here and
+    # the calling script is not re-imported in every worker as with spawn.
+    getParser()
+    getStopWords()
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in start_methods else None)
+
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    for future in [executor.submit(len, '') for _ in range(workers)]:
+        future.result()
+
+    return executor
+
+# Generator processing a stream of batches of line dicts (or CommentCorpus), processing the raw 'commentLine'
+# of each line in place and yielding the batches in the same order.
+# With a process pool of `workers` processes (see newProcessPool), at most 2 batches per
+# worker are in flight so the input is only consumed as fast as it is processed.
+# The time spent processing each batch is recorded to the run's 'preprocess' stage (see utils/metrics.py).
+def processCorpusBatches(batches, executor=None, workers=1, batch_size=DEFAULT_BATCH_SIZE):
+    if executor is None:
+        for batch in batches:
+            with getMetrics().stage('preprocess', len(batch)):
+                processCorpus(batch, batch_size=batch_size)
+            yield batch
+        return
+
+    in_flight = deque()
+    max_in_flight = 2 * workers
+
+    def completed():
+        batch, future = in_flight.popleft()
+        lines, seconds = future.result()
+        getMetrics().recordStage('preprocess', seconds, len(lines))
+        setColumn(batch, 'commentLine', lines)
+        return batch
+
+    for batch in batches:
+        in_flight.append((batch, executor.submit(timedProcessLines, commentLines(batch), batch_size)))
+        if len(in_flight) >= max_in_flight:
+            yield completed()
+
+    while in_flight:
+        yield completed()
+
+# processLines in a worker process, returning the processed lines and the seconds it took.
+def timedProcessLines(lines, batch_size=DEFAULT_BATCH_SIZE):
+    start = time.perf_counter()
+    lines = processLines(lines, batch_size)
+    return lines, time.perf_counter() - start
+
+# Process the raw 'commentLine' of every line dict in the corpus (or CommentCorpus) in place.
+def processCorpus(corpus, workers=1, batch_size=DEFAULT_BATCH_SIZE):
+    setColumn(corpus, 'commentLine', processComments(commentLines(corpus), workers, batch_size))
+
+    return corpus
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+'''
+Compact, memory-mapped export of the count vectorizer and logistic regression model.
+
+Loading the joblib files unpickles a CountVectorizer and a LogisticRegression, which
+imports sklearn (and scipy) and rebuilds the vectorizer's vocabulary dict on every run.
+The export step writes them as plain arrays instead:
+    - vocabulary.npy: the vocabulary terms, sorted (a term's rank is its feature index)
+    - coef.npy: the model coefficients, one row of per class weights per feature
+    - intercept.npy, classes.npy
+    - model.json: the tokenization parameters and the model's multi class scheme
+which are loaded with numpy only, the large arrays memory-mapped (mmap_mode='r') so that
+only the pages of the features actually used are read, and shared by the processes
+using the same export.
+
+CompactVectorizer.transform() tokenizes lines the way the CountVectorizer does and looks
+all their tokens up in the sorted vocabulary with one np.searchsorted call,
+CompactModel.predict()/predict_proba() sum the coefficients of each line's tokens in
+the order sklearn's sparse product does, so predictions are identical to the joblib
+model's (checked on export, see verifyCompactModel).
+
+Exports are cached by the hash of the joblib files (see compactModel), a run only loads
+the joblib files the first time a model is used.
+'''
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from utils.classifier import modelHash
+from utils.lazy import lazyImport
+
+DEFAULT_COMPACT_MODEL_DIR = './cache/models/'
+COMPACT_MODEL_FORMAT = 1
+
+# Probe lines predictions of an export are checked on, besides every vocabulary term.
+PROBE_LINES = ["", "QUOTE", "CODE", "URL", "SCREEN_NAME", "thanks lot", "I can reproduce this on version 2.4",
+               "This is a bug, the expected behaviour is CODE", "Any update on this? CODE CODE URL"]
+
+# Token counts of a chunk of lines, in CSR layout: the feature indices and counts of
+# line i are indices[indptr[i]:indptr[i + 1]] and counts[indptr[i]:indptr[i + 1]],
+# by increasing feature index.
+class TokenCounts:
+    def __init__(self, indptr, indices, counts, n_features):
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.shape = (len(indptr) - 1, n_features)
+
+    # Token counts of several chunks of lines, one after the other.
+    @staticmethod
+    def stack(chunks):
+        np = lazyImport('numpy')
+        offsets = np.cumsum([0] + [len(chunk.indices) for chunk in chunks[:-1]])
+        indptr = np.concatenate([chunks[0].indptr[:1]] +
+                                [chunk.indptr[1:] + offset for chunk, offset in zip(chunks, offsets)])
+        return TokenCounts(indptr, np.concatenate([chunk.indices for chunk in chunks]),
+                           np.concatenate([chunk.counts for chunk in chunks]), chunks[0].shape[1])
+
+# Token counts of `n_lines` lines from the line (`rows`) and feature index of each of their tokens.
+def countTokens(rows, features, n_lines, n_features):
+    np = lazyImport('numpy')
+    # Count each (line, feature) pair, sorted by line then feature.
+    keys, counts = np.unique(rows * n_features + features, return_counts=True)
+    indptr = np.searchsorted(keys // n_features, np.arange(n_lines + 1))
+    return TokenCounts(indptr, keys % n_features, counts, n_features)
+
+# Same tokenization and counts as the exported CountVectorizer.
+class CompactVectorizer:
+    def __init__(self, vocabulary, token_pattern, lowercase=True):
+        self.vocabulary = vocabulary
+        self.token_pattern = re.compile(token_pattern)
+        self.lowercase = lowercase
+
+    def transform(self, lines):
+        np = lazyImport('numpy')
+        # Tokens longer than the longest term can't be one. They're left out before the tokens
+        # are laid out as a fixed width array, whose width is that of its longest token.
+        max_length = self.vocabulary.dtype.itemsize // 4
+        tokens = []
+        rows = []
+        for row, line in enumerate(lines):
+            line_tokens = [token for token in self.token_pattern.findall(line.lower() if self.lowercase else line)
+                           if len(token) <= max_length]
+            tokens += line_tokens
+            rows += [row] * len(line_tokens)
+
+        n_features = len(self.vocabulary)
+        tokens = np.array(tokens, dtype=str)
+        positions = np.minimum(np.searchsorted(self.vocabulary, tokens), n_features - 1)
+        known = self.vocabulary[positions] == tokens
+
+        return countTokens(np.array(rows, dtype=np.int64)[known], positions[known], len(lines), n_features)
+
+# Logistic regression predictions from the exported coefficients.
+class CompactModel:
+    def __init__(self, coef, intercept, classes, multi_class):
+        self.coef = coef
+        self.intercept = intercept
+        self.classes = classes
+        self.multi_class = multi_class
+
+    def decision_function(self, X):
+        np = lazyImport('numpy')
+        scores = np.zeros((X.shape[0], self.coef.shape[1]))
+        rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+        # Accumulated line by line in feature order, like sklearn's sparse product.
+        np.add.at(scores, rows, self.coef[X.indices] * X.counts[:, None])
+        scores += self.intercept
+        return scores[:, 0] if scores.shape[1] == 1 else scores
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            return self.classes[(scores > 0).astype(int)]
+        return self.classes[scores.argmax(axis=1)]
+
+    def predict_proba(self, X):
+        np = lazyImport('numpy')
+        scores = self.decision_function(X)
+        if self.multi_class == 'multinomial':
+            if scores.ndim == 1:
+                scores = np.c_[-scores, scores]
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return scores / scores.sum(axis=1, keepdims=True)
+
+        probabilities = 1 / (1 + np.exp(-scores))
+        if probabilities.ndim == 1:
+            return np.c_[1 - probabilities, probabilities]
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+# Multi class scheme of a fitted LogisticRegression, resolved like sklearn does for 'auto'.
+def multiClass(model):
+    multi_class = getattr(model, 'multi_class', 'auto')
+    if multi_class in ('auto', 'deprecated'):
+        return 'ovr' if model.solver == 'liblinear' or len(model.classes_) == 2 else 'multinomial'
+    return multi_class
+
+# Raise ValueError unless a CountVectorizer only counts word unigrams matched by its token pattern
+# (no preprocessor, tokenizer, stop words or accent stripping), the tokenization reproduced here.
+def checkVectorizer(vectorizer):
+    if vectorizer.analyzer != 'word' or vectorizer.ngram_range != (1, 1) or vectorizer.binary \
+            or vectorizer.preprocessor is not None or vectorizer.tokenizer is not None \
+            or vectorizer.stop_words is not None or vectorizer.strip_accents is not None:
+        raise ValueError(f"{vectorizer} isn't supported, only word unigram counts are")
+
+# Write the compact export of a fitted CountVectorizer and LogisticRegression to `directory`.
+# Only word unigram count vectorizers are supported (see checkVectorizer), raises ValueError otherwise.
+def exportCompactModel(model, vectorizer, directory):
+    np = lazyImport('numpy')
+    checkVectorizer(vectorizer)
+
+    vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    if vocabulary != sorted(vocabulary):
+        raise ValueError("the vectorizer's feature indices aren't sorted by term")
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'vocabulary.npy'), np.array(vocabulary, dtype=str))
+    np.save(os.path.join(directory, 'coef.npy'), np.ascontiguousarray(model.coef_.T))
+    np.save(os.path.join(directory, 'intercept.npy'), model.intercept_)
+    np.save(os.path.join(directory, 'classes.npy'), np.array([str(c) for c in model.classes_]))
+    with open(os.path.join(directory, 'model.json'), 'w') as f:
+        json.dump({
+            'format': COMPACT_MODEL_FORMAT,
+            'token_pattern': vectorizer.token_pattern,
+            'lowercase': vectorizer.lowercase,
+            'multi_class': multiClass(model)
+        }, f)
+
+# Load a compact export, returns (model, vectorizer).
+def loadCompactModel(directory):
+    np = lazyImport('numpy')
+    with open(os.path.join(directory, 'model.json')) as f:
+        meta = json.load(f)
+
+    def array(name, mmap_mode='r'):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+    vectorizer = CompactVectorizer(array('vocabulary'), meta['token_pattern'], meta['lowercase'])
+    model = CompactModel(array('coef'), array('intercept', None), array('classes', None), meta['multi_class'])
+    return model, vectorizer
+
+# Lines whose predictions by the compact export differ from the joblib model's
+# (each vocabulary term and PROBE_LINES, plus `lines` if given), as (line, expected, predicted).
+def verifyCompactModel(model, vectorizer, compact_model, compact_vectorizer, lines=()):
+    np = lazyImport('numpy')
+    lines = list(vectorizer.vocabulary_) + PROBE_LINES + list(lines)
+    expected = model.predict(vectorizer.transform(lines))
+    predicted = compact_model.predict(compact_vectorizer.transform(lines))
+    expected_scores = model.predict_proba(vectorizer.transform(lines)).max(axis=1)
+    scores = compact_model.predict_proba(compact_vectorizer.transform(lines)).max(axis=1)
+
+    return [(line, e, p) for line, e, p, es, s in zip(lines, expected, predicted, expected_scores, scores)
+            if e != p or not np.isclose(es, s, rtol=0, atol=1e-12)]
+
+# The compact export of joblib model and vectorizer files, exported to `cache_dir` (and
+# verified against the joblib model) the first time, then loaded from it.
+# Returns (model, vectorizer), raises ValueError if the export can't reproduce the
+# joblib model's predictions.
+def compactModel(model_file, vectorizer_file, cache_dir=DEFAULT_COMPACT_MODEL_DIR, model_hash=None):
+    if model_hash is None:
+        model_hash = modelHash(model_file, vectorizer_file)
+    directory = os.path.join(cache_dir, model_hash)
+    if not os.path.exists(os.path.join(directory, 'model.json')):
+        load = lazyImport('joblib').load
+        model, vectorizer = load(model_file), load(vectorizer_file)
+
+        # Exported next to the cache directory and renamed, so a partial export is never loaded.
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=cache_dir)
+        try:
+            exportCompactModel(model, vectorizer, staging)
+            mismatches = verifyCompactModel(model, vectorizer, *loadCompactModel(staging))
+            if mismatches:
+                raise ValueError(f"compact export of {model_file} predicts {len(mismatches)} probe lines "
+                                 f"differently, e.g. {mismatches[0]}")
+            try:
+                os.rename(staging, directory)
+            except OSError:
+                # Exported concurrently by another process.
+                pass
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    return loadCompactModel(directory)
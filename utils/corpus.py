@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+'''
+Compact in-memory CORPUS of comment lines.
+
+A list of line dicts holds a five (then six, seven) key dict per comment line, every
+line of a comment repeating the same issue/comment fields. CommentCorpus instead keeps:
+    - an issues table:   (issueID, issueURL_API, issueURL_HTML), stored once per issue
+    - a comments table:  commentURL and the index of its issue, stored once per comment
+    - per line columns:  the comment index (array), the commentLine text (list),
+                         the category index (array, into a categories table)
+                         and the categoryScore (array)
+
+Line dicts are only built on demand (iterating, indexing) with the same keys and key
+order as the line dicts of utils/githubAPI.py's processCommentPage, so the result
+writers consume a CommentCorpus like a list of line dicts.
+
+The functions processing and classifying a corpus (utils/commentProcessor.py,
+utils/classifier.py) accept both, through commentLines() and setColumn().
+'''
+from array import array
+
+class CommentCorpus:
+    __slots__ = ('issues', 'issue_index', 'comments', 'comment_issue', 'comment_index',
+                 'line_comment', 'lines', 'categories', 'category_index', 'line_category', 'scores')
+
+    def __init__(self, lines=()):
+        self.issues = []
+        self.issue_index = {}
+        self.comments = []
+        self.comment_issue = array('l')
+        self.comment_index = {}
+        self.line_comment = array('l')
+        self.lines = []
+        self.categories = []
+        self.category_index = {}
+        self.line_category = None
+        self.scores = None
+        self.extend(lines)
+
+    def addLine(self, issue_id, issue_url_api, issue_url_html, comment_url, line):
+        issue_key = (issue_id, issue_url_api, issue_url_html)
+        issue = self.issue_index.get(issue_key)
+        if issue is None:
+            issue = self.issue_index[issue_key] = len(self.issues)
+            self.issues.append(issue_key)
+
+        comment = self.comment_index.get((issue, comment_url))
+        if comment is None:
+            comment = self.comment_index[(issue, comment_url)] = len(self.comments)
+            self.comments.append(comment_url)
+            self.comment_issue.append(issue)
+
+        self.line_comment.append(comment)
+        self.lines.append(line)
+
+    # Add line dicts, i.e the lines returned by processCommentPage or replayed from a run journal.
+    def extend(self, lines):
+        for c in lines:
+            self.addLine(c['issueID'], c['issueURL_API'], c['issueURL_HTML'], c['commentURL'], c['commentLine'])
+
+    # Replace a column of every line: 'commentLine', 'category' or 'categoryScore'.
+    def setColumn(self, key, values):
+        if key == 'commentLine':
+            self.lines = list(values)
+        elif key == 'category':
+            self.line_category = array('B')
+            for category in values:
+                index = self.category_index.get(category)
+                if index is None:
+                    index = self.category_index[category] = len(self.categories)
+                    self.categories.append(str(category))
+                self.line_category.append(index)
+        elif key == 'categoryScore':
+            self.scores = array('d', values)
+        else:
+            raise KeyError(key)
+
+    def row(self, i):
+        comment = self.line_comment[i]
+        issue_id, issue_url_api, issue_url_html = self.issues[self.comment_issue[comment]]
+        row = {
+            "issueID": issue_id,
+            "issueURL_API": issue_url_api,
+            "issueURL_HTML": issue_url_html,
+            "commentLine": self.lines[i],
+            "commentURL": self.comments[comment]
+        }
+        if self.line_category is not None:
+            row["category"] = self.categories[self.line_category[i]]
+        if self.scores is not None:
+            row["categoryScore"] = self.scores[i]
+        return row
+
+    # Indexes of the lines whose category is not in `exclude`.
+    def selected(self, exclude=()):
+        if not exclude or self.line_category is None:
+            return range(len(self.lines))
+
+        excluded = {self.category_index[c] for c in exclude if c in self.category_index}
+        return [i for i, category in enumerate(self.line_category) if category not in excluded]
+
+    # Generator of the line dicts, without the lines whose category is in `exclude`.
+    def rows(self, exclude=()):
+        for i in self.selected(exclude):
+            yield self.row(i)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return self.rows()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(j) for j in range(len(self.lines))[i]]
+        return self.row(range(len(self.lines))[i])
+
+    # Equal to a list of the same line dicts.
+    def __eq__(self, other):
+        if not isinstance(other, (list, CommentCorpus)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+# The 'commentLine' of every line of a CommentCorpus or list of line dicts.
+def commentLines(corpus):
+    if isinstance(corpus, CommentCorpus):
+        return corpus.lines
+    return [c['commentLine'] for c in corpus]
+
+# Set a column of every line of a CommentCorpus or list of line dicts.
+def setColumn(corpus, key, values):
+    if isinstance(corpus, CommentCorpus):
+        corpus.setColumn(key, values)
+    else:
+        for c, value in zip(corpus, values):
+            c[key] = value
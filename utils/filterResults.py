@@ -13,20 +13,45 @@ Pre-condition:
 
 Post-condition:
     - Returns a filtered list of the results whose title/body matches the query string
+
+Queries may combine terms with AND/OR, and be matched case insensitively or on word
+boundaries only (see utils/matcher.py).
 '''
+from functools import lru_cache
 
 from utils.io import printGHIssue
+from utils.matcher import QueryMatcher
+
+# The compiled matcher of a single query, compiled once per query.
+@lru_cache(maxsize=64)
+def queryMatcher(query, ignore_case=False, word_boundaries=False):
+    return QueryMatcher([query], ignore_case, word_boundaries)
 
-def filterIssueWithQueryString(results, query):
+# Whether a single result's title/body contains the query string
+def issueMatchesQuery(r, query, ignore_case=False, word_boundaries=False):
+    return bool(queryMatcher(query, ignore_case, word_boundaries).matchingQueries(r))
+
+def filterIssueWithQueryString(results, query, ignore_case=False, word_boundaries=False):
     matchedResults = []
     omittedResults = []
 
     for r in results:
-        title = r['title'] or ""
-        body = r['body'] or ""
-        if query in  title or query in body:
+        if issueMatchesQuery(r, query, ignore_case, word_boundaries):
             matchedResults.append(r)
         else:
             omittedResults.append(r)
 
-    return [matchedResults, omittedResults]
\ No newline at end of file
+    return [matchedResults, omittedResults]
+
+# Same as filterIssueWithQueryString for several queries, scanning each result's title/body
+# once for all of them. Returns a dict of [matched results, omitted results] per query.
+def filterIssuesWithQueries(results, queries, ignore_case=False, word_boundaries=False):
+    matcher = QueryMatcher(queries, ignore_case, word_boundaries)
+    filtered = {query: [[], []] for query in queries}
+
+    for r in results:
+        matched = set(matcher.matchingQueries(r))
+        for query in filtered:
+            filtered[query][0 if query in matched else 1].append(r)
+
+    return filtered
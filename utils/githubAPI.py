@@ -1,19 +1,91 @@
 '''
 This file contains all the utility function to make HTTP calls to the API
 '''
+import datetime
+import logging
 import requests
 import time
 import json
-import re
-from utils.commentProcessor import processComment
-from urllib.error import HTTPError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from requests.adapters import HTTPAdapter
+from utils.scheduler import RequestScheduler, RequestFailedError, DEFAULT_MAX_RETRIES, RATE_LIMITS, projectCompletion
+from utils.cache import ResponseCache
+from utils.commentProcessor import splitComment
+from utils.corpus import CommentCorpus
+from utils.metrics import getMetrics
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
 
 # GLOBAL access token. getter function below.
 ACCESS_TOKEN = None
+
+# Max page size allowed by GitHub's REST API (defaults to 30 when not set).
+COMMENTS_PER_PAGE = 100
+
+# Default number of issues whose comments are fetched concurrently.
+DEFAULT_CONCURRENCY = 8
+
+# GLOBAL HTTP session shared by every API call so that keep-alive connections
+# are pooled and reused instead of a new TCP/TLS handshake per request.
+# Its connection pools hold at least `pool_size` connections per host: when a larger
+# pool is requested (i.e. for a higher concurrency), a larger adapter is mounted.
+SESSION = None
+SESSION_POOL_SIZE = 0
+def getSession(pool_size=DEFAULT_CONCURRENCY):
+    global SESSION, SESSION_POOL_SIZE
+    if SESSION is None:
+        SESSION = requests.Session()
+    if pool_size > SESSION_POOL_SIZE:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        SESSION.mount('https://', adapter)
+        SESSION.mount('http://', adapter)
+        SESSION_POOL_SIZE = pool_size
+
+    return SESSION
+
+# GLOBAL request scheduler, every GitHub API request goes through it so that
+# the core and search rate limits are budgeted and retried in one place.
+SCHEDULER = None
+def getScheduler():
+    global SCHEDULER
+    if SCHEDULER is None:
+        SCHEDULER = RequestScheduler(getSession())
+
+    return SCHEDULER
+
+def configureScheduler(max_retries=DEFAULT_MAX_RETRIES):
+    getScheduler().max_retries = max_retries
+
+# GLOBAL on-disk response cache, disabled (None) unless configured.
+CACHE = None
+def configureCache(enabled=True, **options):
+    global CACHE
+    CACHE = ResponseCache(**options) if enabled else None
+    return CACHE
+
+def getCache():
+    return CACHE
+
+# GET a GitHub API URL through the response cache (if enabled) and the request scheduler.
+def gitHubGet(url, resource='core'):
+    headers = {}
+    headers['Authorization'] = f"token {ACCESS_TOKEN}"
+
+    def fetch(url, headers):
+        return getScheduler().get(url, resource=resource, headers=headers)
+
+    if CACHE is None:
+        return fetch(url, headers)
+
+    return CACHE.get(url, fetch, headers)
+
 def validateAccessToken(token):
     headers = {}
     headers['Authorization'] = f"token {token}"
-    res = requests.get("https://api.github.com/rate_limit", headers=headers)
+    res = getSession().get("https://api.github.com/rate_limit", headers=headers)
 
     return res.status_code != 401
 
@@ -29,74 +101,400 @@ def loadAccessToken():
         global ACCESS_TOKEN
         ACCESS_TOKEN = data['access_token']
 
+def setAccessToken(access_token):
+    global ACCESS_TOKEN
+    ACCESS_TOKEN = access_token
+
 def getAccessToken():
     return ACCESS_TOKEN
 
 
 # Takes in the full URL for the search query
 # Sample: https://api.github.com/search/issues?q=%22%40tf.function%22&per_page=3&sort=comments&order=desc
-# Returns the results in JSON format
+# Returns the results in JSON format, or None if the request failed after all retries.
 def gitHubSearchQueryAPI(url):
     try:
-        headers = {}
-        headers['Authorization'] = f"token {ACCESS_TOKEN}"
-        pageResult = requests.get(url, headers=headers)
-        pageResult.raise_for_status()
+        with getMetrics().stage('search') as stage:
+            pageResult = gitHubGet(url, resource='search').json()
+            stage['items'] = len(pageResult.get('items', ()))
 
-        return pageResult.json()
+        return pageResult
 
-    except HTTPError:
-        print("Search Query HTTPError: " + url)
-        exit(0)
+    except RequestFailedError as e:
+        logger.error("Search Query Error: " + str(e))
+        return None
 
-# Given a list of issues with their comments API URL
-# Query each of them and return the results in a consolidated list
-def gitHubCommentAPI(issues):
+GITHUB_API_SEARCH_ISSUES_URL = "https://api.github.com/search/issues"
+
+# GitHub search returns at most 100 results per page, and at most 1000 results per query.
+SEARCH_RESULTS_PER_PAGE = 100
+SEARCH_RESULT_LIMIT = 1000
+
+# Generator over the issues matching a search query, up to max_results issues
+# (and GitHub's limit of 1000 results per query, see utils.sharding to go beyond it).
+# Search pages are requested one at a time as the issues are consumed.
+# If a run journal is given, pages it already holds are not requested again and
+# newly fetched pages are recorded to it.
+def gitHubSearchIssues(query, max_results, sort_by, journal=None, search_url=GITHUB_API_SEARCH_ISSUES_URL):
+    max_results = min(max_results, SEARCH_RESULT_LIMIT)
+    max_pages = max(ceil(max_results / SEARCH_RESULTS_PER_PAGE), 1)
+    per_page = min(max_results, SEARCH_RESULTS_PER_PAGE)
+    num_results = 0
+
+    for page in range(1, max_pages + 1):
+        url = search_url + "?" + urlencode({
+            'q': query,
+            'per_page': per_page,
+            'sort': sort_by,
+            'order': 'desc',
+            'page': page
+        })
+
+        # Reuse the page if it was completed by the run being resumed.
+        pageResults = journal.searchPage(url) if journal is not None else None
+        if pageResults is None:
+            logger.debug("[SEARCH QUERY GET]: " + url)
+
+            pageResults = gitHubSearchQueryAPI(url)
+            if pageResults is not None and journal is not None:
+                journal.recordSearchPage(url, pageResults)
+
+        # If the page failed after all retries or there are no more results, stop querying additional pages.
+        if pageResults is None or len(pageResults['items']) == 0:
+            return
+
+        # Trim the results down to the max_results limit
+        for issue in pageResults['items'][:max_results - num_results]:
+            num_results += 1
+            yield issue
+
+        # A partial page is the last page, no need to request the next (empty) one.
+        if num_results >= max_results or len(pageResults['items']) < per_page:
+            return
+
+# Number of issues matching a search query, GitHub's `total_count` of the query.
+# Returns None if the request failed after all retries.
+def gitHubSearchTotalCount(query, search_url=GITHUB_API_SEARCH_ISSUES_URL):
+    url = search_url + "?" + urlencode({'q': query, 'per_page': 1})
+    logger.debug("[SEARCH COUNT GET]: " + url)
+
+    pageResults = gitHubSearchQueryAPI(url)
+    return None if pageResults is None else pageResults['total_count']
+
+# Set (or override) query string params on a URL.
+def withQueryParams(url, **params):
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update({k: str(v) for k, v in params.items()})
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+# Generator over the pages of an issue's comments.
+# Requests the largest page size and follows the `Link: rel="next"` header
+# until the last page, yielding each page's list of comments as it arrives.
+# Raises RequestFailedError if a page still fails after all retries.
+def gitHubCommentPagesAPI(comments_url):
+    url = withQueryParams(comments_url, per_page=COMMENTS_PER_PAGE)
+
+    while url:
+        logger.debug("[COMMENTS URL GET]: " + url)
+
+        res = gitHubGet(url, resource='core')
+
+        yield res.json()
+
+        url = res.links.get('next', {}).get('url')
+
+# Given a single issue with its comments API URL, query all pages of its comments and
+# return the list of comment lines tagged with the issue/comment data.
+# Lines are left raw, they are processed separately by utils.commentProcessor.processCorpus
+# Raises RequestFailedError if fetching fails after all retries.
+def gitHubIssueCommentsAPI(issue):
+    results = []
+
+    # Skip the round trip entirely when the search result says there are no comments.
+    if issue.get('comments') == 0:
+        return results
+
+    for comment_data in gitHubCommentPagesAPI(issue['comments_url']):
+        results += processCommentPage(issue, comment_data)
+
+    return results
+
+# What gitHubCommentStream needs of a search result issue to fetch its comments.
+def issueForComments(r, comments_url=None):
+    return {
+        "issueID": r['id'],
+        "comments_url": comments_url or r['comments_url'],
+        "comments": r['comments'],
+        "updated_at": r.get('updated_at'),
+        "issueURL_HTML": r['html_url'],
+        # Used by the GraphQL backend, see gitHubGraphQLCommentStream.
+        "node_id": r.get('node_id'),
+        "issueURL_API": r.get('url')
+    }
+
+# Split each non-bot comment of a page of comments into comment lines.
+def processCommentPage(issue, comment_data):
     results = []
-    for i in issues:
-        print("[COMMENTS URL GET]: " + i['comments_url'])
+    # For each non-bot comment, split up each sentence and append into CORPUS array above.
+    for comment in comment_data:
+        if (comment["user"]["type"] != "Bot" and comment["user"]["login"] != "dependabot[bot]"):
+            for line in splitComment(comment["body"]):
+                results.append({
+                    "issueID": issue['issueID'],
+                    "issueURL_API": comment['issue_url'],
+                    "issueURL_HTML": issue['issueURL_HTML'],
+                    "commentLine": line,
+                    "commentURL": comment['html_url']
+                })
+
+    return results
+
+# Given an iterable of issues with their comments API URL, query each of them and
+# yield (issue, comment lines) pairs in the same order as the input issues.
+# Up to `concurrency` issues are fetched at once over the shared session, and the
+# input issues are only consumed as fast as fetching keeps up.
+# If a run journal is given, issues it already holds are not fetched again and
+# newly fetched issues are recorded to it.
+# If fetching an issue fails after all retries, the issue is reported and skipped
+# (yielded with no lines and marked 'fetchFailed') so the rest of the run's work is kept.
+def gitHubCommentStream(issues, concurrency=DEFAULT_CONCURRENCY, journal=None):
+    getSession(concurrency)
+
+    def fetch(issue):
+        if journal is not None:
+            lines = journal.issueLines(issue['issueID'])
+            if lines is not None:
+                return lines
 
         try:
-            headers = {}
-            headers['Authorization'] = f"token {ACCESS_TOKEN}"
-            res = requests.get(i['comments_url'], headers=headers)
-            res.raise_for_status()
-            comment_data = res.json()
-        # We usually 403 error out here for API limit
-        # Try and fix the limit of issues/comments above.
-        except HTTPError:
-            print("Comments API HTTPError: " + i['comments_url'])
-            exit(0)
-
-        # For each non-bot comment, split up each sentence and append into CORPUS array above.
-        for comment in comment_data:
-            if (comment["user"]["type"] != "Bot" and comment["user"]["login"] != "dependabot[bot]"):
-
-                # Tokenize CODE before splitting lines to prevent random code formatted lines
-                # to throw error and skew the results.
-                code_tokenized_comment = re.sub('```([^`]*)```|`([^`]*)`', 'CODE', comment["body"])
-
-                comment_lines = code_tokenized_comment.splitlines()
-                for line in comment_lines:
-                    line = line.strip('\n')
-                    line = line.strip('\t')
-                    if line:
-                        results.append({
-                            "issueID": i['issueID'],
-                            "issueURL_API": comment['issue_url'],
-                            "issueURL_HTML": i['issueURL_HTML'],
-                            "commentLine": processComment(line),
-                            "commentURL": comment['html_url']
-                        })
+            with getMetrics().stage('fetch', 1):
+                lines = gitHubIssueCommentsAPI(issue)
+        except RequestFailedError as e:
+            logger.error("Comments API Error, skipping issue: " + str(e))
+            issue['fetchFailed'] = True
+            return []
+
+        if journal is not None:
+            journal.recordIssue(issue['issueID'], lines)
+
+        return lines
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        in_flight = deque()
+        for issue in issues:
+            in_flight.append((issue, executor.submit(fetch, issue)))
+            if len(in_flight) >= 2 * max(1, concurrency):
+                issue, future = in_flight.popleft()
+                yield issue, future.result()
+
+        while in_flight:
+            issue, future = in_flight.popleft()
+            yield issue, future.result()
+
+# Given a list of issues with their comments API URL
+# Query each of them and return the results in a consolidated CommentCorpus (see utils/corpus.py).
+# See gitHubCommentStream for concurrency, journal and error handling.
+def gitHubCommentAPI(issues, concurrency=DEFAULT_CONCURRENCY, journal=None):
+    results = CommentCorpus()
+    for issue, lines in gitHubCommentStream(issues, concurrency, journal):
+        results.extend(lines)
 
     return results
 
-def printGitHubRateLimitStatus():
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+# Issues whose first page of comments is requested per GraphQL request. Each issue's
+# comments connection counts for one of the 100 nodes per point of a request's cost,
+# so a request for 50 issues with 100 comments each costs a single point.
+GRAPHQL_ISSUES_PER_REQUEST = 50
+
+GRAPHQL_COMMENT_PAGE = """
+fragment commentPage on IssueCommentConnection {
+  pageInfo { hasNextPage endCursor }
+  nodes { body url updatedAt author { login __typename } }
+}
+"""
+GRAPHQL_RATE_LIMIT = "rateLimit { cost remaining limit resetAt }"
+
+GRAPHQL_ISSUES_QUERY = """
+query($ids: [ID!]!) {
+  %s
+  nodes(ids: $ids) {
+    ... on Issue { id comments(first: %d) { ...commentPage } }
+    ... on PullRequest { id comments(first: %d) { ...commentPage } }
+  }
+}
+""" % (GRAPHQL_RATE_LIMIT, COMMENTS_PER_PAGE, COMMENTS_PER_PAGE) + GRAPHQL_COMMENT_PAGE
+
+GRAPHQL_COMMENTS_QUERY = """
+query($id: ID!, $after: String) {
+  %s
+  node(id: $id) {
+    ... on Issue { comments(first: %d, after: $after) { ...commentPage } }
+    ... on PullRequest { comments(first: %d, after: $after) { ...commentPage } }
+  }
+}
+""" % (GRAPHQL_RATE_LIMIT, COMMENTS_PER_PAGE, COMMENTS_PER_PAGE) + GRAPHQL_COMMENT_PAGE
+
+# POST a GraphQL query through the scheduler's 'graphql' budget, reserving `cost` points
+# and syncing the budget with the query's rateLimit field.
+# Returns the response data, raises RequestFailedError if there is none. With a partial
+# response (data and errors, e.g. NOT_FOUND for some ids) the errors are logged and the
+# data is returned, the fields that failed being null.
+def gitHubGraphQL(query, variables, cost=1, graphql_url=GITHUB_GRAPHQL_URL):
+    headers = {}
+    headers['Authorization'] = f"bearer {ACCESS_TOKEN}"
+    res = getScheduler().post(graphql_url, resource='graphql', cost=cost, headers=headers,
+                              json={'query': query, 'variables': variables})
+    body = res.json()
+    if body.get('data') is None:
+        raise RequestFailedError(f"{graphql_url}: {body.get('errors')}")
+    if body.get('errors'):
+        logger.warning(f"GraphQL API partial errors: {body['errors']}")
+
+    rate_limit = body['data'].get('rateLimit')
+    if rate_limit is not None:
+        reset = datetime.datetime.strptime(rate_limit['resetAt'], '%Y-%m-%dT%H:%M:%SZ')
+        getScheduler().bucket('graphql').sync(rate_limit['remaining'], rate_limit['limit'],
+                                              reset.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+    return body['data']
+
+# Split the GraphQL comments of an issue into comment lines like processCommentPage,
+# with the comment author's type as the REST user type (so the Bot filter applies).
+# Comments not updated since the `since` parameter of the issue's comments URL (see
+# utils/state.py) are skipped, GraphQL comment connections can't be filtered by date.
+def processGraphQLComments(issue, comment_nodes):
+    since = dict(parse_qsl(urlsplit(issue['comments_url']).query)).get('since')
+    comments = []
+    for node in comment_nodes:
+        if since is not None and node['updatedAt'] < since:
+            continue
+        author = node['author'] or {'login': 'ghost', '__typename': 'User'}
+        comments.append({
+            "body": node['body'],
+            "html_url": node['url'],
+            "issue_url": issue['issueURL_API'],
+            "user": {"login": author['login'], "type": author['__typename']}
+        })
+
+    return processCommentPage(issue, comments)
+
+# Comment lines of an issue from its first page of comments, fetching the next pages by cursor.
+# Raises RequestFailedError if a page fails.
+def gitHubGraphQLIssueComments(issue, comments, graphql_url=GITHUB_GRAPHQL_URL):
+    lines = processGraphQLComments(issue, comments['nodes'])
+    while comments['pageInfo']['hasNextPage']:
+        page = gitHubGraphQL(GRAPHQL_COMMENTS_QUERY,
+                             {'id': issue['node_id'], 'after': comments['pageInfo']['endCursor']},
+                             graphql_url=graphql_url)
+        if page['node'] is None:
+            raise RequestFailedError(f"GraphQL node {issue['node_id']} of issue {issue['issueID']} not found")
+        comments = page['node']['comments']
+        lines += processGraphQLComments(issue, comments['nodes'])
+
+    return lines
+
+# Comment lines of a chunk of issues, fetching the first page of comments of all of them
+# with one GraphQL request, and the next pages of issues with more comments by cursor.
+# The lines of an issue are None if its node is null in the response (a partial error,
+# i.e. the issue was deleted or made private) or if one of its next pages failed.
+# Raises RequestFailedError if the request of the chunk fails.
+def gitHubGraphQLIssuesComments(issues, graphql_url=GITHUB_GRAPHQL_URL):
+    data = gitHubGraphQL(GRAPHQL_ISSUES_QUERY, {'ids': [issue['node_id'] for issue in issues]},
+                         graphql_url=graphql_url)
+    results = []
+    for issue, node in zip(issues, data['nodes']):
+        try:
+            if node is None:
+                raise RequestFailedError(f"GraphQL node {issue['node_id']} of issue {issue['issueID']} not found")
+            results.append(gitHubGraphQLIssueComments(issue, node['comments'], graphql_url))
+        except RequestFailedError as e:
+            logger.error("GraphQL API Error, skipping issue: " + str(e))
+            results.append(None)
+
+    return results
+
+# Same as gitHubCommentStream, fetching the comments with GitHub's GraphQL API:
+# up to GRAPHQL_ISSUES_PER_REQUEST issues per request instead of one request per issue,
+# budgeted by cost in points. Issues need the 'node_id' and 'issueURL_API' of issueForComments.
+# If fetching a chunk of issues fails, its issues are skipped and marked 'fetchFailed',
+# as are the issues of a partial response whose comments are missing.
+def gitHubGraphQLCommentStream(issues, concurrency=DEFAULT_CONCURRENCY, journal=None,
+                               graphql_url=GITHUB_GRAPHQL_URL):
+    getSession(concurrency)
+
+    def fetch(chunk):
+        lines = {}
+        missing = []
+        for issue in chunk:
+            journaled = journal.issueLines(issue['issueID']) if journal is not None else None
+            if journaled is not None:
+                lines[issue['issueID']] = journaled
+            elif issue.get('comments') == 0:
+                lines[issue['issueID']] = []
+            else:
+                missing.append(issue)
+
+        if missing:
+            try:
+                with getMetrics().stage('fetch', len(missing)):
+                    fetched = gitHubGraphQLIssuesComments(missing, graphql_url)
+            except RequestFailedError as e:
+                logger.error("GraphQL API Error, skipping issues: " + str(e))
+                for issue in missing:
+                    issue['fetchFailed'] = True
+                fetched = [[] for issue in missing]
+            for issue, issue_lines in zip(missing, fetched):
+                if issue_lines is None:
+                    issue['fetchFailed'] = True
+                    issue_lines = []
+                lines[issue['issueID']] = issue_lines
+                if journal is not None and not issue.get('fetchFailed'):
+                    journal.recordIssue(issue['issueID'], issue_lines)
+
+        return [(issue, lines[issue['issueID']]) for issue in chunk]
+
+    def chunks():
+        chunk = []
+        for issue in issues:
+            chunk.append(issue)
+            if len(chunk) == GRAPHQL_ISSUES_PER_REQUEST:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        in_flight = deque()
+        for chunk in chunks():
+            in_flight.append(executor.submit(fetch, chunk))
+            if len(in_flight) >= max(1, concurrency):
+                yield from in_flight.popleft().result()
+
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+# APIs the comments can be fetched with.
+COMMENT_APIS = ['rest', 'graphql']
+
+# The comment stream function (issues, concurrency, journal) of one of COMMENT_APIS.
+def commentStream(api='rest', graphql_url=GITHUB_GRAPHQL_URL):
+    if api == 'graphql':
+        return lambda issues, concurrency=DEFAULT_CONCURRENCY, journal=None: \
+            gitHubGraphQLCommentStream(issues, concurrency, journal, graphql_url)
+    return gitHubCommentStream
+
+# Prints the current rate limit status. If the number of planned core/search requests
+# for the rest of a run are given, also prints when they are projected to complete.
+# Returns the rate limit status data.
+def printGitHubRateLimitStatus(core_requests=0, search_requests=0):
     headers = {}
     if validateAccessToken(ACCESS_TOKEN):
         headers['Authorization'] = f"token {ACCESS_TOKEN}"
 
-    res = requests.get("https://api.github.com/rate_limit", headers=headers).json()
+    res = getSession().get("https://api.github.com/rate_limit", headers=headers).json()
     total = res['rate']['limit']
     remaining = res['rate']['remaining']
     reset = res['rate']['reset']
@@ -104,4 +502,13 @@ def printGitHubRateLimitStatus():
     print('\nGitHub API Query Limit')
     print(f'Total: {total}')
     print(f'Remaining: {remaining}')
-    print(f'Limit Resets On: {time.ctime(reset)}\n')
\ No newline at end of file
+    print(f'Limit Resets On: {time.ctime(reset)}\n')
+
+    for resource, planned in [('core', core_requests), ('search', search_requests)]:
+        if planned:
+            status = res['resources'][resource]
+            completion = projectCompletion(planned, status['limit'], status['remaining'],
+                                           status['reset'], RATE_LIMITS[resource][1])
+            print(f'Projected completion of {planned} {resource} requests: {time.ctime(completion)}')
+
+    return res
\ No newline at end of file
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+'''
+Featurize processed comment lines with a hash table of the model's vocabulary, in NumPy.
+
+CountVectorizer.transform() (and the compact export's sorted vocabulary search, see
+utils/compactModel.py) looks each token up by its string. A HashingFeaturizer instead
+looks all the tokens of a chunk of lines up at once, by hash: the vocabulary terms'
+hashes are put in an open addressing table (slots keyed by the high bits of the hash,
+Fibonacci hashing, with linear probing) and the tokens' hashes are probed in it with
+array operations, one probe of every pending token per step.
+
+Tokens are hashed with Python's str hash, computed in C. It is salted per process
+(PYTHONHASHSEED), so the table is built by the process featurizing the lines, on load.
+Hashes are only used to find a term: a token is only counted as a vocabulary term if
+it equals the term found, so the token counts are exactly the vectorizer's whatever
+the hash collisions. Terms with equal hashes are rejected when the table is built
+(raises ValueError).
+
+`python -m benchmarks.featurizer_benchmark` compares it to the CountVectorizer and the
+compact vectorizer.
+'''
+import operator
+import re
+
+from utils.compactModel import checkVectorizer, countTokens
+from utils.lazy import lazyImport
+
+# Multiplier of the Fibonacci hashing of table slots (2^64 / golden ratio).
+FIBONACCI_MULTIPLIER = 0x9E3779B97F4A7C15
+
+# Hashes of a list of strings, as unsigned 64 bit integers.
+def hashTokens(tokens):
+    np = lazyImport('numpy')
+    return np.fromiter(map(hash, tokens), dtype=np.int64, count=len(tokens)).view(np.uint64)
+
+# Token counts of lines, with the vocabulary, token pattern and lowercasing of a CountVectorizer.
+# `terms` are the vocabulary terms by feature index.
+class HashingFeaturizer:
+    def __init__(self, terms, token_pattern, lowercase=True):
+        np = lazyImport('numpy')
+        self.terms = [str(term) for term in terms]
+        self.token_pattern = re.compile(token_pattern)
+        self.lowercase = lowercase
+
+        # At most a quarter full, so that probe sequences stay short.
+        self.bits = max((4 * len(self.terms) - 1).bit_length(), 1)
+        self.mask = (1 << self.bits) - 1
+        hashes = hashTokens(self.terms)
+        table_hashes = [0] * (1 << self.bits)
+        table_features = [-1] * (1 << self.bits)
+        # Longest probe sequence of a term, a token not found within as many slots isn't a term.
+        self.max_probes = 1
+        for feature, (h, slot) in enumerate(zip(hashes.tolist(), self.slots(hashes).tolist())):
+            probes = 1
+            while table_features[slot] != -1:
+                if table_hashes[slot] == h:
+                    raise ValueError(f"vocabulary terms {self.terms[table_features[slot]]!r} and "
+                                     f"{self.terms[feature]!r} have the same hash")
+                slot = (slot + 1) & self.mask
+                probes += 1
+            table_hashes[slot] = h
+            table_features[slot] = feature
+            self.max_probes = max(self.max_probes, probes)
+
+        self.table_hashes = np.array(table_hashes, dtype=np.uint64)
+        self.table_features = np.array(table_features, dtype=np.int64)
+
+    # Table slot of each hash, from its high bits.
+    def slots(self, hashes):
+        np = lazyImport('numpy')
+        return ((hashes * np.uint64(FIBONACCI_MULTIPLIER)) >> np.uint64(64 - self.bits)).astype(np.int64)
+
+    # Feature index of each token (list of str), -1 for the tokens that aren't vocabulary terms.
+    def lookup(self, tokens):
+        np = lazyImport('numpy')
+        hashes = hashTokens(tokens)
+        features = np.full(len(tokens), -1, dtype=np.int64)
+        pending = np.arange(len(tokens))
+        slots = self.slots(hashes)
+        for _ in range(self.max_probes):
+            table_features = self.table_features[slots]
+            found = (self.table_hashes[slots] == hashes[pending]) & (table_features != -1)
+            features[pending[found]] = table_features[found]
+            # Probe the next slot unless the token was found or reached an empty slot.
+            probing = ~found & (table_features != -1)
+            pending = pending[probing]
+            slots = (slots[probing] + 1) & self.mask
+            if not len(pending):
+                break
+
+        # Tokens whose hash equals a term's but not their string.
+        found = np.flatnonzero(features != -1)
+        equal = np.fromiter(map(operator.eq, map(self.terms.__getitem__, features[found].tolist()),
+                                map(tokens.__getitem__, found.tolist())), dtype=bool, count=len(found))
+        features[found[~equal]] = -1
+        return features
+
+    def transform(self, lines):
+        np = lazyImport('numpy')
+        tokens = []
+        lengths = []
+        for line in lines:
+            line_tokens = self.token_pattern.findall(line.lower() if self.lowercase else line)
+            tokens += line_tokens
+            lengths.append(len(line_tokens))
+
+        rows = np.repeat(np.arange(len(lines), dtype=np.int64), lengths)
+        features = self.lookup(tokens)
+        known = features != -1
+        return countTokens(rows[known], features[known], len(lines), len(self.terms))
+
+# HashingFeaturizer of a CountVectorizer or of a compact export's vectorizer (see utils/compactModel.py).
+# Raises ValueError if the vectorizer isn't supported or its vocabulary can't be hashed without collisions.
+def hashingFeaturizer(vectorizer):
+    if hasattr(vectorizer, 'vocabulary_'):
+        checkVectorizer(vectorizer)
+        terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        return HashingFeaturizer(terms, vectorizer.token_pattern, vectorizer.lowercase)
+
+    return HashingFeaturizer(vectorizer.vocabulary.tolist(), vectorizer.token_pattern.pattern, vectorizer.lowercase)
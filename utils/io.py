@@ -2,11 +2,15 @@
 Contains utility functions related to input/output
 Everything from printing to logging to writing results to file.
 '''
+import csv
 import json
-import pandas as pd
 import datetime
+import gzip
+import os
 from os import system, name
 
+from utils.lazy import lazyImport
+
 # Screen Clear
 def clear():
 
@@ -27,9 +31,146 @@ def printJSON(j):
 def printGHIssue(i):
     print('%d - %s - %s' % (i['id'], i['html_url'], i['title']))
 
-def writeResultToCSV(result, filename):
+# Timestamped path of a new results file.
+# Runs within the same second get a numbered suffix instead of overwriting each other.
+def resultFilePath(filename, extension='csv', directory='./results/'):
     timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-    outfile = './results/' + filename + '_' + timestamp + '.csv'
+    path = directory + filename + '_' + timestamp + '.' + extension
+    suffix = 1
+    while os.path.exists(path):
+        path = directory + filename + '_' + timestamp + '_' + str(suffix) + '.' + extension
+        suffix += 1
+
+    return path
+
+def writeResultToCSV(result, filename):
+    outfile = resultFilePath(filename)
     print('writeResultToCSV: ' + outfile)
+    pd = lazyImport('pandas')
     df = pd.DataFrame(result)
-    df.to_csv(outfile, index=False)
\ No newline at end of file
+    df.to_csv(outfile, index=False)
+
+# Formats results files can be written in, see newResultWriter.
+RESULT_FORMATS = ['csv', 'csv.gz', 'parquet', 'jsonl']
+# Formats whose results files can be merged by utils/state.py's mergeResults (--incremental).
+MERGEABLE_FORMATS = ['csv', 'csv.gz']
+# Number of rows buffered before they are written to the results file (a row group in parquet).
+DEFAULT_WRITE_CHUNK_SIZE = 1000
+# Columns repeating the same few values on many rows, dictionary encoded in parquet files.
+DICTIONARY_COLUMNS = ['issueURL_API', 'issueURL_HTML', 'issueURL', 'commentURL', 'category']
+
+# Open a CSV/JSONL results file in text mode, gzip compressed if its name ends with .gz.
+def openResultFile(path, mode='r'):
+    if path.endswith('.gz'):
+        # Level 6 compresses URL heavy results nearly as well as the default 9, much faster.
+        return gzip.open(path, mode + 't', compresslevel=6, newline='')
+    return open(path, mode, newline='')
+
+# Incrementally writes result rows to a results file as they are produced, in chunks of
+# chunk_size rows, without holding all the rows in memory.
+# The file is created on the first chunk written, its columns are taken from the first row.
+# Subclasses define the file extension and how the file is opened and a chunk written.
+class ResultWriter:
+    # Only takes the lines whose category is not filtered out of the results.
+    keeps_filtered_categories = False
+    extension = None
+
+    def __init__(self, filename, directory='./results/', chunk_size=DEFAULT_WRITE_CHUNK_SIZE):
+        self.filename = filename
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.outfile = None
+        self.file = None
+        self.pending = []
+        self.rows = 0
+
+    def writeRows(self, rows):
+        for row in rows:
+            self.pending.append(row)
+            self.rows += 1
+            if len(self.pending) >= self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        if self.file is None:
+            self.outfile = resultFilePath(self.filename, self.extension, self.directory)
+            print(type(self).__name__ + ': ' + self.outfile)
+            self.open(self.pending[0])
+        self.writeChunk(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# CSV results, in the same format as writeResultToCSV.
+class CSVResultWriter(ResultWriter):
+    extension = 'csv'
+
+    def open(self, row):
+        self.file = openResultFile(self.outfile, 'w')
+        self.writer = csv.DictWriter(self.file, fieldnames=list(row.keys()), lineterminator='\n')
+        self.writer.writeheader()
+
+    def writeChunk(self, rows):
+        self.writer.writerows(rows)
+
+# Gzip compressed CSV results, the repeated URLs of a comment's lines compress very well.
+class CSVGzipResultWriter(CSVResultWriter):
+    extension = 'csv.gz'
+
+# One JSON object per line.
+class JSONLResultWriter(ResultWriter):
+    extension = 'jsonl'
+
+    def open(self, row):
+        self.file = openResultFile(self.outfile, 'w')
+
+    def writeChunk(self, rows):
+        self.file.writelines(json.dumps(row) + '\n' for row in rows)
+
+# Parquet results (requires pyarrow), one row group per chunk.
+# The URL and category columns are dictionary encoded: each distinct value is stored once
+# per row group and the rows only hold its index.
+class ParquetResultWriter(ResultWriter):
+    extension = 'parquet'
+
+    def open(self, row):
+        pa = lazyImport('pyarrow')
+        pq = lazyImport('pyarrow.parquet')
+        # The column types are inferred from the first chunk, columns without any value yet are strings.
+        schema = pa.Table.from_pylist(self.pending).schema
+        self.schema = pa.schema([pa.field(f.name, pa.string() if pa.types.is_null(f.type) else f.type)
+                                 for f in schema])
+        dictionary_schema = pa.schema([pa.field(f.name, pa.dictionary(pa.int32(), f.type))
+                                       if f.name in DICTIONARY_COLUMNS else f for f in self.schema])
+        self.file = pq.ParquetWriter(self.outfile, dictionary_schema, compression='snappy')
+
+    def writeChunk(self, rows):
+        pa = lazyImport('pyarrow')
+        table = pa.Table.from_pylist(rows, schema=self.schema)
+        for i, name in enumerate(table.column_names):
+            if name in DICTIONARY_COLUMNS:
+                table = table.set_column(i, name, table.column(i).dictionary_encode())
+        self.file.write_table(table)
+
+RESULT_WRITERS = {
+    'csv': CSVResultWriter,
+    'csv.gz': CSVGzipResultWriter,
+    'parquet': ParquetResultWriter,
+    'jsonl': JSONLResultWriter
+}
+
+# New writer of results in one of RESULT_FORMATS.
+def newResultWriter(filename, directory='./results/', result_format='csv', chunk_size=DEFAULT_WRITE_CHUNK_SIZE):
+    return RESULT_WRITERS[result_format](filename, directory, chunk_size)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+'''
+Lazy loading of heavy dependencies (spaCy, NLTK corpora, pandas, joblib models, ...).
+
+Heavy modules and models are only imported/loaded the first time they are used, so
+short invocations (-h, argument errors, rate limit checks) don't pay for them.
+Every lazy load is timed for the --profile-startup report.
+'''
+import importlib
+import sys
+import time
+
+# Time this module was first imported, as close to process start as the script gets.
+START_TIME = time.perf_counter()
+
+# Name of each lazily loaded module/resource -> seconds it took to load, in load order.
+LOAD_TIMES = {}
+
+# Run `loader` once, timing it under `name`.
+def timedLoad(name, loader):
+    start = time.perf_counter()
+    result = loader()
+    LOAD_TIMES[name] = time.perf_counter() - start
+    return result
+
+# Import a module on first use, timing the import.
+def lazyImport(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    return timedLoad(name, lambda: importlib.import_module(name))
+
+def printStartupProfile(startup_time):
+    print('\nStartup Profile')
+    print(f'Startup (imports and argument parsing): {startup_time * 1000:.1f} ms')
+    for name, seconds in LOAD_TIMES.items():
+        print(f'Lazy load {name}: {seconds * 1000:.1f} ms')
+    print(f'Total: {(time.perf_counter() - START_TIME) * 1000:.1f} ms\n')
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+'''
+Multi-query matcher for search results, see utils/filterResults.py.
+
+A QueryMatcher compiles a set of queries into the set of their terms, and finds which
+queries an issue's title/body match by scanning each of them once for every term:
+    - a query is a term, or terms combined with AND/OR (`tf.data AND cache OR prefetch`,
+      AND binds tighter than OR, the operators must be upper case and surrounded by spaces),
+      empty terms are ignored
+    - with `ignore_case`, terms and text are case folded
+    - with `word_boundaries`, a term only matches where it isn't part of a longer word
+      (its first/last character, if a word character, isn't preceded/followed by another)
+
+Few terms are each found with str.find, which scans text in C. Past DIRECT_SCAN_MAX_TERMS
+terms, the terms are compiled into one Aho-Corasick automaton instead, finding every
+term in a single pass whatever the number of queries
+(`python -m benchmarks.matcher_benchmark` compares both).
+'''
+from collections import deque
+
+# Number of terms past which scanning text once with the automaton is faster than
+# scanning it once per term (measured on search_sample.json).
+DIRECT_SCAN_MAX_TERMS = 200
+
+OR = ' OR '
+AND = ' AND '
+
+# Parse a query into its OR clauses, each a list of terms that must all match.
+# Empty terms (e.g. around a trailing `OR `) are dropped, raises ValueError if no term is left.
+def parseQuery(query):
+    clauses = [[term.strip() for term in clause.split(AND) if term.strip()] for clause in query.split(OR)]
+    clauses = [clause for clause in clauses if clause]
+    if not clauses:
+        raise ValueError(f"query {query!r} has no search term")
+    return clauses
+
+def isWordChar(c):
+    return c.isalnum() or c == '_'
+
+# Aho-Corasick automaton of a list of terms.
+# States are numbered from the root (0), `transitions[s]` maps a character to the next
+# state when it isn't the root's transition for that character (failure links already
+# followed), and `outputs[s]` holds the terms ending at state s.
+class TermAutomaton:
+    def __init__(self, terms):
+        goto = [{}]
+        outputs = [set()]
+        for t, term in enumerate(terms):
+            state = 0
+            for c in term:
+                if c not in goto[state]:
+                    goto.append({})
+                    outputs.append(set())
+                    goto[state][c] = len(goto) - 1
+                state = goto[state][c]
+            outputs[state].add(t)
+
+        # Breadth first, so the failure state of each state is complete before its children's.
+        fail = [0] * len(goto)
+        self.transitions = [None] * len(goto)
+        self.transitions[0] = {}
+        root = goto[0]
+        states = deque(root.values())
+        while states:
+            state = states.popleft()
+            # Transitions of the failure state, other than the root's, then the state's own.
+            self.transitions[state] = {**self.transitions[fail[state]], **goto[state]}
+            for c, child in goto[state].items():
+                fail[child] = self.transitions[fail[state]].get(c) or root.get(c, 0)
+                outputs[child] |= outputs[fail[child]]
+                states.append(child)
+            self.transitions[state] = {c: s for c, s in self.transitions[state].items() if root.get(c) != s}
+
+        self.root = root
+        # Bound transition lookups, saving an attribute lookup per character scanned.
+        self.gets = [t.get for t in self.transitions]
+        self.outputs = [frozenset(o) for o in outputs]
+
+    # Indexes of the terms found in text.
+    def find(self, text):
+        gets = self.gets
+        root_get = self.root.get
+        outputs = self.outputs
+        # States with outputs the scan went through, their outputs are only merged once.
+        matched = set()
+        state = 0
+        for c in text:
+            state = gets[state](c) or root_get(c, 0)
+            if outputs[state]:
+                matched.add(state)
+
+        return set().union(*(outputs[state] for state in matched))
+
+    # (index, end position) of each occurrence of the terms in text.
+    def occurrences(self, text):
+        gets = self.gets
+        root_get = self.root.get
+        outputs = self.outputs
+        state = 0
+        for i, c in enumerate(text):
+            state = gets[state](c) or root_get(c, 0)
+            for t in outputs[state]:
+                yield t, i + 1
+
+# Finds which of a list of queries the title/body of issues match.
+class QueryMatcher:
+    def __init__(self, queries, ignore_case=False, word_boundaries=False):
+        self.queries = list(queries)
+        self.ignore_case = ignore_case
+        self.word_boundaries = word_boundaries
+
+        terms = {}
+        # Queries of a single term, by term, and the OR clauses of the others, by query.
+        self.term_queries = {}
+        self.clauses = {}
+        for q, query in enumerate(self.queries):
+            clauses = [frozenset(terms.setdefault(self.fold(term), len(terms)) for term in clause)
+                       for clause in parseQuery(query)]
+            if len(clauses) == 1 and len(clauses[0]) == 1:
+                self.term_queries.setdefault(next(iter(clauses[0])), []).append(q)
+            else:
+                self.clauses[q] = clauses
+        self.terms = list(terms)
+        self.automaton = TermAutomaton(self.terms) if len(self.terms) > DIRECT_SCAN_MAX_TERMS else None
+
+    def fold(self, text):
+        return text.casefold() if self.ignore_case else text
+
+    # Whether the occurrence of a term ending at `end` of text is a whole word.
+    def isWord(self, text, t, end):
+        term = self.terms[t]
+        start = end - len(term)
+        if isWordChar(term[0]) and start > 0 and isWordChar(text[start - 1]):
+            return False
+        return not (isWordChar(term[-1]) and end < len(text) and isWordChar(text[end]))
+
+    # Indexes of the terms found in text.
+    def findTerms(self, text):
+        text = self.fold(text)
+        if self.automaton is not None:
+            if not self.word_boundaries:
+                return self.automaton.find(text)
+            return {t for t, end in self.automaton.occurrences(text) if self.isWord(text, t, end)}
+
+        if not self.word_boundaries:
+            return {t for t, term in enumerate(self.terms) if term in text}
+
+        found = set()
+        for t, term in enumerate(self.terms):
+            start = text.find(term)
+            while start != -1:
+                if self.isWord(text, t, start + len(term)):
+                    found.add(t)
+                    break
+                start = text.find(term, start + 1)
+
+        return found
+
+    # The queries matched by the title or body of an issue, in the order of the matcher's queries.
+    def matchingQueries(self, r):
+        found = self.findTerms(r['title'] or "") | self.findTerms(r['body'] or "")
+        matched = {q for t in found for q in self.term_queries.get(t, ())}
+        matched.update(q for q, clauses in self.clauses.items() if any(clause <= found for clause in clauses))
+        return [self.queries[q] for q in sorted(matched)]
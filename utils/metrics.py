@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+'''
+Run instrumentation: per-stage timings, request latencies and the run report.
+
+Every stage of a run records into the GLOBAL RunMetrics (see getMetrics):
+    - search, fetch: time spent requesting search pages and comments
+    - preprocess: time spent cleaning/tokenizing comment lines (in the worker processes
+      when there are several workers)
+    - vectorize, predict: time spent vectorizing and predicting the distinct lines
+    - write: time spent writing results
+Stages overlap (see utils/pipeline.py) and threads of a stage run concurrently, so a
+stage's seconds are the time spent in it summed over threads, not a share of the run.
+
+Each HTTP request made by the request scheduler is recorded with its latency, status
+and size, per rate limit resource, into a latency histogram.
+
+The report (see RunMetrics.report) is written as JSON, or in Prometheus text format
+with prometheus_client (see writePrometheus).
+'''
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from utils.lazy import lazyImport
+
+# Upper bounds (seconds) of the request latency histogram buckets, Prometheus' defaults.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# Peak resident memory (bytes) of this process and of its largest child (the worker processes).
+# None where it isn't available (the resource module is POSIX only).
+def peakMemory():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS.
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'process': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    }
+
+# Request count, errors, bytes and latency histogram of a rate limit resource.
+class RequestMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, seconds, size, status):
+        self.requests += 1
+        self.bytes += size
+        self.seconds += seconds
+        if status is None or status >= 400:
+            self.errors += 1
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    # Upper bound of the bucket holding the p-th percentile latency.
+    def percentile(self, p):
+        rank = p / 100 * self.requests
+        count = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, self.buckets):
+            count += bucket
+            if count >= rank and count:
+                return bound
+        return None
+
+    def report(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'seconds': self.seconds,
+            'latency_seconds': {
+                'buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.buckets)},
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99)
+            }
+        }
+
+class RunMetrics:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.requests = {}
+
+    # Add `seconds` and `items` processed to a stage.
+    def recordStage(self, name, seconds, items=0):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'items': 0, 'calls': 0})
+            stage['seconds'] += seconds
+            stage['items'] += items
+            stage['calls'] += 1
+
+    # Time the block as part of a stage. The number of items processed can be set on the
+    # yielded record when only known at the end of the block.
+    @contextmanager
+    def stage(self, name, items=0):
+        record = {'items': items}
+        start = self.clock()
+        try:
+            yield record
+        finally:
+            self.recordStage(name, self.clock() - start, record['items'])
+
+    # Record an HTTP request (status None if it failed without a response).
+    def recordRequest(self, resource, seconds, size, status):
+        with self.lock:
+            self.requests.setdefault(resource, RequestMetrics()).record(seconds, size, status)
+
+    # Report of the run so far, with the run's `summary` (see utils/pipeline.py) if given.
+    def report(self, summary=None):
+        with self.lock:
+            duration = self.clock() - self.started
+            report = {
+                'duration_seconds': duration,
+                'stages': {name: {**stage, 'items_per_second': stage['items'] / stage['seconds']
+                                  if stage['seconds'] else 0}
+                           for name, stage in self.stages.items()},
+                'requests': {resource: requests.report() for resource, requests in self.requests.items()},
+                'bytes_downloaded': sum(requests.bytes for requests in self.requests.values()),
+                'peak_memory_bytes': peakMemory()
+            }
+
+        if summary is not None:
+            report['summary'] = {key: value for key, value in summary.items() if key != 'queries'}
+            report['lines_per_second'] = summary.get('lines', 0) / duration if duration else 0
+
+        return report
+
+    def writeReport(self, path, summary=None):
+        with open(path, 'w') as f:
+            json.dump(self.report(summary), f, indent=2)
+
+    # Write the report in Prometheus text format (requires prometheus_client), e.g. for
+    # node_exporter's textfile collector.
+    def writePrometheus(self, path, summary=None):
+        client = lazyImport('prometheus_client')
+        core = lazyImport('prometheus_client.core')
+        report = self.report(summary)
+
+        class ReportCollector:
+            def collect(self):
+                yield core.GaugeMetricFamily('issue_miner_run_duration_seconds', 'Duration of the run',
+                                            value=report['duration_seconds'])
+
+                stage_seconds = core.CounterMetricFamily('issue_miner_stage_seconds', 'Time spent in each stage',
+                                                         labels=['stage'])
+                stage_items = core.CounterMetricFamily('issue_miner_stage_items', 'Items processed by each stage',
+                                                       labels=['stage'])
+                for name, stage in report['stages'].items():
+                    stage_seconds.add_metric([name], stage['seconds'])
+                    stage_items.add_metric([name], stage['items'])
+                yield stage_seconds
+                yield stage_items
+
+                latency = core.HistogramMetricFamily('issue_miner_request_latency_seconds',
+                                                     'GitHub API request latency', labels=['resource'])
+                downloaded = core.CounterMetricFamily('issue_miner_request_bytes', 'Bytes downloaded',
+                                                      labels=['resource'])
+                errors = core.CounterMetricFamily('issue_miner_request_errors', 'Failed requests',
+                                                  labels=['resource'])
+                for resource, requests in report['requests'].items():
+                    cumulative = 0
+                    buckets = []
+                    for bound, count in requests['latency_seconds']['buckets'].items():
+                        cumulative += count
+                        buckets.append(('+Inf' if bound == 'inf' else bound, cumulative))
+                    latency.add_metric([resource], buckets, requests['seconds'])
+                    downloaded.add_metric([resource], requests['bytes'])
+                    errors.add_metric([resource], requests['errors'])
+                yield latency
+                yield downloaded
+                yield errors
+
+                if report['peak_memory_bytes'] is not None:
+                    memory = core.GaugeMetricFamily('issue_miner_peak_memory_bytes', 'Peak resident memory',
+                                                    labels=['process'])
+                    for process, size in report['peak_memory_bytes'].items():
+                        memory.add_metric([process], size)
+                    yield memory
+
+                for key, value in report.get('summary', {}).items():
+                    if isinstance(value, (int, float)):
+                        yield core.GaugeMetricFamily(f'issue_miner_{key}', f'Run summary {key}', value=value)
+
+        registry = client.CollectorRegistry()
+        registry.register(ReportCollector())
+        client.write_to_textfile(path, registry)
+
+# GLOBAL run metrics, recorded into by every stage of the run.
+METRICS = RunMetrics()
+def getMetrics():
+    return METRICS
+
+# Start recording a new run's metrics.
+def resetMetrics():
+    global METRICS
+    METRICS = RunMetrics()
+    return METRICS
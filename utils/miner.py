@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+'''
+Library API of the issue miner, for mining many queries in one process.
+
+A Classifier holds the loaded model and count vectorizer (and their predictions cache),
+a Miner runs queries through the mining pipeline (see utils/pipeline.py) reusing the
+classifier, the HTTP session, rate limit scheduler and response cache of utils/githubAPI.py
+and its preprocessing worker processes across queries:
+
+    from utils.miner import Miner
+
+    with Miner(workers=4) as miner:
+        for query in queries:
+            summary = miner.mine(query, max_results=500, filtered_categories=['Social Conversation'])
+
+The stages are also callable on their own: miner.search(), miner.fetchComments(),
+miner.preprocess() and miner.classify(), or classifier.classify() for raw lines.
+mine-issues.py is the command line wrapper of a Miner.
+'''
+import logging
+
+from utils.cache import DEFAULT_CACHE_DIR, DEFAULT_TTL, DEFAULT_MAX_SIZE
+from utils.classifier import classifyCorpus, modelHash, PredictionCache, DEFAULT_CHUNK_SIZE,\
+    DEFAULT_MODEL_FILE, DEFAULT_VECTORIZER_FILE
+from utils.compactModel import compactModel, DEFAULT_COMPACT_MODEL_DIR
+from utils.commentProcessor import processLines, processCorpusBatches, newProcessPool, DEFAULT_BATCH_SIZE
+from utils.filterResults import issueMatchesQuery
+from utils.hashingFeaturizer import hashingFeaturizer
+from utils.corpus import CommentCorpus
+from utils.githubAPI import gitHubSearchIssues, commentStream, issueForComments, configureScheduler,\
+    configureCache, setAccessToken, DEFAULT_CONCURRENCY, GITHUB_API_SEARCH_ISSUES_URL, GITHUB_GRAPHQL_URL,\
+    SEARCH_RESULT_LIMIT
+from utils.lazy import lazyImport, timedLoad
+from utils.batch import runBatchPipeline
+from utils.pipeline import runPipeline
+from utils.scheduler import DEFAULT_MAX_RETRIES
+from utils.sharding import gitHubShardedSearchIssues
+
+logger = logging.getLogger(__name__)
+
+# The loaded model and count vectorizer, classifying processed or raw comment lines.
+# With `compact`, they are loaded from their memory-mapped export in `compact_dir`
+# (see utils/compactModel.py, exported on first use), from the joblib files otherwise
+# or if they can't be exported. With `hashing`, lines are featurized for the compact
+# model by a HashingFeaturizer (see utils/hashingFeaturizer.py).
+# With a `prediction_cache` database path, predictions are persisted and reused across
+# processes (see utils/classifier.py's PredictionCache), otherwise only in memory.
+class Classifier:
+    def __init__(self, model_file=DEFAULT_MODEL_FILE, vectorizer_file=DEFAULT_VECTORIZER_FILE, prediction_cache=None,
+                 compact=True, compact_dir=DEFAULT_COMPACT_MODEL_DIR, hashing=False):
+        model_hash = modelHash(model_file, vectorizer_file)
+        self.model = self.vectorizer = None
+        if compact:
+            try:
+                model, vectorizer = timedLoad('compact model', lambda: compactModel(
+                    model_file, vectorizer_file, compact_dir, model_hash))
+                if hashing:
+                    vectorizer = timedLoad('hashing featurizer', lambda: hashingFeaturizer(vectorizer))
+                self.model, self.vectorizer = model, vectorizer
+            except ValueError as e:
+                logger.warning(f'[COMPACT MODEL] {e}, loading the joblib model')
+
+        if self.model is None:
+            load = lazyImport('joblib').load
+            self.model = timedLoad('model', lambda: load(model_file))
+            self.vectorizer = timedLoad('count vector', lambda: load(vectorizer_file))
+        self.predictions = PredictionCache(model_hash if prediction_cache else None, prediction_cache)
+
+    # Classify the processed lines of a corpus in place, see utils/classifier.py's classifyCorpus.
+    def classifyCorpus(self, corpus, chunk_size=DEFAULT_CHUNK_SIZE, with_scores=False):
+        return classifyCorpus(corpus, self.model, self.vectorizer, chunk_size, with_scores, self.predictions)
+
+    # Categories of raw comment lines, or (category, score) pairs with `with_scores`.
+    def classify(self, lines, with_scores=False):
+        corpus = [{'commentLine': line} for line in processLines(lines)]
+        self.classifyCorpus(corpus, with_scores=with_scores)
+        if with_scores:
+            return [(c['category'], c['categoryScore']) for c in corpus]
+        return [c['category'] for c in corpus]
+
+    def close(self):
+        self.predictions.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Mines queries with a shared Classifier (loaded on creation if not given), HTTP session,
+# response cache and preprocessing process pool.
+# The process pool is started on creation, before any pipeline thread (see newProcessPool).
+# Results are written to `results_dir` in `result_format`, or to a ResultStore (see utils/store.py).
+# Comments are fetched with GitHub's REST or, with `api` 'graphql', GraphQL API.
+# Search results are matched with their query case insensitively with `ignore_case`, and
+# on word boundaries only with `word_boundaries` (see utils/matcher.py).
+class Miner:
+    def __init__(self, classifier=None, concurrency=DEFAULT_CONCURRENCY, workers=1, batch_size=DEFAULT_BATCH_SIZE,
+                 chunk_size=DEFAULT_CHUNK_SIZE, max_retries=DEFAULT_MAX_RETRIES, access_token=None,
+                 cache=True, cache_dir=DEFAULT_CACHE_DIR, cache_ttl=DEFAULT_TTL, cache_max_size=DEFAULT_MAX_SIZE,
+                 offline=False, results_dir='./results/', result_format='csv', store=None, print_logs=False,
+                 report_rate_limit=True, search_url=GITHUB_API_SEARCH_ISSUES_URL, api='rest',
+                 graphql_url=GITHUB_GRAPHQL_URL, ignore_case=False, word_boundaries=False):
+        self.own_classifier = classifier is None
+        self.classifier = classifier if classifier is not None else Classifier()
+        self.concurrency = concurrency
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.offline = offline
+        self.results_dir = results_dir
+        self.result_format = result_format
+        self.store = store
+        self.print_logs = print_logs
+        # The rate limit status can't be queried offline.
+        self.report_rate_limit = report_rate_limit and not offline
+        self.search_url = search_url
+        self.api = api
+        self.graphql_url = graphql_url
+        self.ignore_case = ignore_case
+        self.word_boundaries = word_boundaries
+
+        if access_token is not None:
+            setAccessToken(access_token)
+        configureScheduler(max_retries=max_retries)
+        self.cache = configureCache(enabled=cache, directory=cache_dir, ttl=cache_ttl, max_size=cache_max_size,
+                                    offline=offline)
+        self.executor = newProcessPool(workers) if workers > 1 else None
+
+    # Run the whole pipeline for a query, returning its summary (see utils/pipeline.py's runPipeline).
+    # Queries of more than SEARCH_RESULT_LIMIT results are sharded by creation date, unless `shard` is given.
+    def mine(self, query, max_results=SEARCH_RESULT_LIMIT, sort_by='comments', out_file_prefix='results_',
+             filtered_categories=(), with_scores=False, shard=None, journal=None, state=None, run_id=None):
+        return runPipeline(query, max_results, sort_by, out_file_prefix,
+                           self.classifier.model, self.classifier.vectorizer,
+                           filtered_categories=filtered_categories,
+                           print_logs=self.print_logs,
+                           concurrency=self.concurrency,
+                           workers=self.workers,
+                           batch_size=self.batch_size,
+                           chunk_size=self.chunk_size,
+                           with_scores=with_scores,
+                           journal=journal,
+                           report_rate_limit=self.report_rate_limit,
+                           shard=shard if shard is not None else max_results > SEARCH_RESULT_LIMIT,
+                           state=state,
+                           store=self.store,
+                           run_id=run_id,
+                           result_format=self.result_format,
+                           prediction_cache=self.classifier.predictions,
+                           executor=self.executor,
+                           search_url=self.search_url,
+                           results_dir=self.results_dir,
+                           api=self.api,
+                           graphql_url=self.graphql_url,
+                           ignore_case=self.ignore_case,
+                           word_boundaries=self.word_boundaries)
+
+    # Mine a list of related queries, fetching and classifying the issues they have in common once,
+    # returning the batch summary (see utils/batch.py's runBatchPipeline).
+    def mineBatch(self, queries, max_results=SEARCH_RESULT_LIMIT, sort_by='comments', out_file_prefix='results_',
+                  filtered_categories=(), with_scores=False, shard=None, journal=None, run_id=None):
+        return runBatchPipeline(queries, max_results, sort_by, out_file_prefix,
+                                self.classifier.model, self.classifier.vectorizer,
+                                filtered_categories=filtered_categories,
+                                concurrency=self.concurrency,
+                                workers=self.workers,
+                                batch_size=self.batch_size,
+                                chunk_size=self.chunk_size,
+                                with_scores=with_scores,
+                                journal=journal,
+                                report_rate_limit=self.report_rate_limit,
+                                shard=shard if shard is not None else max_results > SEARCH_RESULT_LIMIT,
+                                store=self.store,
+                                run_id=run_id,
+                                result_format=self.result_format,
+                                prediction_cache=self.classifier.predictions,
+                                executor=self.executor,
+                                search_url=self.search_url,
+                                results_dir=self.results_dir,
+                                api=self.api,
+                                graphql_url=self.graphql_url,
+                                ignore_case=self.ignore_case,
+                                word_boundaries=self.word_boundaries)
+
+    # Generator of the search results of a query.
+    # With `matching`, only those whose title/body match the query (see utils/filterResults.py).
+    def search(self, query, max_results=SEARCH_RESULT_LIMIT, sort_by='comments', shard=None, matching=False,
+               journal=None):
+        shard = shard if shard is not None else max_results > SEARCH_RESULT_LIMIT
+        search = gitHubShardedSearchIssues if shard else gitHubSearchIssues
+        for r in search(query, max_results, sort_by, journal, self.search_url):
+            if not matching or issueMatchesQuery(r, query, self.ignore_case, self.word_boundaries):
+                yield r
+
+    # Raw comment lines of search result issues, as a CommentCorpus (see utils/corpus.py).
+    def fetchComments(self, issues, journal=None):
+        corpus = CommentCorpus()
+        fetch = commentStream(self.api, self.graphql_url)
+        for issue, lines in fetch([issueForComments(r) for r in issues], self.concurrency, journal):
+            corpus.extend(lines)
+        return corpus
+
+    # Process the raw 'commentLine' of every line of a corpus in place, with the miner's process pool.
+    def preprocess(self, corpus):
+        return next(processCorpusBatches([corpus], self.executor, self.workers, self.batch_size))
+
+    # Classify the processed lines of a corpus in place.
+    def classify(self, corpus, with_scores=False):
+        return self.classifier.classifyCorpus(corpus, self.chunk_size, with_scores)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.own_classifier:
+            self.classifier.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+'''
+Streaming mining pipeline.
+
+Each issue flows through the stages as soon as it is available instead of every
+stage running to completion over the whole result set:
+
+    search -> filter -> fetch comments -> preprocess -> classify -> CSV writer
+
+Stages run in their own threads (and the preprocessing in a process pool) connected
+by bounded queues, so network and CPU work overlap while only a bounded number of
+issues/lines are held in memory at once, regardless of the number of results.
+'''
+import functools
+import os
+import queue
+import threading
+
+from utils.classifier import classifyCorpus, PredictionCache, DEFAULT_CHUNK_SIZE
+from utils.corpus import CommentCorpus
+from utils.commentProcessor import processCorpusBatches, newProcessPool, DEFAULT_BATCH_SIZE
+from utils.filterResults import issueMatchesQuery
+from utils.githubAPI import gitHubSearchIssues, issueForComments, commentStream, printGitHubRateLimitStatus,\
+    withQueryParams, DEFAULT_CONCURRENCY, COMMENTS_PER_PAGE, GITHUB_API_SEARCH_ISSUES_URL, GITHUB_GRAPHQL_URL
+from utils.io import printJSON, resultFilePath, newResultWriter
+from utils.metrics import getMetrics
+from utils.sharding import gitHubShardedSearchIssues
+from utils.state import mergeResults
+
+# Max number of items buffered between two stages.
+DEFAULT_QUEUE_SIZE = 8
+
+# Raised in the consuming stage when the producing stage failed.
+class _StageFailure:
+    def __init__(self, error):
+        self.error = error
+
+_STAGE_DONE = object()
+
+# Run a generator stage in its own thread, yielding its items through a bounded queue.
+# The stage only runs ahead of its consumer by `maxsize` items.
+def bufferedStage(iterable, maxsize=DEFAULT_QUEUE_SIZE):
+    items = queue.Queue(maxsize)
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except BaseException as e:
+            items.put(_StageFailure(e))
+        else:
+            items.put(_STAGE_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    while True:
+        item = items.get()
+        if item is _STAGE_DONE:
+            return
+        if isinstance(item, _StageFailure):
+            raise item.error
+        yield item
+
+# Group the comment lines of a stream of (issue, lines) pairs into CommentCorpus batches
+# (see utils/corpus.py) of about batch_size lines.
+def batchLines(issue_lines, batch_size=DEFAULT_BATCH_SIZE):
+    batch = CommentCorpus()
+    for issue, lines in issue_lines:
+        batch.extend(lines)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = CommentCorpus()
+
+    if batch:
+        yield batch
+
+# Run the whole mining pipeline for a search query, writing the omitted issues and the
+# classified comments to results files in ./results as they are produced, in `result_format`
+# (one of utils/io.py's RESULT_FORMATS).
+# Search results are kept if their title/body match the query (see utils/filterResults.py),
+# optionally case insensitively (`ignore_case`) or on word boundaries only (`word_boundaries`).
+# With `shard`, the query is split by creation date to retrieve more than 1000 results,
+# the number of date ranges that couldn't be searched is reported as 'skipped_shards'.
+# With a QueryState (see utils/state.py), only issues and comments updated since the
+# query's last run are mined, and the new lines are merged into its previous results.
+# With a ResultStore (see utils/store.py), results are written to its database under
+# `run_id` instead of results files.
+# Predictions are shared by all batches through `prediction_cache` (a PredictionCache,
+# see utils/classifier.py, only kept in memory for the run if not given).
+# With `executor`, a process pool of `workers` processes shared by several runs (see
+# newProcessPool), lines are preprocessed by it instead of a pool started for this run.
+# With `api` 'graphql', comments are fetched in bulk with GitHub's GraphQL API (at
+# `graphql_url`) instead of one REST request per page of comments of each issue.
+# Returns a summary dict of the number of results, matched/omitted issues and lines,
+# and of the lines actually predicted by the model ('predicted') once deduplicated.
+def runPipeline(query, max_results, sort_by, out_file_prefix, model, vectorizer,
+                filtered_categories=(), print_logs=False, concurrency=DEFAULT_CONCURRENCY,
+                workers=1, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+                with_scores=False, journal=None, report_rate_limit=False, shard=False, state=None,
+                store=None, run_id=None, result_format='csv', prediction_cache=None, executor=None,
+                search_url=GITHUB_API_SEARCH_ISSUES_URL, results_dir='./results/',
+                queue_size=DEFAULT_QUEUE_SIZE, api='rest', graphql_url=GITHUB_GRAPHQL_URL,
+                ignore_case=False, word_boundaries=False):
+    summary = {'results': 0, 'matched': 0, 'omitted': 0, 'unchanged': 0, 'lines': 0, 'written': 0, 'predicted': 0}
+    cache = prediction_cache if prediction_cache is not None else PredictionCache()
+    predicted = cache.predicted
+    # Sharded searches whose count failed, see utils/sharding.py.
+    skipped_shards = []
+    # Issues whose comments couldn't be fetched.
+    failed_issues = []
+
+    # Started before any stage thread so the worker processes are forked single threaded.
+    own_executor = executor is None and workers > 1
+    if own_executor:
+        executor = newProcessPool(workers)
+    if store is not None:
+        store.startRun(run_id, query)
+        omitted_writer = store.omittedWriter(run_id)
+        comments_writer = store.commentWriter(run_id)
+    else:
+        # Rows are written in chunks of about one batch of comment lines.
+        omitted_writer = newResultWriter(out_file_prefix + '_OMITTED_ISSUES', results_dir, result_format, batch_size)
+        comments_writer = newResultWriter(out_file_prefix + '_CLASSIFIED_COMMENTS', results_dir, result_format,
+                                          batch_size)
+
+    # Omit any search results whose body/title does not contain our search query,
+    # and keep only what is needed to fetch the comments of the matched ones.
+    def matchedIssues():
+        planned_requests = 0
+        search = functools.partial(gitHubShardedSearchIssues, skipped=skipped_shards) if shard else gitHubSearchIssues
+        search_query = state.searchQuery() if state is not None else query
+        for r in search(search_query, max_results, sort_by, journal, search_url):
+            summary['results'] += 1
+            if issueMatchesQuery(r, query, ignore_case, word_boundaries):
+                summary['matched'] += 1
+                comments_url = r['comments_url']
+
+                if state is not None:
+                    if state.isUnchanged(r):
+                        summary['unchanged'] += 1
+                        continue
+                    # Only fetch the comments updated since the last run of an already mined issue.
+                    since = state.commentsSince(r)
+                    if since is not None:
+                        comments_url = withQueryParams(comments_url, since=since)
+
+                planned_requests += -(-r['comments'] // COMMENTS_PER_PAGE)
+                yield issueForComments(r, comments_url)
+            else:
+                summary['omitted'] += 1
+                omitted = {
+                    "issueID": r['id'],
+                    "issueURL": r['html_url'],
+                    "title": r['title'],
+                    "body": r['body']
+                }
+                omitted_writer.writeRows([omitted])
+                if print_logs:
+                    print('\n OMITTED ISSUE \n')
+                    printJSON(omitted)
+
+        print(f"{summary['results']} results retrieved, {summary['matched']} title/body closely matched "
+              f"with query, {summary['omitted']} omitted due to lack of match with query.")
+        if shard:
+            summary['skipped_shards'] = len(skipped_shards)
+            if skipped_shards:
+                print(f"{len(skipped_shards)} created date shards couldn't be searched, their issues are missing.")
+        # Report when the comment requests for the matched issues are projected to complete.
+        # (The GraphQL API is budgeted in points, see utils/githubAPI.py's gitHubGraphQL.)
+        if report_rate_limit and api == 'rest':
+            printGitHubRateLimitStatus(core_requests=planned_requests)
+
+    # Record the state of each issue whose comments were fetched.
+    def recordedComments(comments):
+        for issue, lines in comments:
+            if issue.get('fetchFailed'):
+                failed_issues.append(issue['issueID'])
+            elif state is not None:
+                state.recordIssue(issue['issueID'], issue['updated_at'], issue['comments'])
+            yield issue, lines
+
+    try:
+        issues = bufferedStage(matchedIssues(), queue_size)
+        comments = bufferedStage(commentStream(api, graphql_url)(issues, concurrency, journal), queue_size)
+        batches = processCorpusBatches(batchLines(recordedComments(comments), batch_size), executor, workers, batch_size)
+
+        for batch in bufferedStage(batches, queue_size):
+            summary['lines'] += len(batch)
+            classifyCorpus(batch, model, vectorizer, chunk_size=chunk_size, with_scores=with_scores, cache=cache)
+            summary['predicted'] = cache.predicted - predicted
+
+            # Filter out any lines whose category is in the list of categories to be omitted from results
+            # (unless the writer keeps every category, see utils/store.py).
+            exclude = () if comments_writer.keeps_filtered_categories else filtered_categories
+            summary['written'] += len(batch.selected(exclude))
+            with getMetrics().stage('write', len(batch.selected(exclude))):
+                comments_writer.writeRows(batch.rows(exclude))
+
+            # Print the classified comments with the category predicted for each comment.
+            if print_logs:
+                print('\n CLASSIFIED COMMENTS \n')
+                printJSON(list(batch.rows(exclude)))
+    finally:
+        omitted_writer.close()
+        comments_writer.close()
+        if own_executor:
+            executor.shutdown()
+
+    # A run missing issues doesn't advance the query's last run, the next one searches them again.
+    complete = not failed_issues and not skipped_shards
+    if state is not None and not complete:
+        print(f"{len(failed_issues)} issues couldn't be fetched, {len(skipped_shards)} shards couldn't be searched: "
+              f"the query's last run is kept so that the next incremental run mines them again.")
+    if state is not None and store is not None:
+        # The store merges runs by itself.
+        state.save(store.path, complete)
+        summary['results_file'] = store.path
+    elif state is not None:
+        summary['results_file'] = mergeIncrementalResults(state, comments_writer, out_file_prefix, results_dir,
+                                                          complete)
+
+    return summary
+
+# Merge the new lines of an incremental run into the query's previous results and save its state
+# (advancing its last run only if the run was `complete`, see QueryState.save).
+# Returns the path of the query's (merged) results file.
+def mergeIncrementalResults(state, comments_writer, out_file_prefix, results_dir, complete=True):
+    results_file = state.results_file
+    if comments_writer.rows:
+        results_file = comments_writer.outfile
+        if state.results_file is not None and os.path.exists(state.results_file):
+            results_file = resultFilePath(out_file_prefix + '_CLASSIFIED_COMMENTS_MERGED',
+                                          comments_writer.extension, results_dir)
+            rows = mergeResults(state.results_file, comments_writer.outfile, results_file)
+            print(f"Merged {comments_writer.rows} new comment lines into {rows} lines: {results_file}")
+
+    state.save(results_file, complete)
+    return results_file
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+'''
+Rate-limit-aware request scheduler for the GitHub API.
+
+Every API call goes through one RequestScheduler, which keeps a separate budget
+per GitHub rate limit resource:
+    - core: 5000 requests per hour (authenticated)
+    - search: 30 requests per minute (authenticated)
+    - graphql: 5000 points per hour, each GraphQL request costing the points
+      reported by its `rateLimit { cost }` field
+
+Budgets are kept in sync with the X-RateLimit-* headers of each response. Once a
+budget is exhausted, requests wait for its reset instead of failing, and 403/429
+rate limit responses and 5xx errors are retried with Retry-After/backoff delays.
+'''
+import logging
+import threading
+import time
+from math import ceil
+
+import requests
+
+from utils.metrics import getMetrics
+
+logger = logging.getLogger(__name__)
+
+# Default budgets per resource: (requests, window in seconds)
+RATE_LIMITS = {
+    'core': (5000, 60 * 60),
+    'search': (30, 60),
+    'graphql': (5000, 60 * 60)
+}
+
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Status codes worth retrying, 403 only when it is a rate limit response.
+RETRY_STATUS_CODES = {403, 429, 500, 502, 503, 504}
+
+# Raised when a request still fails after all retries.
+class RequestFailedError(Exception):
+    pass
+
+# Request budget for a single GitHub rate limit resource.
+class RateLimitBucket:
+    def __init__(self, limit, window, clock=time.time):
+        self.limit = limit
+        self.remaining = limit
+        self.window = window
+        self.reset = None
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    # Returns how long to wait before a request costing `cost` can be made (0 if it can go now),
+    # reserving its cost from the budget when it can.
+    def reserve(self, cost=1):
+        with self.lock:
+            now = self.clock()
+            if self.reset is not None and now >= self.reset:
+                self.remaining = self.limit
+                self.reset = None
+
+            if self.remaining < cost:
+                return max(self.reset - now, 0.01) if self.reset is not None else 0.01
+
+            self.remaining -= cost
+            if self.reset is None:
+                self.reset = now + self.window
+            return 0
+
+    # Sync the budget with the X-RateLimit-* response headers.
+    def update(self, headers):
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+
+        self.sync(int(headers['X-RateLimit-Remaining']),
+                  int(headers['X-RateLimit-Limit']) if 'X-RateLimit-Limit' in headers else None,
+                  float(headers['X-RateLimit-Reset']) if 'X-RateLimit-Reset' in headers else None)
+
+    # Sync the budget with a rate limit status (i.e a GraphQL `rateLimit` field).
+    def sync(self, remaining, limit=None, reset=None):
+        with self.lock:
+            self.remaining = remaining
+            if limit is not None:
+                self.limit = limit
+            if reset is not None:
+                self.reset = reset
+
+class RequestScheduler:
+    def __init__(self, session=None, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, clock=time.time, sleep=time.sleep):
+        self.session = session or requests.Session()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets = {
+            resource: RateLimitBucket(limit, window, clock)
+            for resource, (limit, window) in RATE_LIMITS.items()
+        }
+
+    def bucket(self, resource):
+        return self.buckets.setdefault(resource, RateLimitBucket(*RATE_LIMITS['core'], self.clock))
+
+    # Block until the resource's budget allows another request costing `cost`.
+    def acquire(self, resource, cost=1):
+        bucket = self.bucket(resource)
+        wait = bucket.reserve(cost)
+        while wait > 0:
+            logger.warning(f"[RATE LIMIT]: {resource} budget exhausted, waiting {wait:.0f}s")
+            self.sleep(wait)
+            wait = bucket.reserve(cost)
+
+    def isRateLimited(self, res):
+        if res.status_code == 429 or 'Retry-After' in res.headers:
+            return True
+        return res.status_code == 403 and res.headers.get('X-RateLimit-Remaining') == '0'
+
+    # Delay before retrying a failed attempt: Retry-After if given, the rate limit
+    # reset if the budget is spent, exponential backoff otherwise.
+    def retryDelay(self, res, attempt):
+        if res is not None and 'Retry-After' in res.headers:
+            return float(res.headers['Retry-After'])
+        if res is not None and res.headers.get('X-RateLimit-Remaining') == '0' \
+                and 'X-RateLimit-Reset' in res.headers:
+            return max(float(res.headers['X-RateLimit-Reset']) - self.clock(), 0) + 1
+
+        return min(self.backoff_base * (2 ** attempt), BACKOFF_MAX)
+
+    # Send a request through the budget of the given resource, retrying rate limit
+    # responses, server errors and connection errors.
+    # `cost` is the (estimated) number of budget units the request uses.
+    # Returns the response, raises RequestFailedError once retries are exhausted.
+    def request(self, method, url, resource='core', cost=1, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.acquire(resource, cost)
+
+            # Every attempt is recorded in the run's request latency histogram.
+            start = time.perf_counter()
+            try:
+                res = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                getMetrics().recordRequest(resource, time.perf_counter() - start, 0, None)
+                if attempt == self.max_retries:
+                    raise RequestFailedError(f"{url}: {e}")
+                self.sleep(self.retryDelay(None, attempt))
+                continue
+
+            getMetrics().recordRequest(resource, time.perf_counter() - start, len(res.content), res.status_code)
+            self.bucket(res.headers.get('X-RateLimit-Resource', resource)).update(res.headers)
+
+            retryable = res.status_code in RETRY_STATUS_CODES and \
+                (res.status_code != 403 or self.isRateLimited(res))
+            if not retryable:
+                break
+            if attempt == self.max_retries:
+                break
+
+            delay = self.retryDelay(res, attempt)
+            logger.warning(f"[RETRY {attempt + 1}/{self.max_retries}]: HTTP {res.status_code} in {delay:.0f}s - {url}")
+            self.sleep(delay)
+
+        try:
+            res.raise_for_status()
+        except requests.HTTPError as e:
+            raise RequestFailedError(str(e))
+
+        return res
+
+    def get(self, url, resource='core', **kwargs):
+        return self.request('GET', url, resource, **kwargs)
+
+    def post(self, url, resource='core', cost=1, **kwargs):
+        return self.request('POST', url, resource, cost, **kwargs)
+
+# Project when `planned` more requests against a resource can complete, given
+# the rate limit status (limit, remaining and reset epoch) of that resource.
+# Returns the projected epoch time.
+def projectCompletion(planned, limit, remaining, reset, window, now=None):
+    now = time.time() if now is None else now
+    if planned <= remaining:
+        return now
+
+    windows_needed = ceil((planned - remaining) / limit)
+    return reset + (windows_needed - 1) * window
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+'''
+Local classification service, keeping the model, count vectorizer and spaCy tokenizer
+loaded between requests (see classify-server.py).
+
+Endpoints:
+    POST /classify  {"lines": [raw line, ...]}
+                      -> {"results": [{"line": processed, "category": ..., "score": ...}, ...]}
+                    {"comments": [raw comment body, ...]}
+                      -> {"results": [[one result per line of the comment], ...]}
+    GET  /metrics   request/line counters, batch sizes, latency percentiles and throughput
+    GET  /health    {"status": "ok"}
+
+Concurrent requests are micro-batched: a single classification thread takes every request
+queued within `max_wait` seconds (up to `max_batch_size` lines), tokenizes their lines with
+one parser.pipe() and classifies them with one predict() call.
+Nothing is fetched from the network, the service runs fully offline.
+'''
+import json
+import queue
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.classifier import classifyCorpus, PredictionCache
+from utils.commentProcessor import processLines, splitComment, DEFAULT_BATCH_SIZE
+
+DEFAULT_PORT = 8642
+DEFAULT_MAX_BATCH_SIZE = DEFAULT_BATCH_SIZE
+# Seconds the classification thread waits for more requests to join a batch.
+DEFAULT_MAX_WAIT = 0.005
+# Number of most recent request latencies the percentiles are computed over.
+LATENCY_WINDOW = 10000
+
+# Request and batch counters, and a window of the latest request latencies.
+class ServiceMetrics:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.lines = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def recordRequest(self, lines, latency):
+        with self.lock:
+            self.requests += 1
+            self.lines += lines
+            self.latencies.append(latency)
+
+    def recordError(self):
+        with self.lock:
+            self.errors += 1
+
+    def recordBatch(self, requests):
+        with self.lock:
+            self.batches += 1
+            self.batched_requests += requests
+
+    def snapshot(self):
+        with self.lock:
+            uptime = self.clock() - self.started
+            latencies = sorted(self.latencies)
+
+            def percentile(p):
+                if not latencies:
+                    return None
+                return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+            return {
+                'uptime_seconds': uptime,
+                'requests': self.requests,
+                'errors': self.errors,
+                'lines': self.lines,
+                'batches': self.batches,
+                'requests_per_batch': self.batched_requests / self.batches if self.batches else 0,
+                'lines_per_second': self.lines / uptime if uptime else 0,
+                'latency_ms': {'p50': percentile(50), 'p90': percentile(90), 'p99': percentile(99)}
+            }
+
+# Classifies the raw lines of concurrent requests in micro-batches, on a single thread.
+class MicroBatcher:
+    def __init__(self, model, vectorizer, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT,
+                 metrics=None, prediction_cache=None):
+        self.model = model
+        self.vectorizer = vectorizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics if metrics is not None else ServiceMetrics()
+        self.cache = prediction_cache if prediction_cache is not None else PredictionCache()
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Queue raw lines for classification.
+    # Returns a Future of the list of (processed line, category, score) of the lines.
+    def submit(self, lines):
+        future = Future()
+        self.requests.put((list(lines), future))
+        return future
+
+    def classify(self, lines):
+        return self.submit(lines).result()
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+
+            batch = [request]
+            size = len(request[0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            self.classifyBatch(batch)
+
+    def classifyBatch(self, batch):
+        try:
+            lines = [line for lines, future in batch for line in lines]
+            corpus = [{'commentLine': line} for line in processLines(lines)]
+            classifyCorpus(corpus, self.model, self.vectorizer, with_scores=True, cache=self.cache)
+        except Exception as e:
+            for lines, future in batch:
+                future.set_exception(e)
+            return
+
+        self.metrics.recordBatch(len(batch))
+        start = 0
+        for lines, future in batch:
+            future.set_result([(c['commentLine'], c['category'], c['categoryScore'])
+                               for c in corpus[start:start + len(lines)]])
+            start += len(lines)
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+class ClassificationHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.respond(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self.respond(200, self.server.batcher.metrics.snapshot())
+        else:
+            self.respond(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/classify':
+            self.respond(404, {'error': f'unknown path {self.path}'})
+            return
+
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            values = request['comments'] if 'comments' in request else request['lines']
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                raise ValueError('lines and comments must be lists of strings')
+            if 'comments' in request:
+                comments = [splitComment(body) for body in values]
+            else:
+                comments = [values]
+        except (ValueError, KeyError, TypeError) as e:
+            self.server.batcher.metrics.recordError()
+            self.respond(400, {'error': f'expected {{"lines": [...]}} or {{"comments": [...]}}: {e}'})
+            return
+
+        try:
+            classified = self.server.batcher.classify([line for lines in comments for line in lines])
+        except Exception as e:
+            self.server.batcher.metrics.recordError()
+            self.respond(500, {'error': str(e)})
+            return
+
+        results = []
+        for lines in comments:
+            results.append([{'line': line, 'category': category, 'score': score}
+                            for line, category, score in classified[:len(lines)]])
+            classified = classified[len(lines):]
+        self.respond(200, {'results': results if 'comments' in request else results[0]})
+        self.server.batcher.metrics.recordRequest(sum(len(lines) for lines in comments), time.perf_counter() - start)
+
+    def respond(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+# HTTP server for a MicroBatcher, on a TCP (host, port) or, if `socket_path` is given, a Unix socket.
+def newClassificationServer(batcher, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None, verbose=False):
+    if socket_path is not None:
+        server = ThreadingUnixHTTPServer(socket_path, ClassificationHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ClassificationHandler)
+    server.batcher = batcher
+    server.verbose = verbose
+    return server
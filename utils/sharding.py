@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+'''
+Query sharding to mine more than the 1000 results GitHub search returns per query.
+
+The query's `total_count` is read, and the query is recursively split into `created:`
+date range shards until every shard matches at most 1000 issues. The shards are then
+searched concurrently (within the search rate limit budget of the request scheduler)
+and their issues de-duplicated by issue `id`.
+
+Shard results keep the requested sort order within each shard, shards are ordered
+from the most to the least recently created.
+
+A date range (or the query itself) whose count request still fails after the request
+scheduler's retries can't be searched: it is logged as a warning and appended to the
+caller's `skipped` list, so the run summary reports it instead of silently missing its issues.
+'''
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+
+from utils.githubAPI import gitHubSearchIssues, gitHubSearchTotalCount, \
+    GITHUB_API_SEARCH_ISSUES_URL, SEARCH_RESULT_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# GitHub's launch, no issue was created before it.
+EARLIEST_CREATED = datetime.datetime(2008, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Default number of shards searched concurrently.
+DEFAULT_SHARD_CONCURRENCY = 4
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+def shardQueryString(query, start, end):
+    return f"{query} created:{start.strftime(DATE_FORMAT)}..{end.strftime(DATE_FORMAT)}"
+
+# Recursively split the [start, end] creation date range of a query in halves until
+# each shard matches at most `limit` issues (or can't be split below a second).
+# `count(query)` returns the total_count of a query string, None if it couldn't be counted.
+# Ranges that couldn't be counted are appended to `skipped` if given.
+# Returns the list of (shard query string, total count) from the latest to the earliest range.
+def shardQuery(query, count, start=None, end=None, limit=SEARCH_RESULT_LIMIT, skipped=None):
+    start = start or EARLIEST_CREATED
+    end = end or datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+    shards = []
+    ranges = deque([(start, end)])
+    while ranges:
+        range_start, range_end = ranges.popleft()
+        shard = shardQueryString(query, range_start, range_end)
+        total = count(shard)
+
+        if total is None:
+            logger.warning(f"[SHARD]: couldn't count the issues of {shard}, its issues are skipped")
+            if skipped is not None:
+                skipped.append(shard)
+            continue
+        if total == 0:
+            continue
+
+        if total <= limit or range_end - range_start < datetime.timedelta(seconds=2):
+            if total > limit:
+                logger.warning(f"[SHARD]: {shard} still matches {total} issues, only the first {limit} can be retrieved")
+            shards.append((range_start, shard, total))
+            continue
+
+        middle = range_start + (range_end - range_start) / 2
+        middle = middle.replace(microsecond=0)
+        ranges.append((range_start, middle))
+        ranges.append((middle + datetime.timedelta(seconds=1), range_end))
+
+    shards.sort(key=lambda shard: shard[0], reverse=True)
+    return [(shard, total) for _, shard, total in shards]
+
+# Generator over the issues matching a search query, beyond GitHub's 1000 results per query,
+# up to max_results unique issues.
+# The query or shards that couldn't be counted, and so weren't searched, are appended to `skipped` if given.
+def gitHubShardedSearchIssues(query, max_results, sort_by, journal=None,
+                              search_url=GITHUB_API_SEARCH_ISSUES_URL,
+                              concurrency=DEFAULT_SHARD_CONCURRENCY, skipped=None):
+    total = gitHubSearchTotalCount(query, search_url)
+    if total is None:
+        logger.warning(f"[SHARD]: couldn't count the issues of {query}, it is skipped")
+        if skipped is not None:
+            skipped.append(query)
+        return
+
+    # A query within the limit needs no sharding.
+    if total <= SEARCH_RESULT_LIMIT:
+        yield from gitHubSearchIssues(query, max_results, sort_by, journal, search_url)
+        return
+
+    shards = shardQuery(query, lambda q: gitHubSearchTotalCount(q, search_url), skipped=skipped)
+    logger.info(f"[SHARD]: {query} matches {total} issues, split into {len(shards)} created date shards")
+
+    def search(shard):
+        return list(gitHubSearchIssues(shard[0], shard[1], sort_by, journal, search_url))
+
+    seen = set()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        in_flight = deque()
+        pending = iter(shards)
+
+        # Keep `concurrency` shards searching ahead of the shard being consumed.
+        for shard in pending:
+            in_flight.append(executor.submit(search, shard))
+            if len(in_flight) >= concurrency:
+                break
+
+        while in_flight:
+            issues = in_flight.popleft().result()
+            shard = next(pending, None)
+            if shard is not None:
+                in_flight.append(executor.submit(search, shard))
+
+            for issue in issues:
+                if issue['id'] in seen:
+                    continue
+                seen.add(issue['id'])
+                yield issue
+
+                if len(seen) >= max_results:
+                    for future in in_flight:
+                        future.cancel()
+                    return
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+'''
+Per-query state store for incremental re-mining.
+
+For each query (and set of filtered categories), records when it was last mined,
+the `updated_at`/comment count of every issue seen, and the merged result file.
+A repeated run then only searches issues updated since the last run (`updated:>=`),
+only fetches comments updated since then (the comments API `since` parameter),
+classifies just those new lines and merges them into the previous result set.
+'''
+import csv
+import datetime
+import hashlib
+import json
+import os
+
+from utils.io import openResultFile
+
+DEFAULT_STATE_DIR = './results/state'
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+def utcNow():
+    return datetime.datetime.now(datetime.timezone.utc).strftime(DATE_FORMAT)
+
+class QueryState:
+    def __init__(self, query, filtered_categories=(), directory=DEFAULT_STATE_DIR):
+        key = json.dumps([query, sorted(filtered_categories)])
+        self.path = os.path.join(directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+        self.query = query
+
+        # Time the previous run started, None if the query was never mined.
+        self.last_run = None
+        # Issue id -> {'updated_at': ..., 'comments': ...} as of the previous runs.
+        self.issues = {}
+        # CSV file holding the merged classified comments of every run.
+        self.results_file = None
+
+        # Start time of the current run, stored as last_run once it completes without failures.
+        self.run_started = utcNow()
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            self.last_run = data['last_run']
+            self.issues = {int(k): v for k, v in data['issues'].items()}
+            self.results_file = data['results_file']
+
+    # Search query string restricted to issues updated since the last run.
+    def searchQuery(self):
+        if self.last_run is None:
+            return self.query
+
+        return f"{self.query} updated:>={self.last_run}"
+
+    # Whether an issue from the search results is unchanged since the last run.
+    def isUnchanged(self, issue):
+        previous = self.issues.get(issue['id'])
+        return previous is not None and previous['updated_at'] == issue['updated_at'] \
+            and previous['comments'] == issue['comments']
+
+    # `since` timestamp to fetch an issue's comments from, None to fetch all of them.
+    def commentsSince(self, issue):
+        if self.last_run is None or issue['id'] not in self.issues:
+            return None
+
+        return self.last_run
+
+    def recordIssue(self, issue_id, updated_at, comments):
+        self.issues[issue_id] = {'updated_at': updated_at, 'comments': comments}
+
+    # Save the state of the run. Unless it was `complete`, last_run isn't advanced so that
+    # the next run searches again the issues this one failed to fetch or search.
+    def save(self, results_file, complete=True):
+        if complete:
+            self.last_run = self.run_started
+        self.results_file = results_file
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({
+                'query': self.query,
+                'last_run': self.last_run,
+                'issues': self.issues,
+                'results_file': self.results_file
+            }, f)
+
+# Merge the classified comment lines of an incremental run into the previous result set.
+# Lines of comments present in the new results (new or edited comments) replace the
+# previous lines of the same comment. Rows are streamed, neither file is held in memory.
+# Files are CSV, gzip compressed if their name ends with .gz.
+# Returns the number of rows in the merged file.
+def mergeResults(previous_file, new_file, merged_file):
+    with openResultFile(new_file) as f:
+        updated_comments = {row['commentURL'] for row in csv.DictReader(f)}
+
+    rows = 0
+    with openResultFile(merged_file, 'w') as out:
+        writer = None
+        for path, keep in [(previous_file, lambda row: row['commentURL'] not in updated_comments),
+                           (new_file, lambda row: True)]:
+            with openResultFile(path) as f:
+                reader = csv.DictReader(f)
+                if writer is None:
+                    # Extra columns of the new results (i.e categoryScore) are dropped to match the previous ones.
+                    writer = csv.DictWriter(out, fieldnames=reader.fieldnames, extrasaction='ignore',
+                                            lineterminator='\n')
+                    writer.writeheader()
+                for row in reader:
+                    if keep(row):
+                        writer.writerow(row)
+                        rows += 1
+
+    return rows
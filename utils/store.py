@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+'''
+Local SQLite results store, an alternative to one timestamped CSV per run.
+
+Every run writes into a single database:
+    - runs:           one row per run (run id, query, start time)
+    - comment_lines:  classified comment lines, one row per (comment URL, line number)
+    - run_lines:      which lines each run found
+    - omitted_issues: issues omitted by each run for lack of match with the query
+
+A comment line mined again by later runs (or by other queries) is stored once, it is
+only linked to each run that found it. Lines of every category are stored, categories
+are filtered out when querying (`exclude`) rather than when writing. Indexes on issueID, category and the run/query
+let counts per category and the lines of an issue be queried without loading every run.
+'''
+import datetime
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = './results/results.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    started_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_query ON runs (query);
+
+CREATE TABLE IF NOT EXISTS comment_lines (
+    commentURL TEXT NOT NULL,
+    lineNumber INTEGER NOT NULL,
+    issueID INTEGER NOT NULL,
+    issueURL_API TEXT,
+    issueURL_HTML TEXT,
+    commentLine TEXT,
+    category TEXT,
+    categoryScore REAL,
+    PRIMARY KEY (commentURL, lineNumber)
+);
+CREATE INDEX IF NOT EXISTS comment_lines_issue ON comment_lines (issueID);
+CREATE INDEX IF NOT EXISTS comment_lines_category ON comment_lines (category);
+
+CREATE TABLE IF NOT EXISTS run_lines (
+    run_id TEXT NOT NULL,
+    commentURL TEXT NOT NULL,
+    lineNumber INTEGER NOT NULL,
+    PRIMARY KEY (run_id, commentURL, lineNumber)
+);
+CREATE INDEX IF NOT EXISTS run_lines_line ON run_lines (commentURL, lineNumber);
+
+CREATE TABLE IF NOT EXISTS omitted_issues (
+    run_id TEXT NOT NULL,
+    issueID INTEGER NOT NULL,
+    issueURL TEXT,
+    title TEXT,
+    body TEXT,
+    PRIMARY KEY (run_id, issueID)
+);
+'''
+
+class ResultStore:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        # Writers are used from different pipeline stage threads, serialized by the lock.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def startRun(self, run_id, query):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR IGNORE INTO runs (run_id, query, started_at) VALUES (?, ?, ?)',
+                (run_id, query, datetime.datetime.now().isoformat(timespec='seconds')))
+
+    def commentWriter(self, run_id):
+        return CommentLineWriter(self, run_id)
+
+    def omittedWriter(self, run_id):
+        return OmittedIssueWriter(self, run_id)
+
+    # Number of lines per category, over every run or only those of a query/run.
+    def categoryCounts(self, query=None, run_id=None, exclude=()):
+        sql = 'SELECT category, COUNT(*) FROM comment_lines WHERE 1'
+        params = []
+        if run_id is not None:
+            sql += ' AND (commentURL, lineNumber) IN (SELECT commentURL, lineNumber FROM run_lines WHERE run_id = ?)'
+            params.append(run_id)
+        elif query is not None:
+            sql += ' AND (commentURL, lineNumber) IN (SELECT commentURL, lineNumber FROM run_lines ' \
+                   'JOIN runs USING (run_id) WHERE query = ?)'
+            params.append(query)
+        if exclude:
+            sql += ' AND category NOT IN (' + ', '.join('?' * len(exclude)) + ')'
+            params += list(exclude)
+        sql += ' GROUP BY category ORDER BY COUNT(*) DESC, category'
+
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    # Lines of an issue, in comment order.
+    def issueLines(self, issue_id):
+        with self.lock:
+            cursor = self.connection.execute(
+                'SELECT commentURL, lineNumber, commentLine, category FROM comment_lines '
+                'WHERE issueID = ? ORDER BY commentURL, lineNumber', (issue_id,))
+            return cursor.fetchall()
+
+    def runs(self):
+        with self.lock:
+            cursor = self.connection.execute(
+                'SELECT runs.run_id, query, started_at, COUNT(run_lines.commentURL) FROM runs '
+                'LEFT JOIN run_lines USING (run_id) GROUP BY runs.run_id ORDER BY started_at')
+            return cursor.fetchall()
+
+    def close(self):
+        self.connection.close()
+
+# Writes classified comment lines of a run, with the same writeRows/close interface as CSVResultWriter.
+# Lines arrive in comment order, so each line's number within its comment is counted here.
+class CommentLineWriter:
+    # Takes the lines of every category, see the module docstring.
+    keeps_filtered_categories = True
+
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+        self.outfile = store.path
+        self.rows = 0
+        self.comment_url = None
+        self.line_number = 0
+
+    def writeRows(self, rows):
+        lines = []
+        # Comments whose lines are (re)written by this run, their previous lines are replaced.
+        replaced_comments = []
+        for row in rows:
+            if row['commentURL'] != self.comment_url:
+                self.comment_url = row['commentURL']
+                self.line_number = 0
+                replaced_comments.append((self.comment_url,))
+            lines.append((row['commentURL'], self.line_number, int(row['issueID']), row['issueURL_API'],
+                          row['issueURL_HTML'], row['commentLine'], str(row['category']), row.get('categoryScore')))
+            self.line_number += 1
+
+        with self.store.lock, self.store.connection as connection:
+            connection.executemany('DELETE FROM comment_lines WHERE commentURL = ?', replaced_comments)
+            connection.executemany('INSERT OR REPLACE INTO comment_lines VALUES (?, ?, ?, ?, ?, ?, ?, ?)', lines)
+            connection.executemany('INSERT OR IGNORE INTO run_lines VALUES (?, ?, ?)',
+                                   [(self.run_id, line[0], line[1]) for line in lines])
+
+        self.rows += len(lines)
+
+    def close(self):
+        pass
+
+class OmittedIssueWriter:
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+        self.outfile = store.path
+        self.rows = 0
+
+    def writeRows(self, rows):
+        issues = [(self.run_id, r['issueID'], r['issueURL'], r['title'], r['body']) for r in rows]
+        with self.store.lock, self.store.connection as connection:
+            connection.executemany('INSERT OR REPLACE INTO omitted_issues VALUES (?, ?, ?, ?, ?)', issues)
+
+        self.rows += len(issues)
+
+    def close(self):
+        pass